@@ -4,6 +4,7 @@ from typing import Optional
 
 from dotenv import load_dotenv
 import httpx
+from postgrest import AsyncPostgrestClient
 from supabase import create_client, Client
 
 load_dotenv()
@@ -24,6 +25,21 @@ if not SUPABASE_URL:
 if not SUPABASE_SERVICE_ROLE_KEY:
     raise RuntimeError("SUPABASE_SERVICE_ROLE_KEY is not set in environment")
 
+# ─────────────────────────────────────────────────────────────
+# Auth: local JWT verification
+# Legacy projects sign access tokens with the shared JWT secret (HS256);
+# newer projects publish asymmetric signing keys at the JWKS endpoint.
+# ─────────────────────────────────────────────────────────────
+SUPABASE_JWT_SECRET: Optional[str] = (
+    os.getenv("SUPABASE_JWT_SECRET")
+)
+SUPABASE_JWKS_URL: str = os.getenv(
+    "SUPABASE_JWKS_URL", f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json"
+)
+JWT_AUDIENCE: str = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+JWKS_REFRESH_SECONDS: int = int(os.getenv("JWKS_REFRESH_SECONDS", "600"))
+AUTH_NEGATIVE_CACHE_SECONDS: int = int(os.getenv("AUTH_NEGATIVE_CACHE_SECONDS", "60"))
+
 # ─────────────────────────────────────────────────────────────
 # HTTP client: disable HTTP/2 to avoid intermittent disconnects
 # ─────────────────────────────────────────────────────────────
@@ -53,6 +69,57 @@ def _make_service_client() -> Client:
 
 supabase: Client = _make_service_client()
 
+# ─────────────────────────────────────────────────────────────
+# Async PostgREST client for `async def` handlers.
+# One pooled httpx.AsyncClient (keep-alive) is shared by every request;
+# pool size and timeouts are configurable per deployment.
+# ─────────────────────────────────────────────────────────────
+SUPABASE_HTTP_TIMEOUT: float = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "30"))
+SUPABASE_HTTP_CONNECT_TIMEOUT: float = float(os.getenv("SUPABASE_HTTP_CONNECT_TIMEOUT", "5"))
+SUPABASE_HTTP_MAX_CONNECTIONS: int = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "100"))
+SUPABASE_HTTP_MAX_KEEPALIVE: int = int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE", "20"))
+SUPABASE_HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("SUPABASE_HTTP_KEEPALIVE_EXPIRY", "30"))
+# Worker threads for the remaining sync (`def`) handlers; unset keeps AnyIO's default (40)
+THREADPOOL_SIZE: Optional[int] = (
+    int(os.getenv("THREADPOOL_SIZE")) if os.getenv("THREADPOOL_SIZE") else None
+)
+
+_rest_url = f"{SUPABASE_URL.rstrip('/')}/rest/v1"
+_rest_headers = {
+    "apikey": SUPABASE_SERVICE_ROLE_KEY,
+    "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
+    "Accept": "application/json",
+    "Content-Type": "application/json",
+}
+
+_async_http = httpx.AsyncClient(
+    base_url=_rest_url,
+    headers=_rest_headers,
+    http2=False,
+    timeout=httpx.Timeout(SUPABASE_HTTP_TIMEOUT, connect=SUPABASE_HTTP_CONNECT_TIMEOUT),
+    limits=httpx.Limits(
+        max_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=SUPABASE_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=SUPABASE_HTTP_KEEPALIVE_EXPIRY,
+    ),
+    follow_redirects=True,
+)
+
+
+def _make_async_db() -> AsyncPostgrestClient:
+    """
+    Build the async PostgREST client on top of our pooled AsyncClient.
+    Older postgrest-py versions don't take http_client=; patch the session instead.
+    """
+    try:
+        return AsyncPostgrestClient(_rest_url, headers=_rest_headers, http_client=_async_http)  # type: ignore[call-arg]
+    except TypeError:
+        client = AsyncPostgrestClient(_rest_url, headers=_rest_headers)
+        client.session = _async_http  # type: ignore[attr-defined]
+        return client
+
+async_db: AsyncPostgrestClient = _make_async_db()
+
 # ─────────────────────────────────────────────────────────────
 # Optional helper: make a per-request client that enforces RLS
 # (queries run "as the user" using their JWT). Handy when you
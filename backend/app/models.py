@@ -189,6 +189,7 @@ class MealEntry(BaseModel):
     proteins: float
     carbs: float
     fat: float
+    nutrition_status: Optional[str] = None  # 'pending' until background enrichment finishes
 
 
 class MealCreate(BaseModel):
@@ -198,6 +199,29 @@ class MealCreate(BaseModel):
     description: str
 
 
+# Upper bound on entries per bulk import request
+MAX_BULK_ENTRIES = 500
+
+
+class MealImportItem(MealCreate):
+    time: Optional[datetime] = None  # when the meal was eaten; defaults to now
+
+
+class MealBulkCreate(BaseModel):
+    meals: List[MealImportItem] = Field(..., min_length=1, max_length=MAX_BULK_ENTRIES)
+
+
+class WaterIntakeCreate(BaseModel):
+    amount_ml: int = 250
+    container_type: str = "glass"
+    intake_date: date | None = None
+    intake_time: str | None = None
+
+
+class WaterBulkCreate(BaseModel):
+    entries: List[WaterIntakeCreate] = Field(..., min_length=1, max_length=MAX_BULK_ENTRIES)
+
+
 # =========================================================
 #                         Health
 # =========================================================
@@ -236,7 +260,19 @@ class TrendPoint(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
     time: datetime
-    value: float
+    value: float  # bucket average when the series is downsampled
+    min: Optional[float] = None
+    max: Optional[float] = None
+    count: Optional[int] = None
+
+
+class NutritionTrendPoint(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    time: datetime
+    calories: float
+    sugar: float
+    sodium: float
 
 
 class TrendResponse(BaseModel):
@@ -247,9 +283,12 @@ class TrendResponse(BaseModel):
     systolic: List[TrendPoint]
     diastolic: List[TrendPoint]
     heart_rate: List[TrendPoint]
-    calories: float
+    calories: float  # totals over the range
     sugar: float
     sodium: float
+    range: Optional[str] = None
+    bucket: Optional[str] = None
+    nutrition: List[NutritionTrendPoint] = []
 
 
 class ChildHealthSnapshot(BaseModel):
@@ -4,6 +4,8 @@ from datetime import datetime, timezone
 from fastapi import HTTPException
 
 from ..config import supabase
+from ..utils.family import invalidate_family, invalidate_user
+from ..utils.realtime import publish_join_request
 
 
 def is_family_head(user_id: str, family_id: str) -> bool:
@@ -94,7 +96,10 @@ def approve_family_join_request(request_id: str, approver_id: str) -> Dict[str,
             "user_id": requester_id,
             "role": "child",
         }).execute()
+        invalidate_family(family_id)
+        invalidate_user(requester_id)
 
+    publish_join_request(req, "approved")
     return {"request_id": request_id, "status": "approved"}
 
 
@@ -117,4 +122,5 @@ def reject_family_join_request(request_id: str, approver_id: str) -> Dict[str, A
         "responded_by": approver_id,
     }).eq("request_id", request_id).execute()
 
+    publish_join_request(req, "rejected")
     return {"request_id": request_id, "status": "rejected"}
@@ -8,10 +8,12 @@ load_dotenv()
 client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 
 
-def chat_bot(chat_history, session_type: str | None = None, image_bytes: bytes | None = None, image_mime: str | None = None):
-    """Generate a bot reply from chat history, tailored by session type ('diet' or 'emotion').
-    Optionally include an image (jpg/png) to provide visual context to the model.
-    """
+_CHAT_MODEL = "gemini-2.5-flash"
+
+_FALLBACK_REPLY = "I'm sorry, I encountered an error processing your request. Please try again."
+
+
+def _build_prompt(chat_history, session_type: str | None, reply_format: str, summary: str | None = None) -> str:
     # Format chat history for the prompt
     formatted_history = "\n".join(
         f"{msg.get('sender_type', 'user')}: {msg.get('message_content', '')}" for msg in chat_history
@@ -33,11 +35,12 @@ def chat_bot(chat_history, session_type: str | None = None, image_bytes: bytes |
             "Provide friendly, helpful guidance based on the user's message."
         )
 
-    prompt_text = f"""
+    return f"""
     You are MyWellBeingBot, a friendly AI assistant.
     Session type: {session_type or 'general'}
     Guidance: {session_directives}
 
+    {f"Summary of the earlier conversation: {summary}" if summary else ""}
     Conversation so far:
     {formatted_history}
 
@@ -47,8 +50,35 @@ def chat_bot(chat_history, session_type: str | None = None, image_bytes: bytes |
       • Use a conversational, warm tone.
       • Never reveal internal metadata (session_id, user_id, etc.).
       • Never reply to or discuss any NSFW or inappropriate content as this conversation is with a child—if such content arises, respond with a gentle reminder about safe and appropriate topics. 
-      • Provide a helpful reply and optionally suggest an action.
+      • {reply_format}
+    """
+
+
+def _build_contents(prompt_text: str, image_bytes: bytes | None, image_mime: str | None) -> list:
+    # Build contents: text plus optional inline image
+    contents = []
+    # main user/system prompt text
+    contents.append({"role": "user", "parts": [{"text": prompt_text}]})
+    # attach image if present
+    if image_bytes and image_mime in ("image/jpeg", "image/jpg", "image/png"):
+        # Gemini accepts inline bytes via 'inline_data'
+        contents[-1]["parts"].append({
+            "inline_data": {
+                "mime_type": image_mime,
+                "data": image_bytes
+            }
+        })
+    return contents
+
+
+def chat_bot(chat_history, session_type: str | None = None, image_bytes: bytes | None = None, image_mime: str | None = None,
+             summary: str | None = None):
+    """Generate a bot reply from chat history, tailored by session type ('diet' or 'emotion').
+    Optionally include an image (jpg/png) to provide visual context to the model.
+    `summary` stands in for turns older than `chat_history` (see utils/chat_context).
     """
+    prompt_text = _build_prompt(
+        chat_history, session_type, "Provide a helpful reply and optionally suggest an action.", summary)
 
     # Define the response schema according to the official documentation
     response_schema = {
@@ -70,22 +100,10 @@ def chat_bot(chat_history, session_type: str | None = None, image_bytes: bytes |
 
     try:
         # Generate content with structured output using the correct config format
-        # Build contents: text plus optional inline image
-        contents = []
-        # main user/system prompt text
-        contents.append({"role": "user", "parts": [{"text": prompt_text}]})
-        # attach image if present
-        if image_bytes and image_mime in ("image/jpeg", "image/jpg", "image/png"):
-            # Gemini accepts inline bytes via 'inline_data'
-            contents[-1]["parts"].append({
-                "inline_data": {
-                    "mime_type": image_mime,
-                    "data": image_bytes
-                }
-            })
+        contents = _build_contents(prompt_text, image_bytes, image_mime)
 
         response = client.models.generate_content(
-            model="gemini-2.5-flash",
+            model=_CHAT_MODEL,
             contents=contents,
             config={
                 "response_mime_type": "application/json",
@@ -110,18 +128,68 @@ def chat_bot(chat_history, session_type: str | None = None, image_bytes: bytes |
         print(
             f"Raw response: {response.text if 'response' in locals() else 'No response'}")
         return {
-            "reply": "I'm sorry, I encountered an error processing your request. Please try again.",
+            "reply": _FALLBACK_REPLY,
             "suggested_action": "none"
         }
     except ValueError as e:
         print(f"Validation error: {e}")
         return {
-            "reply": "I'm sorry, I encountered an error processing your request. Please try again.",
+            "reply": _FALLBACK_REPLY,
             "suggested_action": "none"
         }
     except Exception as e:
         print(f"Unexpected error in chat_bot: {e}")
         return {
-            "reply": "I'm sorry, I encountered an error processing your request. Please try again.",
+            "reply": _FALLBACK_REPLY,
             "suggested_action": "none"
         }
+
+
+def chat_bot_stream(chat_history, session_type: str | None = None, image_bytes: bytes | None = None, image_mime: str | None = None,
+                    summary: str | None = None):
+    """Like chat_bot, but yields the reply text in chunks as the model produces them.
+
+    Streams plain text (structured JSON can't be shown until it is complete),
+    so there is no suggested_action. Yields a fallback message if the model
+    fails before producing anything.
+    """
+    prompt_text = _build_prompt(
+        chat_history, session_type, "Reply in plain text only (no JSON or markdown headings).", summary)
+    contents = _build_contents(prompt_text, image_bytes, image_mime)
+    produced = False
+    try:
+        for chunk in client.models.generate_content_stream(model=_CHAT_MODEL, contents=contents):
+            text = getattr(chunk, "text", None)
+            if text:
+                produced = True
+                yield text
+    except Exception as e:
+        print(f"Unexpected error in chat_bot_stream: {e}")
+        if not produced:
+            yield _FALLBACK_REPLY
+
+
+def summarize_history(previous_summary: str | None, messages) -> str | None:
+    """Fold older messages into the running conversation summary. None on failure."""
+    formatted = "\n".join(
+        f"{msg.get('sender_type', 'user')}: {msg.get('message_content', '')}" for msg in messages
+    )
+    prompt_text = f"""
+    You maintain a running summary of a conversation between a child and MyWellBeingBot.
+    Current summary: {previous_summary or '(none yet)'}
+
+    Newer messages to fold in:
+    {formatted}
+
+    Write the updated summary in at most 120 words: topics, feelings or goals the child shared,
+    advice already given, and anything to follow up on. No names, ids or other metadata.
+    """
+    try:
+        response = client.models.generate_content(
+            model=_CHAT_MODEL,
+            contents=[{"role": "user", "parts": [{"text": prompt_text}]}],
+        )
+        return (response.text or "").strip() or None
+    except Exception as e:
+        print(f"Unexpected error in summarize_history: {e}")
+        return None
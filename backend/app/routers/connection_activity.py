@@ -3,7 +3,7 @@ from fastapi.security import OAuth2PasswordBearer
 from typing import Dict, Any, List
 
 from ..config import supabase
-from ..utils.profile_utils import get_user_id_from_token
+from ..utils.auth import get_user_id_from_token
 from datetime import datetime, timezone
 
 router = APIRouter(prefix="/connections", tags=["connections-activity"]) 
@@ -5,8 +5,11 @@ from uuid import UUID
 from datetime import datetime, timezone
 
 from ..config import supabase
-from ..utils.profile_utils import get_user_id_from_token, get_user_type
+from ..utils.auth import get_user_id_from_token
+from ..utils.profile_utils import get_user_type
 from ..models import CodeRedeemRequest
+from ..utils.family import invalidate_family, invalidate_user
+from ..utils.realtime import publish_join_request
 
 router = APIRouter(prefix="/requests", tags=["connection-requests"])
 oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
@@ -89,6 +92,7 @@ def redeem_code(payload: CodeRedeemRequest, token: str = Depends(oauth2)) -> Dic
     data = getattr(ins, "data", None)
     if not data:
         raise HTTPException(status_code=400, detail="Failed to create request")
+    publish_join_request(data[0])
     return data[0]
 
 
@@ -187,7 +191,10 @@ def approve_request(request_id: UUID = Path(...), token: str = Depends(oauth2))
                 "user_id": req["requester_id"],
                 "role": req.get("relationship_type"),
             }).execute()
+            invalidate_family(target_id)
+            invalidate_user(req["requester_id"])
 
+    publish_join_request(req, "approved")
     return {"request_id": str(request_id), "status": "approved"}
 
 
@@ -221,6 +228,7 @@ def reject_request(request_id: UUID = Path(...), token: str = Depends(oauth2)) -
         "responded_by": user_id,
     }).eq("request_id", str(request_id)).execute()
 
+    publish_join_request(req, "rejected")
     return {"request_id": str(request_id), "status": "rejected"}
 
 
@@ -7,7 +7,7 @@ from postgrest import APIError
 
 from ..config import supabase
 from ..models import InvitationCodeCreate, InvitationCodeOut
-from ..utils.profile_utils import get_user_id_from_token  # adjust import path if needed
+from ..utils.auth import get_user_id_from_token
 
 router = APIRouter(prefix="/codes", tags=["Invitation Codes"])
 
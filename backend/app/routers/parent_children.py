@@ -1,39 +1,31 @@
 # routers/parent.py
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.security import OAuth2PasswordBearer
 from typing import List, Optional
 from pydantic import BaseModel
 from uuid import UUID
-from ..config import supabase
+from ..config import supabase, async_db
+from ..utils.auth import get_current_user_email, get_current_user_id
+from ..utils.db import table, fetch_rows, gather_rows
+from ..utils.health_snapshot import snapshot_query
 
 from ..models import ChildHealthSnapshot, ChildLinkRequest, ParentDetails, HealthMetric, ChildDietLog, Meal_Log, UpdateChildLink, Parent
 from fastapi.responses import JSONResponse
-import jwt
-from datetime import datetime
+from datetime import datetime, timedelta
 from uuid import uuid4
 
 router = APIRouter(prefix="/parent", tags=["parent"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
-
-# Extract parent email from token
-def get_email_from_token(token: str = Depends(oauth2_scheme)) -> str:
-    try:
-        payload = jwt.decode(token, options={"verify_signature": False})
-        return payload.get("email")
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-# Extract user_id from token
-def get_user_id_from_token(token: str = Depends(oauth2_scheme)) -> UUID:
-    try:
-        payload = jwt.decode(token, options={"verify_signature": False})
-        user_res = supabase.table("users").select("user_id").eq("email", payload.get("email")).single().execute()
-        if not user_res.data:
-            raise HTTPException(status_code=404, detail="User not found")
-        user_id = user_res.data['user_id']
-        return user_id
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+
+async def _linked_child_ids(parent_email: str) -> List[str]:
+    """child_ids linked to the parent account behind `parent_email`."""
+    users = await fetch_rows(table("users").select("user_id").eq("email", parent_email).limit(1))
+    if not users:
+        raise HTTPException(status_code=404, detail="User not found")
+    parents = await fetch_rows(table("parents").select("parent_id").eq("user_id", users[0]["user_id"]).limit(1))
+    if not parents:
+        raise HTTPException(status_code=404, detail="Parent not found")
+    links = await fetch_rows(table("parent_children").select("child_id").eq("parent_id", parents[0]["parent_id"]))
+    return [str(link["child_id"]) for link in links]
 
 
 # -------------------------
@@ -44,34 +36,26 @@ def get_user_id_from_token(token: str = Depends(oauth2_scheme)) -> UUID:
 # Part 1: View Child Metrics
 # -------------------------
 @router.get("/children/metrics", response_model=List[ChildHealthSnapshot])
-def view_all_children_metrics(parent_email: str = Depends(get_email_from_token)):
-    user_res = supabase.table("users").select("user_id").eq("email", parent_email).single().execute()
-    if not user_res.data:
-        raise HTTPException(status_code=404, detail="User not found")
-    user_id = user_res.data['user_id']
-
-    parent = supabase.table("parents").select("parent_id").eq("user_id", user_id).single().execute()
-    if not parent.data:
-        raise HTTPException(status_code=404, detail="Parent not found")
-    parent_id = parent.data['parent_id']
-
-    link_res = supabase.table("parent_children").select("child_id").eq("parent_id", parent_id).execute()
-    if not link_res.data:
+async def view_all_children_metrics(parent_email: str = Depends(get_current_user_email)):
+    child_ids = await _linked_child_ids(parent_email)
+    if not child_ids:
         return []
-    child_ids = [c['child_id'] for c in link_res.data]
+
+    # names and latest metrics for every child in two concurrent queries
+    students, latest = await gather_rows(
+        table("students").select("student_id, name").in_("student_id", child_ids),
+        snapshot_query(async_db, child_ids),
+    )
+    names = {str(s["student_id"]): s["name"] for s in students}
+    latest_by_child = {str(m["student_id"]): m for m in latest}
 
     snapshots = []
     for child_id in child_ids:
-        user_res = supabase.table("students").select("name").eq("student_id", child_id).single().execute()
-        if not user_res.data:
-            continue
-        name = user_res.data['name']
-        metric_res = supabase.table("health_metrics").select("*").eq("student_id", child_id).order("created_at", desc=True).limit(1).execute()
-        if not metric_res.data:
+        m = latest_by_child.get(child_id)
+        if child_id not in names or not m:
             continue
-        m = metric_res.data[0]
         snapshots.append(ChildHealthSnapshot(
-            full_name=name,
+            full_name=names[child_id],
             weight=m['weight'],
             height=m['height'],
             bmi=m['bmi'],
@@ -79,19 +63,19 @@ def view_all_children_metrics(parent_email: str = Depends(get_email_from_token))
             diastolic=m['diastolic'],
             blood_sugar=m['blood_sugar'],
             heart_rate=m['heart_rate'],
-            notes=m.get('notes', ''),
+            notes=m.get('notes') or '',
             created_at=m['created_at']
         ))
     return snapshots
 @router.get("/me")
-def get_parent_profile(user_id:  UUID = Depends(get_user_id_from_token)):
+def get_parent_profile(user_id:  UUID = Depends(get_current_user_id)):
     res = supabase.table("parents").select("*").eq("user_id", user_id).single().execute()
     if not res.data:
         raise HTTPException(status_code=404, detail="Parent profile not found")
 
     return res.data
 @router.post("/me")
-def create_parent(data: Parent, email: str = Depends(get_email_from_token)):
+def create_parent(data: Parent, email: str = Depends(get_current_user_email)):
     user_res = supabase.table("users").select("user_id").eq("email", email).execute()
     if not user_res.data:
         raise HTTPException(status_code=404, detail="User not found")
@@ -115,7 +99,7 @@ def create_parent(data: Parent, email: str = Depends(get_email_from_token)):
         raise HTTPException(status_code=500, detail="Failed to create parent")
     return {"message": "Parent created successfully"}
 @router.patch("/me")
-def update_my_parent(payload: Parent, email: str = Depends(get_email_from_token)):
+def update_my_parent(payload: Parent, email: str = Depends(get_current_user_email)):
     user_res = supabase.table("users").select("user_id").eq("email", email).execute()
     if not user_res.data:
         raise HTTPException(status_code=404, detail="User not found")
@@ -134,7 +118,7 @@ def update_my_parent(payload: Parent, email: str = Depends(get_email_from_token)
         raise HTTPException(status_code=500, detail="Failed to update parent profile")
     return update_res.data[0]
 @router.delete("/me", status_code=204)
-def delete_my_parent(email: str = Depends(get_email_from_token)):
+def delete_my_parent(email: str = Depends(get_current_user_email)):
     user_res = supabase.table("users").select("user_id").eq("email", email).execute()
     if not user_res.data:
         raise HTTPException(status_code=404, detail="User not found")
@@ -152,7 +136,7 @@ def delete_my_parent(email: str = Depends(get_email_from_token)):
 # Part 2: Child Linking
 # -------------------------
 @router.get("/children")
-def get_children(user_id: UUID = Depends(get_user_id_from_token)):
+def get_children(user_id: UUID = Depends(get_current_user_id)):
     parent = supabase.table("parents").select("parent_id").eq("user_id", user_id).single().execute()
     if not parent.data:
         raise HTTPException(status_code=404, detail="Parent not found")
@@ -166,7 +150,7 @@ def get_children(user_id: UUID = Depends(get_user_id_from_token)):
     return user_res
 
 @router.post("/children/add")
-def add_child(data: ChildLinkRequest, user_id: UUID = Depends(get_user_id_from_token)):
+def add_child(data: ChildLinkRequest, user_id: UUID = Depends(get_current_user_id)):
     child = supabase.table("students").select("student_id").eq("student_id", data.child_id).single().execute()
     if not child.data:
         raise HTTPException(status_code=404, detail="Child not found")
@@ -184,7 +168,7 @@ def add_child(data: ChildLinkRequest, user_id: UUID = Depends(get_user_id_from_t
     return {"message": "Child linked successfully"}
 
 @router.delete("/children/remove")
-def remove_child(child_id: UUID, user_id: UUID = Depends(get_user_id_from_token)):
+def remove_child(child_id: UUID, user_id: UUID = Depends(get_current_user_id)):
     parent = supabase.table("parents").select("parent_id").eq("user_id", user_id).single().execute()
     if not parent.data:
         raise HTTPException(status_code=404, detail="Parent not found")
@@ -196,7 +180,7 @@ def remove_child(child_id: UUID, user_id: UUID = Depends(get_user_id_from_token)
 @router.patch("/children/relationship", response_model=dict)
 def update_child_relationship(
     update: UpdateChildLink,
-    user_id: UUID = Depends(get_user_id_from_token)
+    user_id: UUID = Depends(get_current_user_id)
 ):
     parent = supabase.table("parents").select("parent_id").eq("user_id", user_id).single().execute()
     if not parent.data:
@@ -236,7 +220,7 @@ def search_child(email: Optional[str] = None, student_id: Optional[UUID] = None,
 # -------------------------
 
 @router.get("/other-parents", response_model=List[ParentDetails])
-def view_other_parents(user_id: UUID = Depends(get_user_id_from_token)):
+def view_other_parents(user_id: UUID = Depends(get_current_user_id)):
     parent = supabase.table("parents").select("group").eq("user_id", user_id).single().execute()
     if not parent.data or not parent.data.get("group"):
         raise HTTPException(status_code=404, detail="Parent group not found")
@@ -248,7 +232,7 @@ def view_other_parents(user_id: UUID = Depends(get_user_id_from_token)):
 @router.get("/child/health", response_model=List[HealthMetric])
 def get_child_health_data(
     child_id: str,
-    parent_email: str = Depends(get_email_from_token)
+    parent_email: str = Depends(get_current_user_email)
 ):
     # Validate parent-child relationship
     parent_res = supabase.table("users").select("user_id").eq("email", parent_email).execute()
@@ -270,55 +254,46 @@ def get_child_health_data(
     return metrics.data
 
 @router.get("/children/diet", response_model=List[ChildDietLog])
-def view_children_diet(parent_email: str = Depends(get_email_from_token)):
-    # Step 1: Resolve user_id from parent_email
-    user_res = supabase.table("users").select("user_id").eq("email", parent_email).execute()
-    if not user_res.data:
-        raise HTTPException(status_code=404, detail="User not found")
-    user_id = user_res.data[0]["user_id"]
-
-    # Step 2: Get parent_id from parents
-    parent_res = supabase.table("parents").select("parent_id").eq("user_id", user_id).execute()
-    if not parent_res.data:
-        raise HTTPException(status_code=404, detail="Parent not found")
-    parent_id = parent_res.data[0]["parent_id"]
-
-    # Step 3: Get child_ids
-    children_res = supabase.table("parent_children").select("child_id").eq("parent_id", parent_id).execute()
-    if not children_res.data:
+async def view_children_diet(
+    days: int = Query(30, ge=1, le=365, description="Only entries from the last N days"),
+    parent_email: str = Depends(get_current_user_email),
+):
+    child_ids = await _linked_child_ids(parent_email)
+    if not child_ids:
         return []
 
-    child_ids = [child["child_id"] for child in children_res.data]
-
-    # Step 4: Fetch diet data for all children
-    diet_logs = []
-    for child_id in child_ids:
-        child = supabase.table("students").select("email, name").eq("student_id", child_id).execute()
-        child_email = child.data[0]['email']    
-        child_name = child.data[0]['name']    
-        diet_res = (
-            supabase.table("student_diet")
-            .select("time, water_glasses, sodium, sugar")
-            .eq("student_id", child_id)
-            .order("time", desc=True)
-            .execute()
-        )
-        for entry in diet_res.data:
-            diet_logs.append({
-                "child_name": child_name,
-                "child_id": child_id,
-                "date": entry["time"],
-                "water_glasses": entry["water_glasses"],
-                "sodium": entry["sodium"],
-                "sugar": entry["sugar"]
-            })
-
-    return diet_logs
+    # One windowed diet query for all children, alongside their names
+    since = (datetime.now() - timedelta(days=days)).isoformat()
+    students, entries = await gather_rows(
+        table("students").select("student_id, name").in_("student_id", child_ids),
+        table("student_diet")
+        .select("student_id, time, water_glasses, sodium, sugar")
+        .in_("student_id", child_ids)
+        .gte("time", since)
+        .order("time", desc=True),
+    )
+    names = {str(s["student_id"]): s["name"] for s in students}
+
+    # grouped by child in link order, newest first within each child
+    position = {child_id: i for i, child_id in enumerate(child_ids)}
+    entries.sort(key=lambda e: position.get(str(e["student_id"]), len(position)))
+    return [
+        {
+            "child_name": names[str(entry["student_id"])],
+            "child_id": str(entry["student_id"]),
+            "date": entry["time"],
+            "water_glasses": entry["water_glasses"],
+            "sodium": entry["sodium"],
+            "sugar": entry["sugar"],
+        }
+        for entry in entries
+        if str(entry["student_id"]) in names
+    ]
 
 @router.get("/child/meals", response_model=List[Meal_Log])
 def get_child_meal_logs(
     child_id: str,
-    parent_email: str = Depends(get_email_from_token)
+    parent_email: str = Depends(get_current_user_email)
 ):
     # Validate parent-child relationship (same as above)
     parent_res = supabase.table("users").select("user_id").eq("email", parent_email).execute()
@@ -5,22 +5,18 @@ from uuid import UUID
 from datetime import datetime
 
 from ..config import supabase
+from ..utils.auth import get_user_id_from_token
+from ..utils.family import invalidate_family, invalidate_user
+from ..utils.realtime import publish_join_request
 
 router = APIRouter(prefix="/parent/family", tags=["parent-family"])
 oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 
-def get_user_id(token: str) -> UUID:
-    auth = supabase.auth.get_user(token)
-    if getattr(auth, "error", None):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    return auth.user.id
-
-
 @router.get("/overview", response_model=Dict[str, Any])
 def family_overview(token: str = Depends(oauth2)):
     """Return summary cards for tasks, finance, health across family."""
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     # count children in families you head
     counts = (
@@ -59,7 +55,7 @@ def create_family_group(
     token: str = Depends(oauth2),
 ):
     """Create a new family group (you become the head)."""
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     # --- generate a short, human-friendly key required by schema ---
     import random, string, time
@@ -95,6 +91,7 @@ def create_family_group(
         time.sleep(0.05)  # tiny backoff and retry
     else:
         raise HTTPException(400, detail="Could not create family group (key collision)")
+    invalidate_user(user_id)
 
     # Create a reusable family invitation code (optional; keep your existing logic)
     try:
@@ -128,7 +125,7 @@ def create_family_group(
 @router.get("/groups", response_model=List[Dict[str, Any]])
 def list_family_groups(token: str = Depends(oauth2)):
     """List all family groups you head."""
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     resp = (
         supabase
         .table("family_groups")
@@ -145,7 +142,7 @@ def get_family_group(
     token: str    = Depends(oauth2),
 ):
     """Get details (and members) of a single family group."""
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     # ensure you’re the head
     grp = (
@@ -217,7 +214,7 @@ def add_family_member(
     token: str     = Depends(oauth2),
 ):
     """Add a child (or guardian) to your family group."""
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     # verify you’re head
     grp = (
@@ -241,6 +238,8 @@ def add_family_member(
     resp = supabase.table("family_members").insert(payload).execute()
     if not resp.data:
         raise HTTPException(400, "Could not add member")
+    invalidate_family(str(group_id))
+    invalidate_user(str(child_id))
     return resp.data[0]
 
 
@@ -251,7 +250,7 @@ def remove_family_member(
     token: str     = Depends(oauth2),
 ):
     """Remove a member from your family group."""
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     # verify head
     grp = (
@@ -271,6 +270,8 @@ def remove_family_member(
         .eq("family_id", str(group_id)) \
         .eq("user_id",   str(child_id)) \
         .execute()
+    invalidate_family(str(group_id))
+    invalidate_user(str(child_id))
 
     return {"removed": True}
 
@@ -286,7 +287,7 @@ def join_family_via_code(
 
     Implementation uses the same mechanism as invitation code redeem.
     """
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     # Lookup invitation code by code value
     code_res = (
@@ -344,6 +345,7 @@ def join_family_via_code(
     data = getattr(ins, "data", None)
     if not data:
         raise HTTPException(status_code=400, detail="Failed to create join request")
+    publish_join_request(data[0])
     return data[0]
 @router.patch("/groups/{group_id}", response_model=Dict[str, Any])
 def update_family_group(
@@ -353,7 +355,7 @@ def update_family_group(
     token: str = Depends(oauth2),
 ):
     """Edit a family group you head (name/description)."""
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     # ensure head
     grp = (
@@ -392,7 +394,7 @@ def delete_family_group(
     token: str = Depends(oauth2),
 ):
     """Delete a family group you head. (Soft delete is recommended; here we hard-delete + related.)"""
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     grp = (
         supabase.table("family_groups")
@@ -411,12 +413,13 @@ def delete_family_group(
     supabase.table("invitation_codes").delete().eq("target_type", "family").eq("target_id", str(group_id)).execute()
 
     supabase.table("family_groups").delete().eq("family_id", str(group_id)).execute()
+    invalidate_family(str(group_id))
     return {"deleted": True}
 
 @router.get("/memberships")
 def list_my_family_memberships(token: str = Depends(oauth2)):
     """Groups where the current user is a member (not necessarily head)."""
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     members = (
         supabase.table("family_members")
@@ -471,7 +474,7 @@ def join_classroom_via_code(
     Parent (or teacher) joins a classroom using an invite code.
     Creates a pending join request that teachers can accept from their MyStudentsView.
     """
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     code_res = (
         supabase.table("invitation_codes")
@@ -526,4 +529,5 @@ def join_classroom_via_code(
     data = getattr(ins, "data", None)
     if not data:
         raise HTTPException(status_code=400, detail="Failed to create join request")
+    publish_join_request(data[0])
     return data[0]
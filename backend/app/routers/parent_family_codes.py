@@ -5,18 +5,12 @@ from typing import List, Dict, Any
 from uuid import UUID
 from datetime import datetime, timedelta
 from ..config import supabase
+from ..utils.auth import get_user_id_from_token
 
 router = APIRouter(prefix="/parent/family/codes", tags=["parent-family-codes"])
 oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 
-def _get_user_id(token: str) -> UUID:
-    auth = supabase.auth.get_user(token)
-    if getattr(auth, "error", None) or not getattr(auth, "user", None):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    return auth.user.id
-
-
 def _family_ids_for_head(user_id: str):
     res = (
         supabase.table("family_groups")
@@ -30,7 +24,7 @@ def _family_ids_for_head(user_id: str):
 @router.get("/", response_model=List[Dict[str, Any]])
 def list_family_codes(token: str = Depends(oauth2)):
     """List all invitation codes (target_type='family') for families headed by the caller."""
-    user_id = _get_user_id(token)
+    user_id = get_user_id_from_token(token)
     fam_ids = _family_ids_for_head(user_id)
     if not fam_ids:
         return []
@@ -82,7 +76,7 @@ def create_family_code(
     - If target_id is omitted, the first family headed by the user is used.
     - expires_in_hours -> converts to expires_at.
     """
-    user_id = _get_user_id(token)
+    user_id = get_user_id_from_token(token)
     fam_ids = _family_ids_for_head(user_id)
     if not fam_ids:
         raise HTTPException(400, "You don't head any family groups yet")
@@ -118,7 +112,7 @@ def create_family_code(
 @router.delete("/{code_id}", response_model=Dict[str, Any])
 def revoke_family_code(code_id: UUID = Path(...), token: str = Depends(oauth2)):
     """Soft-delete: mark a code as revoked (or delete if you prefer)."""
-    user_id = _get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     # ensure code belongs to one of the user's families
     code = (
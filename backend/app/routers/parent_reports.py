@@ -5,6 +5,10 @@ from datetime import date, datetime, timedelta
 from uuid import UUID
 
 from ..config import supabase
+from ..utils.auth import get_user_id_from_token
+from ..utils.family import FamilyGraph
+from ..utils.health_snapshot import get_snapshot
+from ..utils.nutrition_rollups import MEAL_NUTRIENTS, get_daily_rollups
 
 router = APIRouter(prefix="/parent/reports", tags=["parent-reports"])
 oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
@@ -16,54 +20,13 @@ oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 def _get_parent_children_ids(parent_user_id: str) -> List[str]:
     """Return active child user_ids for families where user is head/parent."""
-    head_resp = (
-        supabase.table("family_groups")
-        .select("family_id")
-        .eq("family_head_id", str(parent_user_id))
-        .eq("is_active", True)
-        .execute()
-    )
-    head_family_ids = {row.get("family_id") for row in (getattr(head_resp, "data", None) or [])}
-
-    member_resp = (
-        supabase.table("family_members")
-        .select("family_id, role, is_active")
-        .eq("user_id", str(parent_user_id))
-        .eq("is_active", True)
-        .execute()
-    )
-    member_family_ids = {
-        row.get("family_id")
-        for row in (getattr(member_resp, "data", None) or [])
-        if row.get("role") in ("head", "parent")
-    }
-    family_ids = list(head_family_ids.union(member_family_ids))
-    if not family_ids:
-        return []
-
-    fm_resp = (
-        supabase.table("family_members")
-        .select("user_id, role, is_active")
-        .in_("family_id", family_ids)
-        .eq("role", "child")
-        .eq("is_active", True)
-        .execute()
-    )
-    child_ids: List[str] = []
-    for row in (getattr(fm_resp, "data", None) or []):
-        uid = row.get("user_id")
-        if uid:
-            child_ids.append(uid)
-    return child_ids
+    return FamilyGraph().children_ids(str(parent_user_id))
 
 
 def _require_parent_and_children(token: str) -> tuple[str, List[str]]:
-    auth = supabase.auth.get_user(token)
-    user = getattr(auth, "user", None)
-    if not user or not user.id:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    children = _get_parent_children_ids(user.id)
-    return user.id, children
+    user_id = get_user_id_from_token(token)
+    children = _get_parent_children_ids(user_id)
+    return user_id, children
 
 
 # -------------------------
@@ -151,8 +114,12 @@ def get_student_report(student_id: str = Path(...), token: str = Depends(oauth2)
         or []
     )
 
-    # Water intake (today)
+    # Nutrition totals per day for the last week (today is the last row, if logged)
+    days = get_daily_rollups(student_id, date.today() - timedelta(days=6), date.today())
     today = date.today().isoformat()
+    today_row = next((d for d in days if str(d.get("day")) == today), {})
+
+    # Water intake (today)
     water_logs = (
         supabase.table("water_intake")
         .select("intake_id, amount_ml, container_type, intake_time, intake_date")
@@ -163,7 +130,7 @@ def get_student_report(student_id: str = Path(...), token: str = Depends(oauth2)
         .data
         or []
     )
-    total_ml = sum(int(w.get("amount_ml") or 0) for w in water_logs)
+    total_ml = int(float(today_row.get("water_ml") or 0))
 
     # Meals (today)
     start_today = f"{today} 00:00:00"
@@ -181,16 +148,9 @@ def get_student_report(student_id: str = Path(...), token: str = Depends(oauth2)
     )
 
     # Latest health metrics
-    metrics = (
-        supabase.table("health_metrics")
-        .select("created_at, weight, height, bmi, systolic, diastolic, blood_sugar, heart_rate, notes, age_years, sex")
-        .eq("student_id", student_id)
-        .order("created_at", desc=True)
-        .limit(1)
-        .execute()
-        .data
+    latest_metrics = get_snapshot(
+        student_id, "created_at, weight, height, bmi, systolic, diastolic, blood_sugar, heart_rate, notes, age_years, sex"
     )
-    latest_metrics = (metrics or [None])[0]
 
     # Latest nutrition suggestions
     latest_sugg = (
@@ -223,6 +183,10 @@ def get_student_report(student_id: str = Path(...), token: str = Depends(oauth2)
             "logs": water_logs,
         },
         "meals": meals,
+        "nutrition": {
+            "today": {k: float(today_row.get(k) or 0) for k in MEAL_NUTRIENTS},
+            "daily": days,
+        },
         "health_metrics_latest": latest_metrics,
         "nutrition_suggestion_latest": latest_nutrition,
     }
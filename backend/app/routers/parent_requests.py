@@ -5,7 +5,7 @@ from uuid import UUID
 from datetime import datetime
 
 from ..config import supabase
-from ..utils.profile_utils import get_user_id_from_token
+from ..utils.auth import get_user_id_from_token
 from ._shared_join_requests import (
     list_pending_for_family_head,
     approve_family_join_request,
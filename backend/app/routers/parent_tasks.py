@@ -4,6 +4,9 @@ from pydantic import BaseModel
 from typing import Optional, List
 from uuid import UUID
 from ..config import supabase
+from ..utils.auth import get_user_id_from_token
+from ..utils.family import FamilyGraph
+from ..utils.realtime import publish_task
 from ..models import TaskCreate, TaskUpdate # Assuming these Pydantic models exist
 from datetime import datetime, timezone
 
@@ -19,46 +22,10 @@ def get_parent_children_ids(parent_user_id: UUID) -> List[UUID]:
     Resolve parent's children via family groups/members:
     - Families where the user is family_head_id OR a member with role in ("head", "parent") and is_active.
     - Children are members in those families with role = "child" and is_active.
-    Returns list of child UUIDs.
+    Returns list of child UUIDs. Lookups are cached by FamilyGraph.
     """
-    # Families where user is head
-    head_resp = (
-        supabase.table("family_groups")
-        .select("family_id")
-        .eq("family_head_id", str(parent_user_id))
-        .eq("is_active", True)
-        .execute()
-    )
-    head_family_ids = {row.get("family_id") for row in (head_resp.data or [])}
-
-    # Families where user is parent/head member
-    member_resp = (
-        supabase.table("family_members")
-        .select("family_id, role, is_active")
-        .eq("user_id", str(parent_user_id))
-        .eq("is_active", True)
-        .execute()
-    )
-    member_family_ids = {row.get("family_id") for row in (member_resp.data or []) if row.get("role") in ("head", "parent")}
-
-    family_ids = list(head_family_ids.union(member_family_ids))
-    if not family_ids:
-        return []
-
-    # Children within these families
-    fm_resp = (
-        supabase.table("family_members")
-        .select("user_id, role, is_active")
-        .in_("family_id", family_ids)
-        .eq("role", "child")
-        .eq("is_active", True)
-        .execute()
-    )
     child_ids: List[UUID] = []
-    for row in (fm_resp.data or []):
-        uid = row.get("user_id")
-        if not uid:
-            continue
+    for uid in FamilyGraph().children_ids(str(parent_user_id)):
         try:
             child_ids.append(UUID(uid))
         except Exception:
@@ -73,12 +40,9 @@ def get_parent_children_ids(parent_user_id: UUID) -> List[UUID]:
 @router.get("/summary")
 def get_tasks_summary(token: str = Depends(oauth2)):
     # Step 1: Get current user and their children
-    auth_resp = supabase.auth.get_user(token)
-    user = auth_resp.user
-    if not user or not user.id:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    user_id = get_user_id_from_token(token)
     
-    child_ids_str = [str(cid) for cid in get_parent_children_ids(user.id)]
+    child_ids_str = [str(cid) for cid in get_parent_children_ids(user_id)]
     if not child_ids_str:
         return {"activeTasks": 0, "overdue": 0, "completionRate": "0%", "totalThisMonth": 0}
 
@@ -111,12 +75,9 @@ def get_tasks_summary(token: str = Depends(oauth2)):
 @router.get("/recent")
 def recent_tasks(token: str = Depends(oauth2)):
     # Step 1: Get current user and their children
-    auth_resp = supabase.auth.get_user(token)
-    user = auth_resp.user
-    if not user or not user.id:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    user_id = get_user_id_from_token(token)
 
-    child_ids_str = [str(cid) for cid in get_parent_children_ids(user.id)]
+    child_ids_str = [str(cid) for cid in get_parent_children_ids(user_id)]
     if not child_ids_str:
         return []
 
@@ -149,12 +110,9 @@ def recent_tasks(token: str = Depends(oauth2)):
 @router.get("/overdue")
 def overdue_tasks(token: str = Depends(oauth2)):
     # Step 1: Get current user and their children
-    auth_resp = supabase.auth.get_user(token)
-    user = auth_resp.user
-    if not user or not user.id:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    user_id = get_user_id_from_token(token)
 
-    child_ids_str = [str(cid) for cid in get_parent_children_ids(user.id)]
+    child_ids_str = [str(cid) for cid in get_parent_children_ids(user_id)]
     if not child_ids_str:
         return []
 
@@ -188,12 +146,9 @@ def overdue_tasks(token: str = Depends(oauth2)):
 @router.post("/", status_code=201)
 def create_task(task: TaskCreate, token: str = Depends(oauth2)):
     # Step 1: Get current user and their children
-    auth_resp = supabase.auth.get_user(token)
-    user = auth_resp.user
-    if not user or not user.id:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    user_id = get_user_id_from_token(token)
 
-    child_ids = get_parent_children_ids(user.id)
+    child_ids = get_parent_children_ids(user_id)
 
     # Step 2: Authorization Check
     if task.assigned_to not in child_ids:
@@ -201,7 +156,7 @@ def create_task(task: TaskCreate, token: str = Depends(oauth2)):
 
     # Step 3: Insert the task, ensuring assigned_by is the current parent
     task_data = task.dict()
-    task_data['assigned_by'] = str(user.id)
+    task_data['assigned_by'] = user_id
 
     # Ensure JSON serializable payload (convert UUIDs and datetimes)
     from datetime import datetime, date
@@ -223,18 +178,16 @@ def create_task(task: TaskCreate, token: str = Depends(oauth2)):
     data = getattr(response, "data", None)
     if not data:
         raise HTTPException(status_code=400, detail="Failed to create task")
+    publish_task(data[0], "created")
     return data[0]
 
 # --- Read All Tasks for Parent's Children (Secure) ---
 @router.get("/", response_model=List[dict])
 def get_all_tasks(token: str = Depends(oauth2)):
     # Step 1: Get current user and their children
-    auth_resp = supabase.auth.get_user(token)
-    user = auth_resp.user
-    if not user or not user.id:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    user_id = get_user_id_from_token(token)
 
-    child_ids_str = [str(cid) for cid in get_parent_children_ids(user.id)]
+    child_ids_str = [str(cid) for cid in get_parent_children_ids(user_id)]
     if not child_ids_str:
         return []
 
@@ -248,12 +201,9 @@ def get_all_tasks(token: str = Depends(oauth2)):
 @router.get("/{task_id}", response_model=dict)
 def get_task(task_id: UUID, token: str = Depends(oauth2)):
     # Step 1: Get current user and their children
-    auth_resp = supabase.auth.get_user(token)
-    user = auth_resp.user
-    if not user or not user.id:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    user_id = get_user_id_from_token(token)
 
-    child_ids = get_parent_children_ids(user.id)
+    child_ids = get_parent_children_ids(user_id)
 
     # Step 2: Fetch the task
     response = supabase.table("tasks").select("*").eq("task_id", str(task_id)).single().execute()
@@ -272,12 +222,9 @@ def get_task(task_id: UUID, token: str = Depends(oauth2)):
 @router.put("/{task_id}")
 def update_task(task_id: UUID, task_update: TaskUpdate, token: str = Depends(oauth2)):
     # Step 1: Get current user and their children
-    auth_resp = supabase.auth.get_user(token)
-    user = auth_resp.user
-    if not user or not user.id:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    user_id = get_user_id_from_token(token)
 
-    child_ids = get_parent_children_ids(user.id)
+    child_ids = get_parent_children_ids(user_id)
 
     # Step 2: Fetch the existing task to verify ownership
     existing_task_resp = supabase.table("tasks").select("assigned_to, assigned_by").eq("task_id", str(task_id)).single().execute()
@@ -287,27 +234,26 @@ def update_task(task_id: UUID, task_update: TaskUpdate, token: str = Depends(oau
     existing_task = existing_task_resp.data
 
     # Step 3: Authorization Check (Must be assigned to their child AND assigned by them)
-    if UUID(existing_task['assigned_to']) not in child_ids or UUID(existing_task['assigned_by']) != user.id:
+    if UUID(existing_task['assigned_to']) not in child_ids or UUID(existing_task['assigned_by']) != UUID(user_id):
         raise HTTPException(status_code=403, detail="You are not authorized to modify this task.")
 
     # Step 4: Perform the update
     update_data = {k: v for k, v in task_update.dict().items() if v is not None}
     try:
-        supabase.table("tasks").update(update_data).eq("task_id", str(task_id)).execute()
+        response = supabase.table("tasks").update(update_data).eq("task_id", str(task_id)).execute()
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to update task: {e}")
+    for row in getattr(response, "data", None) or []:
+        publish_task(row, "updated")
     return {"message": "Task updated successfully"}
 
 # --- Delete Task (Secure) ---
 @router.delete("/{task_id}")
 def delete_task(task_id: UUID, token: str = Depends(oauth2)):
     # Step 1: Get current user and their children
-    auth_resp = supabase.auth.get_user(token)
-    user = auth_resp.user
-    if not user or not user.id:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    user_id = get_user_id_from_token(token)
 
-    child_ids = get_parent_children_ids(user.id)
+    child_ids = get_parent_children_ids(user_id)
 
     # Step 2: Fetch the existing task to verify ownership
     existing_task_resp = supabase.table("tasks").select("assigned_to, assigned_by").eq("task_id", str(task_id)).single().execute()
@@ -317,12 +263,14 @@ def delete_task(task_id: UUID, token: str = Depends(oauth2)):
     existing_task = existing_task_resp.data
 
     # Step 3: Authorization Check (Must be assigned to their child AND assigned by them)
-    if UUID(existing_task['assigned_to']) not in child_ids or UUID(existing_task['assigned_by']) != user.id:
+    if UUID(existing_task['assigned_to']) not in child_ids or UUID(existing_task['assigned_by']) != UUID(user_id):
         raise HTTPException(status_code=403, detail="You are not authorized to delete this task.")
 
     # Step 4: Perform the deletion
     try:
-        supabase.table("tasks").delete().eq("task_id", str(task_id)).execute()
+        response = supabase.table("tasks").delete().eq("task_id", str(task_id)).execute()
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to delete task: {e}")
+    for row in getattr(response, "data", None) or []:
+        publish_task(row, "deleted")
     return {"message": "Task deleted successfully"}
\ No newline at end of file
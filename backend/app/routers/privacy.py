@@ -3,7 +3,7 @@ from fastapi.security import OAuth2PasswordBearer
 from typing import Dict, Any, Optional
 
 from ..config import supabase
-from ..utils.profile_utils import get_user_id_from_token
+from ..utils.auth import get_user_id_from_token
 
 router = APIRouter(prefix="/user", tags=["privacy-settings"])
 oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
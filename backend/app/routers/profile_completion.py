@@ -5,8 +5,9 @@ from ..models import (
     StudentProfileCreate, TeacherProfileCreate, ParentProfileCreate,
     ProfileCompletionResponse, ProfileStatusResponse
 )
+from ..utils.auth import get_user_id_from_token
 from ..utils.profile_utils import (
-    get_user_id_from_token, get_user_type, check_profile_exists,
+    get_user_type, check_profile_exists,
     get_profile_data, create_profile, update_profile
 )
 from typing import Dict, Any
@@ -0,0 +1,122 @@
+import json
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from ..utils.auth import get_user_id_from_token
+from ..utils.db import table, fetch_one, fetch_rows, gather_rows
+from ..utils.family import FamilyGraph, get_family_graph
+from ..utils.realtime import REALTIME_HEARTBEAT_SECONDS, Subscription, hub, student_topic
+from ..utils.sse import sse_event, SSE_HEADERS
+
+router = APIRouter(prefix="/realtime", tags=["realtime"])
+
+# Parents and teachers subscribe here instead of polling their dashboards;
+# events are hints to refetch (see app/utils/realtime.py for the topics).
+# Browsers' EventSource/WebSocket cannot set an Authorization header, so the
+# bearer token may also be passed as ?token=.
+
+
+def _bearer(token: Optional[str], authorization: Optional[str]) -> str:
+    if token:
+        return token
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:]
+    raise HTTPException(status_code=401, detail="Unauthorized")
+
+
+def get_subscriber_id(
+    token: Optional[str] = Query(None),
+    authorization: Optional[str] = Header(None),
+) -> str:
+    return get_user_id_from_token(_bearer(token, authorization))
+
+
+async def _topics(user_id: str, family: FamilyGraph) -> List[str]:
+    """Topics the caller may see: their children, or their students and classrooms.
+
+    Resolved once per connection; clients reconnect after linking a child or
+    enrolling a student.
+    """
+    user = await fetch_one(table("users").select("user_type").eq("user_id", user_id))
+    user_type = (user or {}).get("user_type")
+
+    if user_type == "parent":
+        resolved = await family.aresolve(user_id)
+        return (
+            [student_topic(c) for c in resolved.child_ids]
+            + [f"family:{f}" for f in sorted(resolved.head_family_ids)]
+        )
+
+    if user_type == "teacher":
+        assigned, classrooms = await gather_rows(
+            table("students").select("student_id").eq("assigned_teacher", user_id),
+            table("classrooms").select("classroom_id").eq("teacher_id", user_id),
+        )
+        classroom_ids = [str(c["classroom_id"]) for c in classrooms]
+        enrolled = await fetch_rows(
+            table("classroom_students").select("student_id")
+            .in_("classroom_id", classroom_ids)
+            .eq("is_active", True)
+        ) if classroom_ids else []
+        student_ids = sorted({str(s["student_id"]) for s in assigned + enrolled if s.get("student_id")})
+        # classroom join requests may target the teacher's user id directly
+        return (
+            [student_topic(s) for s in student_ids]
+            + [f"classroom:{c}" for c in classroom_ids + [user_id]]
+        )
+
+    raise HTTPException(status_code=403, detail="Realtime events are for parents and teachers")
+
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    user_id: str = Depends(get_subscriber_id),
+    family: FamilyGraph = Depends(get_family_graph),
+):
+    """Server-Sent Events: `ready`, then `health_alert`, `task` and `join_request` events."""
+    sub = hub.subscribe(await _topics(user_id, family))
+
+    async def events():
+        try:
+            yield sse_event({"topics": sorted(sub.topics)}, event="ready")
+            while not await request.is_disconnected():
+                event = await sub.next(REALTIME_HEARTBEAT_SECONDS)
+                # SSE comment line: keeps idle proxies from dropping the stream
+                yield ": keep-alive\n\n" if event is None else sse_event(event, event=event["type"])
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.websocket("/ws")
+async def websocket_events(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None),
+    authorization: Optional[str] = Header(None),
+    family: FamilyGraph = Depends(get_family_graph),
+):
+    """Same events as /realtime/events as JSON messages ({"type": ...})."""
+    try:
+        user_id = await run_in_threadpool(get_user_id_from_token, _bearer(token, authorization))
+        topics = await _topics(user_id, family)
+    except HTTPException as e:
+        # 1008 = policy violation
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+
+    await websocket.accept()
+    sub: Subscription = hub.subscribe(topics)
+    try:
+        await websocket.send_text(json.dumps({"type": "ready", "topics": sorted(sub.topics)}))
+        while True:
+            event = await sub.next(REALTIME_HEARTBEAT_SECONDS)
+            await websocket.send_text(json.dumps(event or {"type": "keep-alive"}, default=str))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(sub)
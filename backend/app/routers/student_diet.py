@@ -1,39 +1,71 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
 from typing import List
-from fastapi.security import OAuth2PasswordBearer
 from ..config import supabase
-from ..models import DietEntry, MealEntry, MealCreate
+from ..models import DietEntry, MealEntry, MealCreate, MealBulkCreate, WaterIntakeCreate, WaterBulkCreate
+from ..utils.nutrition_cache import NutritionCache, normalise_description
+from ..utils.nutrition_worker import NutritionEnrichmentWorker
+from ..utils.nutrition_rollups import (
+    get_daily_rollups, record_diet_change, record_meal_change, record_meals_inserted, record_water_inserted,
+)
+from ..utils.student_identity import StudentIdentity, get_current_student
 from google import genai
 import os
 import json
 from dotenv import load_dotenv
-import jwt
 from datetime import datetime, date
 from uuid import UUID
-from pydantic import BaseModel
 
 router = APIRouter(prefix="/health", tags=["health"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 load_dotenv()
 _gemini_client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 _gemini_model = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+# Bump when the prompt/schema below changes so cached estimates are not reused
+_NUTRITION_PROMPT_VERSION = "1"
+
+nutrition_cache = NutritionCache(version=f"{_gemini_model}:{_NUTRITION_PROMPT_VERSION}")
+# Default for POST /health/meals?defer_nutrition=
+MEAL_NUTRITION_DEFERRED = os.getenv("MEAL_NUTRITION_DEFERRED", "false").lower() in ("1", "true", "yes")
+
+_ZERO_NUTRITION = {"calories": 0.0, "proteins": 0.0, "carbs": 0.0, "fat": 0.0, "sodium": 0.0, "sugar": 0.0}
 
 
 def estimate_nutrition_with_gemini(description: str) -> dict:
-    """Call Gemini to estimate nutrition. Returns dict with calories, proteins, carbs, fat (numbers)."""
-    response_schema = {
-        "type": "object",
-        "properties": {
-            "calories": {"type": "number"},
-            "proteins": {"type": "number"},
-            "carbs": {"type": "number"},
-            "fat": {"type": "number"},
-            "sodium": {"type": "number"},
-            "sugar": {"type": "number"},
-        },
-        "required": ["calories", "proteins", "carbs", "fat", "sodium", "sugar"],
-    }
+    """Estimate nutrition for a meal description, via the cache when possible.
+
+    Returns dict with calories, proteins, carbs, fat, sodium, sugar (numbers);
+    zeros if Gemini fails (failures are not cached).
+    """
+    nutrition = nutrition_cache.get_or_compute(description, _request_nutrition_estimate)
+    return nutrition if nutrition is not None else dict(_ZERO_NUTRITION)
+
+
+_NUTRITION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "calories": {"type": "number"},
+        "proteins": {"type": "number"},
+        "carbs": {"type": "number"},
+        "fat": {"type": "number"},
+        "sodium": {"type": "number"},
+        "sugar": {"type": "number"},
+    },
+    "required": ["calories", "proteins", "carbs", "fat", "sodium", "sugar"],
+}
+
+
+def _clean_nutrition(data: dict) -> dict:
+    # Basic sanitation to ensure numbers
+    def n(v):
+        try:
+            return float(v)
+        except Exception:
+            return 0.0
+    return {k: n(data.get(k)) for k in _ZERO_NUTRITION}
+
+
+def _request_nutrition_estimate(description: str) -> dict | None:
+    """Call Gemini to estimate nutrition. Returns None on any failure."""
     prompt = (
         "Estimate macronutrients for the following food description. "
         "Return strict JSON with numeric fields: calories (kcal), proteins (g), carbs (g), fat (g).\n\n"
@@ -45,35 +77,53 @@ def estimate_nutrition_with_gemini(description: str) -> dict:
             contents=[{"role": "user", "parts": [{"text": prompt}]}],
             config={
                 "response_mime_type": "application/json",
-                "response_schema": response_schema,
+                "response_schema": _NUTRITION_SCHEMA,
             },
         )
-        data = json.loads(resp.text)
-        # Basic sanitation to ensure numbers
-        def n(v):
-            try:
-                return float(v)
-            except Exception:
-                return 0.0
-        return {
-            "calories": n(data.get("calories")),
-            "proteins": n(data.get("proteins")),
-            "carbs": n(data.get("carbs")),
-            "fat": n(data.get("fat")),
-            "sodium": n(data.get("sodium")),
-            "sugar": n(data.get("sugar")),
-        }
+        return _clean_nutrition(json.loads(resp.text))
     except Exception as e:
-        # Fallback to zeros on any failure
         print(f"Gemini nutrition estimate failed: {e}")
-        return {"calories": 0.0, "proteins": 0.0, "carbs": 0.0, "fat": 0.0, "sodium": 0.0, "sugar": 0.0}
+        return None
+
 
-def get_user_email_from_token(token: str = Depends(oauth2_scheme)) -> str:
+def _request_nutrition_estimates(descriptions: List[str]) -> List[dict | None]:
+    """Estimate several descriptions in one Gemini call (one result per input, same order).
+
+    Falls back to one call per description if the batch answer is unusable.
+    """
+    if len(descriptions) == 1:
+        return [_request_nutrition_estimate(descriptions[0])]
+    foods = "\n".join(f"{i + 1}. {d}" for i, d in enumerate(descriptions))
+    prompt = (
+        "Estimate macronutrients for each of the following numbered food descriptions. "
+        "Return a strict JSON array with exactly one object per food, in the same order, each with numeric fields: "
+        "calories (kcal), proteins (g), carbs (g), fat (g), sodium (mg), sugar (g).\n\n"
+        f"Foods:\n{foods}"
+    )
     try:
-        payload = jwt.decode(token, options={"verify_signature": False})
-        return payload.get("email")
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+        resp = _gemini_client.models.generate_content(
+            model=_gemini_model,
+            contents=[{"role": "user", "parts": [{"text": prompt}]}],
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": {"type": "array", "items": _NUTRITION_SCHEMA},
+            },
+        )
+        data = json.loads(resp.text)
+        if isinstance(data, list) and len(data) == len(descriptions):
+            return [_clean_nutrition(item) if isinstance(item, dict) else None for item in data]
+        print(f"Gemini batch nutrition estimate returned {len(data) if isinstance(data, list) else 'no'} items for {len(descriptions)}")
+    except Exception as e:
+        print(f"Gemini batch nutrition estimate failed: {e}")
+    return [_request_nutrition_estimate(d) for d in descriptions]
+
+
+def _on_meal_enriched(meal: dict) -> None:
+    # deferred meals were inserted with zero nutrients
+    record_meal_change(old={**meal, **_ZERO_NUTRITION}, new=meal)
+
+
+nutrition_worker = NutritionEnrichmentWorker(nutrition_cache, _request_nutrition_estimates, on_ready=_on_meal_enriched)
 
 # -------------------------
 # Student Diet Endpoints
@@ -81,25 +131,23 @@ def get_user_email_from_token(token: str = Depends(oauth2_scheme)) -> str:
 
 
 @router.get("/student_diet", response_model=List[DietEntry])
-def get_diet_logs(email: str = Depends(get_user_email_from_token)):
-    child_id = supabase.table("students").select(
-        "student_id").eq("email", email).execute()
+def get_diet_logs(student: StudentIdentity = Depends(get_current_student)):
     res = supabase.table("student_diet").select("id, time, water_glasses, sodium, sugar").eq(
-        "student_id", child_id.data[0]['student_id']).order("time", desc=True).execute()
+        "student_id", student.student_id).order("time", desc=True).execute()
     return res.data
 
 
 @router.post("/student_diet", response_model=dict)
-def log_student_diet(data: DietEntry, email: str = Depends(get_user_email_from_token)):
-    child_id = supabase.table("students").select(
-        "student_id").eq("email", email).execute()
-    supabase.table("student_diet").insert({
-        "student_id": child_id.data[0]['student_id'],
+def log_student_diet(data: DietEntry, student: StudentIdentity = Depends(get_current_student)):
+    res = supabase.table("student_diet").insert({
+        "student_id": student.student_id,
         "time": datetime.now().isoformat(),
         "water_glasses": data.water_glasses,
         "sodium": data.sodium,
         "sugar": data.sugar,
     }).execute()
+    for row in res.data or []:
+        record_diet_change(new=row)
     return {"message": "Diet entry saved"}
 
 
@@ -107,37 +155,38 @@ def log_student_diet(data: DietEntry, email: str = Depends(get_user_email_from_t
 def update_diet_entry(
     entry_id: UUID,
     data: DietEntry,
-    email: str = Depends(get_user_email_from_token)
+    student: StudentIdentity = Depends(get_current_student)
 ):
-    child_id = supabase.table("students").select(
-        "student_id").eq("email", email).execute()
+    old = supabase.table("student_diet").select("student_id, time, sodium, sugar").eq("id", entry_id).eq(
+        "student_id", student.student_id).execute()
     response = supabase.table("student_diet").update({
         "water_glasses": data.water_glasses,
         "sodium": data.sodium,
         "sugar": data.sugar
-    }).eq("id", entry_id).eq("student_id", child_id.data[0]['student_id']).execute()
+    }).eq("id", entry_id).eq("student_id", student.student_id).execute()
 
     if not response.data:
         raise HTTPException(
             status_code=404, detail="Diet entry not found or unauthorized")
 
+    record_diet_change(old=(old.data or [None])[0], new=response.data[0])
     return {"message": "Diet entry updated"}
 
 
 @router.delete("/student_diet/{entry_id}", response_model=dict)
 def delete_diet_entry(
     entry_id: UUID,
-    email: str = Depends(get_user_email_from_token)
+    student: StudentIdentity = Depends(get_current_student)
 ):
-    child_id = supabase.table("students").select(
-        "student_id").eq("email", email).execute()
     response = supabase.table("student_diet").delete().eq("id", entry_id).eq(
-        "student_id", child_id.data[0]['student_id']).execute()
+        "student_id", student.student_id).execute()
 
     if not response.data:
         raise HTTPException(
             status_code=404, detail="Diet entry not found or unauthorized")
 
+    for row in response.data:
+        record_diet_change(old=row)
     return {"message": "Diet entry deleted"}
 
 
@@ -145,8 +194,8 @@ def delete_diet_entry(
 # Meals Logging Endpoints
 # -------------------------
 @router.get("/meals", response_model=List[MealEntry])
-def get_meal_logs(email: str = Depends(get_user_email_from_token)):
-    student_id = _get_student_id(email)
+def get_meal_logs(student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     today = date.today().isoformat()
     # Use half-open interval [today 00:00, tomorrow 00:00)
     # Construct tomorrow date string by adding one day
@@ -154,7 +203,7 @@ def get_meal_logs(email: str = Depends(get_user_email_from_token)):
     tomorrow = (date.today() + timedelta(days=1)).isoformat()
     res = (
         supabase.table("meals")
-        .select("id, time, mealtype, description, calories, proteins, carbs, fat")
+        .select("id, time, mealtype, description, calories, proteins, carbs, fat, nutrition_status")
         .eq("student_id", student_id)
         .gte("time", f"{today} 00:00:00")
         .lt("time", f"{tomorrow} 00:00:00")
@@ -165,38 +214,102 @@ def get_meal_logs(email: str = Depends(get_user_email_from_token)):
 
 
 @router.post("/meals", response_model=dict)
-def log_meal(data: MealCreate, email: str = Depends(get_user_email_from_token)):
-    student_id = _get_student_id(email)
-    # Always recompute nutrition on backend using Gemini; ignore client-sent nutrient values
-    nutrition = estimate_nutrition_with_gemini(data.description)
+def log_meal(
+    data: MealCreate,
+    defer_nutrition: bool = Query(MEAL_NUTRITION_DEFERRED, description="Save now with nutrition_status=pending; nutrition is filled in by a background worker"),
+    student: StudentIdentity = Depends(get_current_student),
+):
+    student_id = student.student_id
     payload = {
         "student_id": student_id,
         "time": datetime.now().isoformat(),
         "mealtype": data.mealtype,
         "description": data.description,
-        "calories": nutrition.get("calories", 0.0),
-        "proteins": nutrition.get("proteins", 0.0),
-        "carbs": nutrition.get("carbs", 0.0),
-        "fat": nutrition.get("fat", 0.0),
-        "sodium": nutrition.get("sodium", 0.0),
-        "sugar": nutrition.get("sugar", 0.0),
     }
+    if defer_nutrition:
+        # a cache hit is still answered inline; otherwise the worker fills it in
+        nutrition = nutrition_cache.get(data.description)
+        payload["nutrition_status"] = "ready" if nutrition is not None else "pending"
+    else:
+        # Always recompute nutrition on backend using Gemini; ignore client-sent nutrient values
+        nutrition = estimate_nutrition_with_gemini(data.description)
+    payload.update({k: (nutrition or _ZERO_NUTRITION).get(k, 0.0) for k in _ZERO_NUTRITION})
     try:
-        supabase.table("meals").insert(payload).execute()
+        res = supabase.table("meals").insert(payload).execute()
     except Exception as e:
         # Surface a readable error back to the client
         raise HTTPException(status_code=500, detail=f"Failed to log meal: {e}")
+    for row in res.data or []:
+        record_meal_change(new=row)
+    if payload.get("nutrition_status") == "pending":
+        meal = (res.data or [{}])[0]
+        if meal.get("id"):
+            nutrition_worker.submit(meal["id"], data.description)
+        return {"message": "Meal entry saved", "id": meal.get("id"), "nutrition_status": "pending"}
     return {"message": "Meal entry saved"}
 
 
+@router.post("/meals/bulk", response_model=dict)
+def log_meals_bulk(
+    data: MealBulkCreate,
+    defer_nutrition: bool = Query(MEAL_NUTRITION_DEFERRED, description="Save now with nutrition_status=pending; nutrition is filled in by a background worker"),
+    student: StudentIdentity = Depends(get_current_student),
+):
+    """Back-fill many meals in one request.
+
+    Each distinct description is estimated once (cache first, then batched
+    model calls) and all rows go in with a single multi-row insert.
+    """
+    descriptions = [m.description for m in data.meals]
+    if defer_nutrition:
+        nutrition_by_desc = nutrition_cache.get_many(descriptions)
+    else:
+        nutrition_by_desc = nutrition_worker.estimate_many(descriptions)
+
+    now = datetime.now().isoformat()
+    payload = []
+    failed = 0
+    for meal in data.meals:
+        nutrition = nutrition_by_desc.get(normalise_description(meal.description))
+        row = {
+            "student_id": student.student_id,
+            "time": meal.time.isoformat() if meal.time else now,
+            "mealtype": meal.mealtype,
+            "description": meal.description,
+            **{k: (nutrition or _ZERO_NUTRITION).get(k, 0.0) for k in _ZERO_NUTRITION},
+        }
+        if defer_nutrition:
+            row["nutrition_status"] = "ready" if nutrition is not None else "pending"
+        elif nutrition is None:
+            failed += 1  # saved with zeros, like a single meal whose estimate failed
+        payload.append(row)
+    try:
+        res = supabase.table("meals").insert(payload).execute()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to import meals: {e}")
+
+    rows = res.data or []
+    record_meals_inserted(rows)
+    pending = [r for r in rows if r.get("nutrition_status") == "pending" and r.get("id")]
+    for row in pending:
+        nutrition_worker.submit(row["id"], row.get("description") or "")
+    return {
+        "message": "Meal entries saved",
+        "inserted": len(rows),
+        "distinct_descriptions": len(nutrition_by_desc),
+        "pending": len(pending),
+        "estimate_failed": failed,
+    }
+
+
 @router.patch("/meals/{entry_id}", response_model=dict)
 def update_meal_entry(
     entry_id: UUID,
     data: MealEntry,
-    email: str = Depends(get_user_email_from_token)
+    student: StudentIdentity = Depends(get_current_student)
 ):
-    child_id = supabase.table("students").select(
-        "student_id").eq("email", email).execute()
+    old = supabase.table("meals").select("student_id, time, calories, proteins, carbs, fat, sodium, sugar").eq("id", entry_id).eq(
+        "student_id", student.student_id).execute()
     response = supabase.table("meals").update({
         "mealtype": data.mealtype,
         "description": data.description,
@@ -206,29 +319,32 @@ def update_meal_entry(
         "fat": data.fat,
         "sodium": data.sodium,
         "sugar": data.sugar,
-    }).eq("id", entry_id).eq("student_id", child_id.data[0]['student_id']).execute()
+        # the user's values win over a pending background estimate
+        "nutrition_status": "ready",
+    }).eq("id", entry_id).eq("student_id", student.student_id).execute()
 
     if not response.data:
         raise HTTPException(
             status_code=404, detail="Meal entry not found or unauthorized")
 
+    record_meal_change(old=(old.data or [None])[0], new=response.data[0])
     return {"message": "Meal entry updated"}
 
 
 @router.delete("/meals/{entry_id}", response_model=dict)
 def delete_meal_entry(
     entry_id: UUID,
-    email: str = Depends(get_user_email_from_token)
+    student: StudentIdentity = Depends(get_current_student)
 ):
-    child_id = supabase.table("students").select(
-        "student_id").eq("email", email).execute()
     response = supabase.table("meals").delete().eq("id", entry_id).eq(
-        "student_id", child_id.data[0]['student_id']).execute()
+        "student_id", student.student_id).execute()
 
     if not response.data:
         raise HTTPException(
             status_code=404, detail="Meal entry not found or unauthorized")
 
+    for row in response.data:
+        record_meal_change(old=row)
     return {"message": "Meal entry deleted"}
 
 
@@ -236,35 +352,17 @@ def delete_meal_entry(
 # Water Intake Endpoints
 # -------------------------
 
-class WaterIntakeCreate(BaseModel):
-    amount_ml: int = 250
-    container_type: str = "glass"
-    intake_date: date | None = None
-    intake_time: str | None = None
-
-
-def _get_student_id(email: str) -> str:
-    child = supabase.table("students").select(
-        "student_id").eq("email", email).single().execute()
-    if not child.data:
-        raise HTTPException(status_code=404, detail="Student not found")
-    return child.data["student_id"]
-
-
 @router.get("/water/summary", response_model=dict)
-def get_water_summary(email: str = Depends(get_user_email_from_token)):
-    student_id = _get_student_id(email)
-    today = date.today().isoformat()
-    res = supabase.table("water_intake").select("amount_ml").eq(
-        "user_id", student_id).eq("intake_date", today).execute()
-    total_ml = sum((r.get("amount_ml") or 0) for r in (res.data or []))
+def get_water_summary(student: StudentIdentity = Depends(get_current_student)):
+    today = get_daily_rollups(student.student_id, date.today(), date.today())
+    total_ml = int(sum(float(r.get("water_ml") or 0) for r in today))
     glasses = round(total_ml / 250) if total_ml else 0
     return {"total_ml": total_ml, "glasses": glasses}
 
 
 @router.post("/water", response_model=dict)
-def add_water_intake(data: WaterIntakeCreate = Body(default=None), email: str = Depends(get_user_email_from_token)):
-    student_id = _get_student_id(email)
+def add_water_intake(data: WaterIntakeCreate = Body(default=None), student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     payload = {
         "user_id": student_id,
         "amount_ml": (data.amount_ml if data else 250),
@@ -272,14 +370,43 @@ def add_water_intake(data: WaterIntakeCreate = Body(default=None), email: str =
         "intake_date": (data.intake_date.isoformat() if (data and data.intake_date) else date.today().isoformat()),
         # let DB default the time if not provided
     }
-    supabase.table("water_intake").insert(payload).execute()
+    res = supabase.table("water_intake").insert(payload).execute()
+    record_water_inserted(res.data or [])
     # return updated summary
-    return get_water_summary(email)
+    return get_water_summary(student)
+
+
+@router.post("/water/bulk", response_model=dict)
+def add_water_intake_bulk(data: WaterBulkCreate, student: StudentIdentity = Depends(get_current_student)):
+    """Back-fill many water entries with a single multi-row insert."""
+    today = date.today().isoformat()
+    payload = []
+    for entry in data.entries:
+        row = {
+            "user_id": student.student_id,
+            "amount_ml": entry.amount_ml,
+            "container_type": entry.container_type,
+            "intake_date": entry.intake_date.isoformat() if entry.intake_date else today,
+        }
+        if entry.intake_time:
+            row["intake_time"] = entry.intake_time
+        payload.append(row)
+    try:
+        # rows without intake_time keep the column default
+        res = supabase.table("water_intake").insert(payload, default_to_null=False).execute()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to import water intake: {e}")
+    record_water_inserted(res.data or [])
+    return {
+        "message": "Water entries saved",
+        "inserted": len(res.data or []),
+        "total_ml": sum(row["amount_ml"] for row in payload),
+    }
 
 
 @router.get("/water/logs", response_model=List[dict])
-def get_water_logs(email: str = Depends(get_user_email_from_token)):
-    student_id = _get_student_id(email)
+def get_water_logs(student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     today = date.today().isoformat()
     res = (
         supabase.table("water_intake")
@@ -1,24 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Body, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Body, UploadFile, File, Form, Query, Response
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
-from typing import List
+from typing import List, Optional
 from ..config import supabase
+from ..utils.auth import get_user_id_from_token
+from ..utils.sse import sse_event, SSE_HEADERS
+from ..utils.pagination import keyset_page
+from ..utils.mood_rollups import record_mood_log_change, get_daily_rollups, mood_analytics
+from ..utils.chat_context import load_context, refresh_summary_later, SESSION_SUMMARY_COLUMNS
 from ..models import (
     EmotionalEntry, MoodLog, ChatSession, ChatMessage, EmergencyContact, SenderTypeEnum
 )
 from ..routers import chat_bot as chat_bot_module
 import json
+from datetime import datetime, timedelta, timezone
 
 router = APIRouter(prefix="/student/emotions", tags=["student-emotions"])
 oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 
-def get_user_id(token: str):
-    auth_res = supabase.auth.get_user(token)
-    if getattr(auth_res, 'error', None):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    return auth_res.user.id
-
 # -------------------------------
 # CRUD for emotional_entries
 # -------------------------------
@@ -26,7 +27,7 @@ def get_user_id(token: str):
 
 @router.post("/entries", response_model=dict)
 def create_emotional_entry(entry: dict = Body(...), token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     # Allow only DB columns
     allowed = {"title", "content", "tags", "privacy_level"}
     payload = {k: v for k, v in (entry or {}).items() if k in allowed}
@@ -39,16 +40,22 @@ def create_emotional_entry(entry: dict = Body(...), token: str = Depends(oauth2)
 
 
 @router.get("/entries", response_model=List[dict])
-def list_emotional_entries(token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
-    resp = supabase.table("emotional_entries").select(
-        "*").eq("user_id", user_id).order("created_at", desc=True).execute()
-    return getattr(resp, 'data', [])
+def list_emotional_entries(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = Query(None, description="cursor: page of older items"),
+    after: Optional[str] = Query(None, description="cursor: page of newer items"),
+    token: str = Depends(oauth2),
+):
+    """Newest first; see utils/pagination for the cursor headers."""
+    user_id = get_user_id_from_token(token)
+    query = supabase.table("emotional_entries").select("*").eq("user_id", user_id)
+    return keyset_page(query, response, "created_at", "entry_id", limit, before, after)
 
 
 @router.get("/entries/{entry_id}", response_model=dict)
 def get_emotional_entry(entry_id: str, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     resp = supabase.table("emotional_entries").select(
         "*").eq("entry_id", entry_id).eq("user_id", user_id).single().execute()
     data = getattr(resp, 'data', None)
@@ -59,7 +66,7 @@ def get_emotional_entry(entry_id: str, token: str = Depends(oauth2)):
 
 @router.patch("/entries/{entry_id}", response_model=dict)
 def update_emotional_entry(entry_id: str, entry: dict = Body(...), token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     allowed = {"title", "content", "tags", "privacy_level"}
     payload = {k: v for k, v in (entry or {}).items() if k in allowed}
     if not payload:
@@ -75,7 +82,7 @@ def update_emotional_entry(entry_id: str, entry: dict = Body(...), token: str =
 
 @router.delete("/entries/{entry_id}", response_model=dict)
 def delete_emotional_entry(entry_id: str, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     supabase.table("emotional_entries").delete().eq(
         "entry_id", entry_id).eq("user_id", user_id).execute()
     return {"deleted": True}
@@ -87,7 +94,7 @@ def delete_emotional_entry(entry_id: str, token: str = Depends(oauth2)):
 
 @router.post("/mood-logs", response_model=MoodLog)
 def create_mood_log(log: MoodLog, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     # Only allow DB columns and ensure JSON-serializable
     raw = jsonable_encoder(log, exclude_unset=True, exclude_none=True)
     allowed = {"mood", "energy_level", "sleep_quality",
@@ -98,20 +105,43 @@ def create_mood_log(log: MoodLog, token: str = Depends(oauth2)):
     data = getattr(resp, 'data', None)
     if not data:
         raise HTTPException(status_code=400, detail="Insert failed")
+    record_mood_log_change(new=data[0])
     return data[0]
 
 
 @router.get("/mood-logs", response_model=List[MoodLog])
-def list_mood_logs(token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
-    resp = supabase.table("mood_logs").select(
-        "*").eq("user_id", user_id).order("created_at", desc=True).execute()
-    return getattr(resp, 'data', [])
+def list_mood_logs(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = Query(None, description="cursor: page of older items"),
+    after: Optional[str] = Query(None, description="cursor: page of newer items"),
+    token: str = Depends(oauth2),
+):
+    """Newest first; see utils/pagination for the cursor headers."""
+    user_id = get_user_id_from_token(token)
+    query = supabase.table("mood_logs").select("*").eq("user_id", user_id)
+    return keyset_page(query, response, "created_at", "log_id", limit, before, after)
+
+
+@router.get("/mood-logs/analytics", response_model=dict)
+def mood_log_analytics(
+    days: int = Query(30, ge=1, le=366, description="window ending today"),
+    token: str = Depends(oauth2),
+):
+    """Daily/weekly mood distributions, energy/sleep/stress trends and logging streaks.
+
+    Read from the daily rollups maintained by the mood-log endpoints.
+    """
+    user_id = get_user_id_from_token(token)
+    end = datetime.now(timezone.utc).date()
+    start = end - timedelta(days=days - 1)
+    rows = get_daily_rollups([user_id], start, end).get(user_id, [])
+    return mood_analytics(rows, start, end)
 
 
 @router.get("/mood-logs/{log_id}", response_model=MoodLog)
 def get_mood_log(log_id: str, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     resp = supabase.table("mood_logs").select(
         "*").eq("log_id", log_id).eq("user_id", user_id).single().execute()
     data = getattr(resp, 'data', None)
@@ -122,24 +152,30 @@ def get_mood_log(log_id: str, token: str = Depends(oauth2)):
 
 @router.patch("/mood-logs/{log_id}", response_model=MoodLog)
 def update_mood_log(log_id: str, log: MoodLog, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     raw = jsonable_encoder(log, exclude_unset=True, exclude_none=True)
     allowed = {"mood", "energy_level", "sleep_quality",
                "stress_level", "notes", "log_date"}
     payload = {k: v for k, v in (raw or {}).items() if k in allowed}
+    # previous values, to move the rollup counters
+    old = getattr(supabase.table("mood_logs").select("*").eq(
+        "log_id", log_id).eq("user_id", user_id).execute(), 'data', None)
     resp = supabase.table("mood_logs").update(payload).eq(
         "log_id", log_id).eq("user_id", user_id).execute()
     data = getattr(resp, 'data', None)
     if not data:
         raise HTTPException(status_code=400, detail="Update failed")
+    record_mood_log_change(old=old[0] if old else None, new=data[0])
     return data[0]
 
 
 @router.delete("/mood-logs/{log_id}", response_model=dict)
 def delete_mood_log(log_id: str, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
-    supabase.table("mood_logs").delete().eq(
+    user_id = get_user_id_from_token(token)
+    resp = supabase.table("mood_logs").delete().eq(
         "log_id", log_id).eq("user_id", user_id).execute()
+    for row in getattr(resp, 'data', None) or []:
+        record_mood_log_change(old=row)
     return {"deleted": True}
 
 # -------------------------------
@@ -149,7 +185,7 @@ def delete_mood_log(log_id: str, token: str = Depends(oauth2)):
 
 @router.post("/sessions", response_model=ChatSession)
 def create_chat_session(session: ChatSession, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     payload = jsonable_encoder(session, exclude_unset=True, exclude_none=True)
     payload["user_id"] = user_id
     resp = supabase.table("chat_sessions").insert(payload).execute()
@@ -160,16 +196,22 @@ def create_chat_session(session: ChatSession, token: str = Depends(oauth2)):
 
 
 @router.get("/sessions", response_model=List[ChatSession])
-def list_chat_sessions(token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
-    resp = supabase.table("chat_sessions").select(
-        "*").eq("user_id", user_id).order("started_at", desc=True).execute()
-    return getattr(resp, 'data', [])
+def list_chat_sessions(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = Query(None, description="cursor: page of older items"),
+    after: Optional[str] = Query(None, description="cursor: page of newer items"),
+    token: str = Depends(oauth2),
+):
+    """Newest first; see utils/pagination for the cursor headers."""
+    user_id = get_user_id_from_token(token)
+    query = supabase.table("chat_sessions").select("*").eq("user_id", user_id)
+    return keyset_page(query, response, "started_at", "session_id", limit, before, after)
 
 
 @router.get("/sessions/{session_id}", response_model=ChatSession)
 def get_chat_session(session_id: str, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     resp = supabase.table("chat_sessions").select(
         "*").eq("session_id", session_id).eq("user_id", user_id).single().execute()
     data = getattr(resp, 'data', None)
@@ -180,7 +222,7 @@ def get_chat_session(session_id: str, token: str = Depends(oauth2)):
 
 @router.patch("/sessions/{session_id}", response_model=ChatSession)
 def update_chat_session(session_id: str, session: ChatSession, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     # Allow setting fields to null explicitly (e.g., ended_at=None). Also restrict fields to avoid
     # sending accidental datetimes like started_at.
     raw_payload = jsonable_encoder(
@@ -198,7 +240,7 @@ def update_chat_session(session_id: str, session: ChatSession, token: str = Depe
 
 @router.delete("/sessions/{session_id}", response_model=dict)
 def delete_chat_session(session_id: str, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     supabase.table("chat_sessions").delete().eq(
         "session_id", session_id).eq("user_id", user_id).execute()
     return {"deleted": True}
@@ -210,7 +252,7 @@ def delete_chat_session(session_id: str, token: str = Depends(oauth2)):
 
 @router.post("/messages", response_model=ChatMessage)
 def create_chat_message(message: ChatMessage, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     # Ensure all UUIDs are serialized as strings
     payload = json.loads(message.json(exclude_unset=True))
     # Check session ownership if needed (as in your original logic)
@@ -227,17 +269,25 @@ def create_chat_message(message: ChatMessage, token: str = Depends(oauth2)):
 
 
 @router.get("/messages/{session_id}", response_model=List[ChatMessage])
-def list_chat_messages(session_id: str, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+def list_chat_messages(
+    session_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = Query(None, description="cursor: page of older items"),
+    after: Optional[str] = Query(None, description="cursor: page of newer items"),
+    token: str = Depends(oauth2),
+):
+    """Oldest first within the page; without a cursor, the latest `limit` messages.
+    Scroll back with `before` (X-Cursor-Before header), poll for new ones with `after`."""
+    user_id = get_user_id_from_token(token)
     # Check session ownership
     session = supabase.table("chat_sessions").select("user_id").eq(
         "session_id", session_id).single().execute().data
     if not session or session.get("user_id") != user_id:
         raise HTTPException(
             status_code=403, detail="Forbidden: Not your session")
-    resp = supabase.table("chat_messages").select(
-        "*").eq("session_id", session_id).order("timestamp").execute()
-    return getattr(resp, 'data', [])
+    query = supabase.table("chat_messages").select("*").eq("session_id", session_id)
+    return keyset_page(query, response, "timestamp", "message_id", limit, before, after, newest_first=False)
 
 
 @router.get("/message/{message_id}", response_model=ChatMessage)
@@ -248,7 +298,7 @@ def get_chat_message(message_id: str, token: str = Depends(oauth2)):
     if not msg:
         raise HTTPException(status_code=404, detail="Message not found")
     session_id = msg.get("session_id")
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     session = supabase.table("chat_sessions").select("user_id").eq(
         "session_id", session_id).single().execute().data
     if not session or session.get("user_id") != user_id:
@@ -265,7 +315,7 @@ def update_chat_message(message_id: str, message: ChatMessage, token: str = Depe
     if not msg:
         raise HTTPException(status_code=404, detail="Message not found")
     session_id = msg.get("session_id")
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     session = supabase.table("chat_sessions").select("user_id").eq(
         "session_id", session_id).single().execute().data
     if not session or session.get("user_id") != user_id:
@@ -289,7 +339,7 @@ def delete_chat_message(message_id: str, token: str = Depends(oauth2)):
     if not msg:
         raise HTTPException(status_code=404, detail="Message not found")
     session_id = msg.get("session_id")
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     session = supabase.table("chat_sessions").select("user_id").eq(
         "session_id", session_id).single().execute().data
     if not session or session.get("user_id") != user_id:
@@ -309,7 +359,7 @@ def create_emergency_contact(contact: EmergencyContact, token: str = Depends(oau
     # Optionally, you can restrict this to admin/teacher if needed
     payload = contact.dict(exclude_unset=True)
     # Associate contact with current user
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     payload["user_id"] = user_id
     resp = supabase.table("emergency_contacts").insert(payload).execute()
     data = getattr(resp, 'data', None)
@@ -319,16 +369,22 @@ def create_emergency_contact(contact: EmergencyContact, token: str = Depends(oau
 
 
 @router.get("/contacts", response_model=List[EmergencyContact])
-def list_emergency_contacts(token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
-    resp = supabase.table("emergency_contacts").select(
-        "*").eq("user_id", user_id).order("created_at", desc=True).execute()
-    return getattr(resp, 'data', [])
+def list_emergency_contacts(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = Query(None, description="cursor: page of older items"),
+    after: Optional[str] = Query(None, description="cursor: page of newer items"),
+    token: str = Depends(oauth2),
+):
+    """Newest first; see utils/pagination for the cursor headers."""
+    user_id = get_user_id_from_token(token)
+    query = supabase.table("emergency_contacts").select("*").eq("user_id", user_id)
+    return keyset_page(query, response, "created_at", "contact_id", limit, before, after)
 
 
 @router.get("/contacts/{contact_id}", response_model=EmergencyContact)
 def get_emergency_contact(contact_id: str, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     resp = supabase.table("emergency_contacts").select(
         "*").eq("contact_id", contact_id).eq("user_id", user_id).single().execute()
     data = getattr(resp, 'data', None)
@@ -344,7 +400,7 @@ def update_emergency_contact(contact_id: str, contact: EmergencyContact, token:
     allowed = {"name", "phone_number", "description",
                "contact_type", "is_available_24_7"}
     payload = {k: v for k, v in (payload or {}).items() if k in allowed}
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     resp = supabase.table("emergency_contacts").update(
         payload).eq("contact_id", contact_id).eq("user_id", user_id).execute()
     data = getattr(resp, 'data', None)
@@ -355,50 +411,129 @@ def update_emergency_contact(contact_id: str, contact: EmergencyContact, token:
 
 @router.delete("/contacts/{contact_id}", response_model=dict)
 def delete_emergency_contact(contact_id: str, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     supabase.table("emergency_contacts").delete().eq(
         "contact_id", contact_id).eq("user_id", user_id).execute()
     return {"deleted": True}
 
 
-@router.post("/sessions/{session_id}/auto-reply")
-def auto_reply(
-    session_id: str,
-    user_message: str = Form(""),
-    file: UploadFile | None = File(None),
-    token: str = Depends(oauth2)
-):
-    user_id = get_user_id(token)
-    # 1. Save user message (reuse create_chat_message logic)
+# Auto-reply: apart from the model call, one turn costs three round trips:
+#   1. the session (ownership, session_type, rolling summary)
+#   2. the bounded recent history
+#   3. one insert for both the user's message and the bot's reply
+
+
+def _load_owned_session(session_id: str, user_id: str) -> dict:
+    session = supabase.table("chat_sessions").select(f"user_id, session_type, {SESSION_SUMMARY_COLUMNS}").eq(
+        "session_id", session_id).single().execute().data
+    if not session or session.get("user_id") != user_id:
+        raise HTTPException(
+            status_code=403, detail="Forbidden: Not your session")
+    return session
+
+
+def _prepare_auto_reply(session_id: str, user_message: str, file: UploadFile | None, token: str):
+    """Gather what the bot needs to answer; the user's message is saved later with the reply."""
+    user_id = get_user_id_from_token(token)
+    session = _load_owned_session(session_id, user_id)
     # If image provided but empty text, store a placeholder
     content_to_store = user_message if user_message else (
         "[Image uploaded]" if file else "")
-    user_msg = ChatMessage(
-        session_id=session_id,
-        sender_type=SenderTypeEnum.user,
-        message_content=content_to_store,
-    )
-    create_chat_message(user_msg, token)
-    # 2. Fetch chat history (reuse list_chat_messages logic)
-    chat_history = list_chat_messages(session_id, token)
-    # 2.1 Load session to detect session_type if present
-    session = supabase.table("chat_sessions").select("session_type").eq(
-        "session_id", session_id).single().execute().data
-    session_type = session.get("session_type") if session else None
-    # 3. Call chatbot with chat history
+    user_row = {
+        "session_id": session_id,
+        "sender_type": SenderTypeEnum.user.value,
+        "message_content": content_to_store,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+    # Recent history (last few turns verbatim, older ones via the summary) + this message
+    context = load_context(session_id, session)
+    context.messages.append(user_row)
     image_bytes = None
     image_mime = None
     if file is not None:
         image_bytes = file.file.read()
         image_mime = file.content_type
+    return context, user_row, session.get("session_type"), image_bytes, image_mime
+
+
+def _save_turn(user_row: dict, bot_text: str | None) -> list:
+    """Insert the user's message and (if any) the bot's reply in one request."""
+    rows = [user_row]
+    if bot_text is not None:
+        rows.append({
+            "session_id": user_row["session_id"],
+            "sender_type": SenderTypeEnum.ai_bot.value,
+            "message_content": bot_text,
+            # set here (after the model call) so the reply sorts after the message it answers
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        })
+    resp = supabase.table("chat_messages").insert(rows).execute()
+    data = getattr(resp, 'data', None)
+    if not data:
+        raise HTTPException(status_code=400, detail="Insert failed")
+    return data
+
+
+@router.post("/sessions/{session_id}/auto-reply")
+def auto_reply(
+    session_id: str,
+    user_message: str = Form(""),
+    file: UploadFile | None = File(None),
+    token: str = Depends(oauth2)
+):
+    context, user_row, session_type, image_bytes, image_mime = _prepare_auto_reply(
+        session_id, user_message, file, token)
+    # Call chatbot with the bounded chat history
     bot_reply = chat_bot_module.chat_bot(
-        chat_history, session_type=session_type, image_bytes=image_bytes, image_mime=image_mime)
-    # 4. Save bot reply as a message
-    bot_msg = ChatMessage(
-        session_id=session_id,
-        sender_type=SenderTypeEnum.ai_bot,
-        message_content=bot_reply["reply"],
-    )
-    create_chat_message(bot_msg, token)
-    # 5. Return bot reply
+        context.messages, session_type=session_type, image_bytes=image_bytes, image_mime=image_mime,
+        summary=context.summary)
+    # Save the user's message and the bot reply together
+    _save_turn(user_row, bot_reply["reply"])
+    refresh_summary_later(session_id, context, chat_bot_module.summarize_history)
     return {"bot_reply": bot_reply}
+
+
+@router.post("/sessions/{session_id}/auto-reply/stream")
+def auto_reply_stream(
+    session_id: str,
+    user_message: str = Form(""),
+    file: UploadFile | None = File(None),
+    token: str = Depends(oauth2)
+):
+    """Streaming auto-reply over Server-Sent Events.
+
+    Events: `token` ({"text": chunk}) as the model produces the reply, then
+    `done` ({"bot_reply": ..., "message": saved bot message}) once the full
+    reply is stored, or `error` if it could not be saved. Ownership/validation
+    errors are still returned as normal HTTP errors before the stream starts.
+    """
+    context, user_row, session_type, image_bytes, image_mime = _prepare_auto_reply(
+        session_id, user_message, file, token)
+
+    def events():
+        chunks = []
+        saved = None
+        try:
+            for text in chat_bot_module.chat_bot_stream(
+                    context.messages, session_type=session_type, image_bytes=image_bytes, image_mime=image_mime,
+                    summary=context.summary):
+                chunks.append(text)
+                yield sse_event({"text": text}, event="token")
+            bot_reply = {"reply": "".join(chunks).strip(), "suggested_action": "none"}
+            # Persist only the complete reply, once the stream has finished
+            try:
+                saved = _save_turn(user_row, bot_reply["reply"])
+            except HTTPException as e:
+                yield sse_event({"detail": e.detail}, event="error")
+                return
+            refresh_summary_later(session_id, context, chat_bot_module.summarize_history)
+            yield sse_event({"bot_reply": bot_reply, "message": saved[-1]}, event="done")
+        finally:
+            # Client went away mid-stream: still keep what the user sent
+            if saved is None:
+                try:
+                    _save_turn(user_row, None)
+                except Exception as e:
+                    print(f"could not save user message for {session_id}: {e}")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends,HTTPException,Query
 from fastapi.security import OAuth2PasswordBearer
 from typing import List
 from ..config import supabase
+from ..utils.auth import get_user_id_from_token
+from ..utils.finance_rollups import record_transaction_change, get_monthly_rollups
 from ..models import TransactionCreate,TransactionOut,SavingsGoalCreate, SavingsGoalOut
 from uuid import uuid4
 from fastapi import HTTPException
@@ -11,12 +13,6 @@ from fastapi import Body
 router = APIRouter(prefix="/student/finance", tags=["student-finance"])
 oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
-def get_user_id(token: str):
-    auth_res = supabase.auth.get_user(token)
-    if getattr(auth_res, 'error', None):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    return auth_res.user.id
-
 # @router.post("/transactions", response_model=dict)
 # def add_transaction(tx: dict, token: str = Depends(oauth2)):
 #     """Record a new income or expense transaction."""
@@ -29,7 +25,7 @@ def add_transaction(tx: TransactionCreate, token: str = Depends(oauth2)):
         print("DEBUG: Transaction as dict:", tx.dict())
 
         # Get user ID from token
-        user_id = get_user_id(token)
+        user_id = get_user_id_from_token(token)
         print("DEBUG: Authenticated user ID:", user_id)
 
         # Prepare payload
@@ -51,6 +47,7 @@ def add_transaction(tx: TransactionCreate, token: str = Depends(oauth2)):
         if not data:
             raise HTTPException(status_code=400, detail="Insert failed")
 
+        record_transaction_change(new=data[0])
         return data[0]
 
     except HTTPException:
@@ -66,7 +63,7 @@ def add_transaction(tx: TransactionCreate, token: str = Depends(oauth2)):
 #     return []
 # @router.get("/transactions", response_model=List[TransactionOut])
 # def list_transactions(token: str = Depends(oauth2)):
-#     user_id = get_user_id(token)
+#     user_id = get_user_id_from_token(token)
     
 #     resp = supabase.table("transactions") \
 #         .select("*") \
@@ -83,7 +80,7 @@ def add_transaction(tx: TransactionCreate, token: str = Depends(oauth2)):
 @router.get("/transactions/{transaction_id}", response_model=TransactionOut)
 def get_transaction(transaction_id: str, token: str = Depends(oauth2)):
     try:
-        user_id = get_user_id(token)
+        user_id = get_user_id_from_token(token)
 
         # Query supabase for this transaction belonging to the authenticated user
         result = supabase.table("transactions") \
@@ -114,7 +111,7 @@ def get_finance_dashboard(
     token: str = Depends(oauth2),
     from_date: str | None = Query(None, description="Start date in YYYY-MM-DD format"),
     to_date: str | None = Query(None, description="End date in YYYY-MM-DD format")):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     # --- Get first and last day of current month ---
   # Assume these come from frontend (could be None if not provided)
@@ -134,31 +131,15 @@ def get_finance_dashboard(
     print(first_day, last_day)
  # Or dynamically if you need end of month
 
-    # --- Fetch all transactions ---
-    tx_resp = supabase.table("transactions") \
-        .select("amount, type, transaction_date") \
-        .eq("student_id", user_id) \
-        .execute()
-    
-    tx_data = getattr(tx_resp, "data", [])
-    if tx_data is None:
+    # --- Lifetime totals from the monthly rollups (one row per month) ---
+    try:
+        months = get_monthly_rollups(user_id)
+    except Exception as e:
+        print("ERROR: could not read finance rollups:", str(e))
         raise HTTPException(status_code=500, detail="Could not fetch transactions")
+    total_income = sum(float(m.get("income") or 0) for m in months)
+    total_expenses = sum(float(m.get("expense") or 0) for m in months)
 
-    # --- Calculate totals ---
-    total_income = sum(tx["amount"] for tx in tx_data if tx["type"] == "Income")
-    total_expenses = sum(tx["amount"] for tx in tx_data if tx["type"] == "Expense")
-   
-
-    # --- Filter for current month ---
-    month_income = sum(
-        tx["amount"] for tx in tx_data
-        if tx["type"] == "Income" and first_day <= date.fromisoformat(tx["transaction_date"]) <= last_day
-    )
-    month_expenses = sum(
-        tx["amount"] for tx in tx_data
-        if tx["type"] == "Expense" and first_day <= date.fromisoformat(tx["transaction_date"]) <= last_day
-    )
-    balance = month_income - month_expenses
     # --- Fetch savings goals ---
     sg_resp = supabase.table("savings_goals") \
         .select("goal_id, title, target_amount, saved_amount") \
@@ -174,6 +155,11 @@ def get_finance_dashboard(
     .lte("transaction_date", str(last_day)) \
     .execute()
     tx_data = getattr(tx_resp, "data", []) or []
+
+    # --- Totals for the selected window (already limited to it) ---
+    month_income = sum(tx["amount"] for tx in tx_data if tx["type"] == "Income")
+    month_expenses = sum(tx["amount"] for tx in tx_data if tx["type"] == "Expense")
+    balance = month_income - month_expenses
     return {
         "balance": balance,
         "total_income": total_income,
@@ -188,7 +174,7 @@ def get_finance_dashboard(
 @router.delete("/transactions/{transaction_id}", response_model=dict)
 def delete_transaction(transaction_id: str, token: str = Depends(oauth2)):
     try:
-        user_id = get_user_id(token)
+        user_id = get_user_id_from_token(token)
 
         # Fetch the transaction to ensure it belongs to the user
         result = supabase.table("transactions") \
@@ -211,6 +197,7 @@ def delete_transaction(transaction_id: str, token: str = Depends(oauth2)):
         deleted_data = getattr(delete_result, "data", [])
         if not deleted_data:
             raise HTTPException(status_code=500, detail="Delete failed")
+        record_transaction_change(old=data[0])
 
         return {"message": "Transaction deleted successfully", "transaction_id": transaction_id}
 
@@ -222,7 +209,7 @@ def delete_transaction(transaction_id: str, token: str = Depends(oauth2)):
 
 @router.put("/transactions/{transaction_id}", response_model=dict)
 def update_transaction(transaction_id: str, tx: TransactionCreate, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     # Ensure transaction belongs to this user
     existing = supabase.table("transactions").select("*").eq("transaction_id", transaction_id).eq("student_id", user_id).execute()
@@ -239,6 +226,7 @@ def update_transaction(transaction_id: str, tx: TransactionCreate, token: str =
     updated_data = getattr(result, "data", [])
     if not updated_data:
         raise HTTPException(status_code=400, detail="Update failed")
+    record_transaction_change(old=data[0], new=updated_data[0])
     return updated_data[0]
 
 # -------------------------------
@@ -250,7 +238,7 @@ def update_transaction(transaction_id: str, tx: TransactionCreate, token: str =
 
 @router.post("/savings-goals", response_model=SavingsGoalOut)
 def create_savings_goal(goal: SavingsGoalCreate, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     payload = goal.dict()
     payload["goal_id"] = str(uuid4())
     payload["student_id"] = user_id
@@ -263,13 +251,13 @@ def create_savings_goal(goal: SavingsGoalCreate, token: str = Depends(oauth2)):
 
 @router.get("/savings-goals", response_model=List[SavingsGoalOut])
 def list_savings_goals(token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     resp = supabase.table("savings_goals").select("*").eq("student_id", user_id).order("created_at", desc=True).execute()
     return getattr(resp, "data", [])
 
 @router.get("/savings-goals/{goal_id}", response_model=SavingsGoalOut)
 def get_savings_goal(goal_id: str, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     resp = supabase.table("savings_goals").select("*").eq("goal_id", goal_id).eq("student_id", user_id).single().execute()
     data = getattr(resp, "data", None)
     if not data:
@@ -278,7 +266,7 @@ def get_savings_goal(goal_id: str, token: str = Depends(oauth2)):
 
 @router.patch("/savings-goals/{goal_id}", response_model=SavingsGoalOut)
 def update_savings_goal(goal_id: str, goal: SavingsGoalCreate, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     payload = goal.dict(exclude_unset=True)
     resp = supabase.table("savings_goals").update(payload).eq("goal_id", goal_id).eq("student_id", user_id).execute()
     data = getattr(resp, "data", None)
@@ -288,14 +276,14 @@ def update_savings_goal(goal_id: str, goal: SavingsGoalCreate, token: str = Depe
 
 @router.delete("/savings-goals/{goal_id}", response_model=dict)
 def delete_savings_goal(goal_id: str, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     supabase.table("savings_goals").delete().eq("goal_id", goal_id).eq("student_id", user_id).execute()
     return {"deleted": True}
 
 @router.post("/savings-goals/contribute/{goal_id}", response_model=SavingsGoalOut)
 def contribute_to_savings_goal(goal_id: str, amount: float, token: str = Depends(oauth2)):
     """Add a contribution to a savings goal's saved_amount."""
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     print(goal_id,amount)
     if amount <= 0:
         raise HTTPException(status_code=400, detail="Contribution amount must be positive")
@@ -330,7 +318,7 @@ def contribute_to_savings_goal(goal_id: str, amount: float, token: str = Depends
 
 @router.delete("/deletegoal/{goal_id}")
 def delete_goal(goal_id: str, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     # Ensure the goal belongs to the logged-in student
     goal = supabase.table("savings_goals").select("*").eq("goal_id", goal_id).eq("student_id", user_id).execute()
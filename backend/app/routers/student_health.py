@@ -1,33 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 from typing import Optional, List
-from fastapi.security import OAuth2PasswordBearer
 from ..config import supabase
 from ..models import HealthMetricsRequest, HealthMetricsResponse, TrendPoint, TrendResponse
-import jwt
+from ..utils.health_alerts import record_alerts
+from ..utils.health_snapshot import get_snapshot, refresh_snapshot
+from ..utils.nutrition_rollups import get_daily_rollups
+from ..utils.student_identity import StudentIdentity, get_current_student
+from ..utils.timeseries import DEFAULT_BUCKET, downsample, range_bounds, sum_by_bucket
 from datetime import datetime
 from uuid import UUID
 
 router = APIRouter(prefix="/health", tags=["health"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
-
-def get_user_email_from_token(token: str = Depends(oauth2_scheme)) -> str:
-    try:
-        payload = jwt.decode(token, options={"verify_signature": False})
-        return payload.get("email")
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
 
 # -------------------------
 # Health Metrics
 # -------------------------
 @router.get("/metrics", response_model=HealthMetricsResponse)
-def get_latest_metrics(email: str = Depends(get_user_email_from_token)):
-    child_id = supabase.table("students").select("student_id").eq("email", email).execute()
-    res = supabase.table("health_metrics").select("*").eq("student_id", child_id.data[0]['student_id']).order("created_at", desc=True).limit(1).execute()
-    if not res.data:
+def get_latest_metrics(student: StudentIdentity = Depends(get_current_student)):
+    m = get_snapshot(student.student_id)
+    if not m:
         raise HTTPException(status_code=404, detail="No metrics found")
-    m = res.data[0]
     return HealthMetricsResponse(
         weight=m['weight'],
         height=m['height'],
@@ -44,12 +37,11 @@ def get_latest_metrics(email: str = Depends(get_user_email_from_token)):
 @router.post("/metrics", response_model=dict)
 def add_health_metrics(
     data: HealthMetricsRequest,
-    email: str = Depends(get_user_email_from_token)
+    student: StudentIdentity = Depends(get_current_student)
 ):
     bmi = round(data.weight / ((data.height / 100) ** 2), 1)
-    child_id = supabase.table("students").select("student_id").eq("email", email).execute()
     payload = {
-        "student_id": child_id.data[0]['student_id'],
+        "student_id": student.student_id,
         "weight": data.weight,
         "height": data.height,
         "systolic": data.systolic,
@@ -63,16 +55,18 @@ def add_health_metrics(
         "created_at": datetime.now().isoformat()
     }
     res = supabase.table("health_metrics").insert(payload).execute()
+    refresh_snapshot(student.student_id)
+    for row in res.data or []:
+        record_alerts(row)
     return {"message": "Health metrics saved"}
 
 @router.patch("/metrics/{entry_id}", response_model=dict)
 def update_health_metrics(
     entry_id: UUID,
     data: HealthMetricsRequest,
-    email: str = Depends(get_user_email_from_token)
+    student: StudentIdentity = Depends(get_current_student)
 ):
     bmi = round(data.weight / ((data.height / 100) ** 2), 1)
-    child_id = supabase.table("students").select("student_id").eq("email", email).execute()
     
     update_payload = {
         "weight": data.weight,
@@ -90,28 +84,29 @@ def update_health_metrics(
         supabase.table("health_metrics")
         .update(update_payload)
         .eq("id", str(entry_id))
-        .eq("student_id", child_id.data[0]['student_id'])
+        .eq("student_id", student.student_id)
         .execute()
     )
 
     if not result.data:
         raise HTTPException(status_code=404, detail="Metric entry not found or unauthorized")
 
+    refresh_snapshot(student.student_id)
+    record_alerts(result.data[0], replace=True)
     return {"message": "Health metric updated"}
 
 # DELETE: Remove a specific health metric entry
 @router.delete("/metrics/{entry_id}", response_model=dict)
 def delete_health_metrics(
     entry_id: UUID,
-    email: str = Depends(get_user_email_from_token)
+    student: StudentIdentity = Depends(get_current_student)
 ):
-    child_id = supabase.table("students").select("student_id").eq("email", email).execute()
-
-    result = supabase.table("health_metrics").delete().eq("id", str(entry_id)).eq("student_id", child_id.data[0]['student_id']).execute()
+    result = supabase.table("health_metrics").delete().eq("id", str(entry_id)).eq("student_id", student.student_id).execute()
 
     if not result.data:
         raise HTTPException(status_code=404, detail="Metric entry not found or unauthorized")
 
+    refresh_snapshot(student.student_id)  # its alerts go with it (on delete cascade)
     return {"message": "Health metric deleted"}
 
 
@@ -121,20 +116,42 @@ def delete_health_metrics(
 
 
 
+_TREND_FIELDS = ("weight", "blood_sugar", "systolic", "diastolic", "heart_rate")
+
+
 @router.get("/analytics", response_model=TrendResponse)
-def get_analytics(email: str = Depends(get_user_email_from_token)):
-    child_id = supabase.table("students").select("student_id").eq("email", email).execute()
-    metrics = supabase.table("health_metrics").select("created_at, weight, systolic, diastolic, blood_sugar, heart_rate").eq("student_id", child_id.data[0]['student_id']).order("created_at").execute()
-    diet = supabase.table("student_diet").select("sugar, sodium, time").eq("student_id", child_id.data[0]['student_id']).execute()
-    meals = supabase.table("meals").select("calories").eq("student_id", child_id.data[0]['student_id']).execute()
+def get_analytics(
+    range: str = Query("30d", pattern="^(7d|30d|90d|180d|1y)$"),
+    bucket: Optional[str] = Query(None, pattern="^(day|week|month)$", description="Defaults to day up to 30d, week up to 180d, month for 1y"),
+    student: StudentIdentity = Depends(get_current_student),
+):
+    student_id = student.student_id
+    bucket = bucket or DEFAULT_BUCKET[range]
+    start, end = range_bounds(range)
+
+    metrics = (
+        supabase.table("health_metrics")
+        .select("created_at, " + ", ".join(_TREND_FIELDS))
+        .eq("student_id", student_id)
+        .gte("created_at", start.isoformat())
+        .order("created_at")
+        .execute()
+    )
+    rows = metrics.data or []
+    # calories from meals, sugar/sodium from diet logs, one row per day
+    days = get_daily_rollups(student_id, start, end)
+    nutrition = sum_by_bucket(
+        [{"day": d["day"], "calories": d.get("calories"), "sugar": d.get("diet_sugar"), "sodium": d.get("diet_sodium")} for d in days],
+        ("calories", "sugar", "sodium"),
+        bucket,
+    )
 
     return TrendResponse(
-        weight=[{"time": m["created_at"], "value": m["weight"]} for m in metrics.data],
-        blood_sugar=[{"time": m["created_at"], "value": m["blood_sugar"]} for m in metrics.data],
-        systolic=[{"time": m["created_at"], "value": m["systolic"]} for m in metrics.data],
-        diastolic=[{"time": m["created_at"], "value": m["diastolic"]} for m in metrics.data],
-        heart_rate=[{"time": m["created_at"], "value": m["heart_rate"]} for m in metrics.data],
-        sugar=sum(d.get("sugar", 0) for d in diet.data),
-        sodium=sum(d.get("sodium", 0) for d in diet.data),
-        calories=sum(m.get("calories", 0) for m in meals.data)
+        **{field: downsample(rows, field, bucket) for field in _TREND_FIELDS},
+        calories=round(sum(float(d.get("calories") or 0) for d in days), 2),
+        sugar=round(sum(float(d.get("diet_sugar") or 0) for d in days), 2),
+        sodium=round(sum(float(d.get("diet_sodium") or 0) for d in days), 2),
+        range=range,
+        bucket=bucket,
+        nutrition=nutrition,
     )
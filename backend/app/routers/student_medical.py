@@ -1,5 +1,4 @@
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import OAuth2PasswordBearer
 from typing import List, Optional
 from uuid import UUID
 from datetime import datetime, timezone, timedelta
@@ -10,10 +9,9 @@ from ..models import (
     MedicationCreate, MedicationUpdate, MedicationOut,
     MedicationLogCreate, MedicationLogOut
 )
-import jwt
+from ..utils.student_identity import StudentIdentity, get_current_student
 
 router = APIRouter(prefix="/medical", tags=["medical"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 # Timezone helpers
 IST_TZ = timezone(timedelta(hours=5, minutes=30))
@@ -30,37 +28,19 @@ def to_ist_iso(dt: datetime | None) -> str:
     return dt.astimezone(IST_TZ).isoformat()
 
 
-def get_user_email_from_token(token: str = Depends(oauth2_scheme)) -> str:
-    try:
-        payload = jwt.decode(token, options={"verify_signature": False})
-        email = payload.get("email")
-        if not email:
-            raise HTTPException(status_code=401, detail="Invalid or expired token")
-        return email
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-
-def get_student_id(email: str) -> UUID:
-    res = supabase.table("students").select("student_id").eq("email", email).limit(1).execute()
-    if not res.data:
-        raise HTTPException(status_code=404, detail="Student not found")
-    return res.data[0]["student_id"]
-
-
 # -------------------------
 # Conditions
 # -------------------------
 @router.get("/conditions", response_model=List[HealthConditionOut])
-def list_conditions(email: str = Depends(get_user_email_from_token)):
-    student_id = get_student_id(email)
+def list_conditions(student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     res = supabase.table("health_conditions").select("*").eq("user_id", student_id).order("created_at", desc=True).execute()
     return res.data or []
 
 
 @router.post("/conditions", response_model=HealthConditionOut)
-def create_condition(payload: HealthConditionCreate, email: str = Depends(get_user_email_from_token)):
-    student_id = get_student_id(email)
+def create_condition(payload: HealthConditionCreate, student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     insert_data = {
         "user_id": student_id,
         "condition_name": payload.condition_name,
@@ -78,8 +58,8 @@ def create_condition(payload: HealthConditionCreate, email: str = Depends(get_us
 
 
 @router.patch("/conditions/{condition_id}", response_model=dict)
-def update_condition(condition_id: UUID, payload: HealthConditionUpdate, email: str = Depends(get_user_email_from_token)):
-    student_id = get_student_id(email)
+def update_condition(condition_id: UUID, payload: HealthConditionUpdate, student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     update_data = {k: v for k, v in payload.model_dump(exclude_unset=True).items()}
     if "diagnosed_date" in update_data and update_data["diagnosed_date"]:
         update_data["diagnosed_date"] = update_data["diagnosed_date"].isoformat()
@@ -91,8 +71,8 @@ def update_condition(condition_id: UUID, payload: HealthConditionUpdate, email:
 
 
 @router.delete("/conditions/{condition_id}", response_model=dict)
-def delete_condition(condition_id: UUID, email: str = Depends(get_user_email_from_token)):
-    student_id = get_student_id(email)
+def delete_condition(condition_id: UUID, student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     res = supabase.table("health_conditions").delete().eq("condition_id", str(condition_id)).eq("user_id", student_id).execute()
     if not res.data:
         raise HTTPException(status_code=404, detail="Condition not found or unauthorized")
@@ -103,8 +83,8 @@ def delete_condition(condition_id: UUID, email: str = Depends(get_user_email_fro
 # Medications
 # -------------------------
 @router.get("/medications", response_model=List[MedicationOut])
-def list_medications(condition_id: Optional[UUID] = None, email: str = Depends(get_user_email_from_token)):
-    student_id = get_student_id(email)
+def list_medications(condition_id: Optional[UUID] = None, student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     query = supabase.table("medications").select("*").eq("user_id", student_id)
     if condition_id:
         query = query.eq("condition_id", str(condition_id))
@@ -113,8 +93,8 @@ def list_medications(condition_id: Optional[UUID] = None, email: str = Depends(g
 
 
 @router.post("/medications", response_model=MedicationOut)
-def create_medication(payload: MedicationCreate, email: str = Depends(get_user_email_from_token)):
-    student_id = get_student_id(email)
+def create_medication(payload: MedicationCreate, student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     insert_data = payload.model_dump()
     insert_data.update({
         "user_id": student_id,
@@ -128,8 +108,8 @@ def create_medication(payload: MedicationCreate, email: str = Depends(get_user_e
 
 
 @router.patch("/medications/{medication_id}", response_model=dict)
-def update_medication(medication_id: UUID, payload: MedicationUpdate, email: str = Depends(get_user_email_from_token)):
-    student_id = get_student_id(email)
+def update_medication(medication_id: UUID, payload: MedicationUpdate, student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     update_data = {k: v for k, v in payload.model_dump(exclude_unset=True).items()}
     if "condition_id" in update_data and update_data["condition_id"]:
         update_data["condition_id"] = str(update_data["condition_id"])
@@ -144,8 +124,8 @@ def update_medication(medication_id: UUID, payload: MedicationUpdate, email: str
 
 
 @router.delete("/medications/{medication_id}", response_model=dict)
-def delete_medication(medication_id: UUID, email: str = Depends(get_user_email_from_token)):
-    student_id = get_student_id(email)
+def delete_medication(medication_id: UUID, student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     res = supabase.table("medications").delete().eq("medication_id", str(medication_id)).eq("user_id", student_id).execute()
     if not res.data:
         raise HTTPException(status_code=404, detail="Medication not found or unauthorized")
@@ -156,8 +136,8 @@ def delete_medication(medication_id: UUID, email: str = Depends(get_user_email_f
 # Medication Logs
 # -------------------------
 @router.get("/medications/{medication_id}/logs", response_model=List[MedicationLogOut])
-def list_medication_logs(medication_id: UUID, email: str = Depends(get_user_email_from_token)):
-    student_id = get_student_id(email)
+def list_medication_logs(medication_id: UUID, student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     # ensure med belongs to student
     med = supabase.table("medications").select("medication_id").eq("medication_id", str(medication_id)).eq("user_id", student_id).limit(1).execute()
     if not med.data:
@@ -167,8 +147,8 @@ def list_medication_logs(medication_id: UUID, email: str = Depends(get_user_emai
 
 
 @router.post("/medications/{medication_id}/logs", response_model=MedicationLogOut)
-def create_medication_log(medication_id: UUID, payload: MedicationLogCreate, email: str = Depends(get_user_email_from_token)):
-    student_id = get_student_id(email)
+def create_medication_log(medication_id: UUID, payload: MedicationLogCreate, student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     # ensure med belongs to student
     med = supabase.table("medications").select("medication_id").eq("medication_id", str(medication_id)).eq("user_id", student_id).limit(1).execute()
     if not med.data:
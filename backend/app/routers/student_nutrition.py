@@ -1,54 +1,46 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.security import OAuth2PasswordBearer
-from typing import Any, Dict, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Tuple
 from datetime import date, datetime, timedelta
 from uuid import UUID
 import os
+import copy
 import json
-import jwt
-
-from ..config import supabase
+import hashlib
+import time
+
+from ..config import supabase, async_db
+from ..utils.db import table, fetch_rows, gather_rows
+from ..utils.health_snapshot import snapshot_query
+from ..utils.nutrition_rollups import MEAL_NUTRIENTS, rollups_query, sum_rollups
+from ..utils.student_identity import StudentIdentity, get_current_student
 from google import genai
 from dotenv import load_dotenv
 
 load_dotenv()
 
 router = APIRouter(prefix="/health", tags=["health"])  # keep under /health like other student_* routers
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 _gemini_client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 _GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# A stored suggestion with identical inputs is reused for this long (0 disables reuse)
+NUTRITION_SUGGESTIONS_MAX_AGE_HOURS = float(os.getenv("NUTRITION_SUGGESTIONS_MAX_AGE_HOURS", "24"))
+
+_FALLBACK_SUGGESTIONS = {
+    "overview": "Could not generate suggestions at this time.",
+    "risks": [],
+    "macro_targets": {"calories": 0, "proteins": 0, "carbs": 0, "fat": 0, "sodium": 0, "sugar": 0},
+    "hydration_advice": "",
+    "alerts": [],
+    "meal_plan": [],
+    "notes": "",
+}
 
 
 # -------------------------
 # Helpers
 # -------------------------
 
-def get_user_email_from_token(token: str = Depends(oauth2_scheme)) -> str:
-    try:
-        payload = jwt.decode(token, options={"verify_signature": False})
-        email = payload.get("email")
-        if not email:
-            raise HTTPException(status_code=401, detail="Invalid or expired token")
-        return email
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-
-def _get_student_id_and_grade(email: str) -> Tuple[str, Optional[str]]:
-    res = (
-        supabase
-        .table("students")
-        .select("student_id, grade_level")
-        .eq("email", email)
-        .single()
-        .execute()
-    )
-    if not res.data:
-        raise HTTPException(status_code=404, detail="Student not found")
-    return res.data["student_id"], res.data.get("grade_level")
-
-
 def _date_range_bounds(range_key: str) -> Tuple[str, str]:
     # returns ISO dates for inclusive start and exclusive end bounds as strings with time
     today = date.today()
@@ -67,83 +59,69 @@ def _date_range_bounds(range_key: str) -> Tuple[str, str]:
     return f"{start.isoformat()} 00:00:00", f"{end.isoformat()} 00:00:00"
 
 
+def _rollup_days(start_dt: str, end_dt: str) -> Tuple[date, date]:
+    # inclusive day bounds for the rollup table from _date_range_bounds output
+    return date.fromisoformat(start_dt[:10]), date.fromisoformat(end_dt[:10]) - timedelta(days=1)
+
+
 # -------------------------
 # Data aggregation
 # -------------------------
 
-def _fetch_meals(student_id: str, start_dt: str, end_dt: str) -> List[Dict[str, Any]]:
-    res = (
-        supabase.table("meals")
+def _meals_query(student_id: str, start_dt: str, end_dt: str, limit: int):
+    return (
+        table("meals")
         .select("id, time, mealtype, description, calories, proteins, carbs, fat, sodium, sugar")
         .eq("student_id", student_id)
         .gte("time", start_dt)
         .lt("time", end_dt)
         .order("time", desc=True)
-        .execute()
+        .limit(limit)
     )
-    return res.data or []
 
 
-def _fetch_water(student_id: str, start_dt: str, end_dt: str) -> List[Dict[str, Any]]:
-    # water_intake has separate intake_date and time; filter by date range
-    start_date = start_dt.split(" ")[0]
-    end_date = (datetime.fromisoformat(end_dt.replace(" ", "T")).date())
-    # Collect all days in [start_date, end_date)
-    res = (
-        supabase.table("water_intake")
-        .select("intake_id, amount_ml, container_type, intake_time, intake_date")
-        .eq("user_id", student_id)
-        .gte("intake_date", start_date)
-        .lt("intake_date", end_date.isoformat())
-        .order("intake_date")
-        .execute()
-    )
-    return res.data or []
+def _nutrition_rollups_query(student_id: str, start_dt: str, end_dt: str):
+    # one row per day with meal totals and water_ml (see utils/nutrition_rollups.py)
+    start, end = _rollup_days(start_dt, end_dt)
+    return rollups_query(async_db, student_id, start, end)
 
 
-def _fetch_latest_metrics(student_id: str) -> Optional[Dict[str, Any]]:
-    res = (
-        supabase.table("health_metrics")
-        .select("created_at, weight, height, bmi, systolic, diastolic, blood_sugar, heart_rate, notes, age_years, sex")
-        .eq("student_id", student_id)
-        .order("created_at", desc=True)
-        .limit(1)
-        .execute()
+def _latest_metrics_query(student_id: str):
+    return snapshot_query(
+        async_db, [student_id],
+        "created_at, weight, height, bmi, systolic, diastolic, blood_sugar, heart_rate, notes, age_years, sex",
     )
-    return (res.data or [None])[0]
 
 
-def _fetch_conditions(student_id: str) -> List[Dict[str, Any]]:
-    res = (
-        supabase.table("health_conditions")
+def _conditions_query(student_id: str):
+    return (
+        table("health_conditions")
         .select("condition_id, condition_name, severity, dietary_restrictions, is_active, diagnosed_date")
         .eq("user_id", student_id)
         .eq("is_active", True)
         .order("created_at", desc=True)
-        .execute()
     )
-    return res.data or []
 
 
-def _fetch_medications_and_logs(student_id: str, start_dt: str, end_dt: str) -> Dict[str, Any]:
-    meds = (
-        supabase.table("medications")
+def _medications_query(student_id: str):
+    return (
+        table("medications")
         .select("medication_id, medication_name, dosage, frequency, start_date, end_date")
         .eq("user_id", student_id)
         .order("created_at", desc=True)
-        .execute()
-    ).data or []
+    )
+
+
+def _medication_logs_query(student_id: str, start_dt: str, end_dt: str):
     # logs within window
-    logs = (
-        supabase.table("medication_logs")
+    return (
+        table("medication_logs")
         .select("log_id, medication_id, taken_at, quantity_taken, notes")
         .eq("user_id", student_id)
         .gte("taken_at", start_dt)
         .lt("taken_at", end_dt)
         .order("taken_at", desc=True)
-        .execute()
-    ).data or []
-    return {"medications": meds, "logs": logs}
+    )
 
 
 # removed grade-based age estimation; rely on age_years provided in health_metrics
@@ -215,15 +193,36 @@ def _call_gemini(inputs_snapshot: Dict[str, Any]) -> Dict[str, Any]:
         return data
     except Exception as e:
         print(f"Gemini suggestions generation failed: {e}")
-        return {
-            "overview": "Could not generate suggestions at this time.",
-            "risks": [],
-            "macro_targets": {"calories": 0, "proteins": 0, "carbs": 0, "fat": 0, "sodium": 0, "sugar": 0},
-            "hydration_advice": "",
-            "alerts": [],
-            "meal_plan": [],
-            "notes": "",
-        }
+        return copy.deepcopy(_FALLBACK_SUGGESTIONS)
+
+
+# -------------------------
+# Memoisation
+# -------------------------
+
+def _inputs_fingerprint(snapshot: Dict[str, Any], start_dt: str) -> str:
+    """Hash of everything the model sees (minus generated_at), plus model and window."""
+    material = {
+        "model": _GEMINI_MODEL,
+        "window_start": start_dt,
+        "inputs": {k: v for k, v in snapshot.items() if k != "generated_at"},
+    }
+    raw = json.dumps(material, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _latest_suggestion_query(student_id: str, range_key: str):
+    """Newest suggestion for the range still inside the staleness window."""
+    cutoff = (datetime.now() - timedelta(hours=NUTRITION_SUGGESTIONS_MAX_AGE_HOURS)).isoformat()
+    return (
+        table("nutrition_suggestions")
+        .select("*")
+        .eq("user_id", student_id)
+        .eq("range_key", range_key)
+        .gte("generated_at", cutoff)
+        .order("generated_at", desc=True)
+        .limit(1)
+    )
 
 
 # -------------------------
@@ -231,15 +230,35 @@ def _call_gemini(inputs_snapshot: Dict[str, Any]) -> Dict[str, Any]:
 # -------------------------
 
 @router.post("/nutrition/suggestions/generate", response_model=dict)
-def generate_suggestions(range: str = Query("today", pattern="^(today|7d|30d)$"), email: str = Depends(get_user_email_from_token)):
-    student_id, grade_level = _get_student_id_and_grade(email)
+async def generate_suggestions(
+    range: str = Query("today", pattern="^(today|7d|30d)$"),
+    force: bool = Query(False, description="Call the model even if nothing changed since the last suggestion"),
+    student: StudentIdentity = Depends(get_current_student),
+):
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal started
+        now = time.perf_counter()
+        timings[stage] = round((now - started) * 1000, 1)
+        started = now
+
+    student_id = student.student_id
     start_dt, end_dt = _date_range_bounds(range)
 
-    meals = _fetch_meals(student_id, start_dt, end_dt)
-    water = _fetch_water(student_id, start_dt, end_dt)
-    metrics = _fetch_latest_metrics(student_id)
-    conditions = _fetch_conditions(student_id)
-    meds = _fetch_medications_and_logs(student_id, start_dt, end_dt)
+    # Every input is independent once the student is known: one concurrent round trip
+    days, meals, metrics_rows, conditions, medications, medication_logs, latest = await gather_rows(
+        _nutrition_rollups_query(student_id, start_dt, end_dt),
+        _meals_query(student_id, start_dt, end_dt, limit=8),  # examples only; totals come from `days`
+        _latest_metrics_query(student_id),
+        _conditions_query(student_id),
+        _medications_query(student_id),
+        _medication_logs_query(student_id, start_dt, end_dt),
+        _latest_suggestion_query(student_id, range),
+    )
+    metrics = (metrics_rows or [None])[0]
+    lap("gather")
 
     # derive demographics from latest metrics if available
     age_years = None
@@ -249,13 +268,7 @@ def generate_suggestions(range: str = Query("today", pattern="^(today|7d|30d)$")
         sex = metrics.get("sex")
 
     # rollups
-    total_cal = sum(float(m.get("calories") or 0) for m in meals)
-    total_pro = sum(float(m.get("proteins") or 0) for m in meals)
-    total_carb = sum(float(m.get("carbs") or 0) for m in meals)
-    total_fat = sum(float(m.get("fat") or 0) for m in meals)
-    total_sodium = sum(float(m.get("sodium") or 0) for m in meals)
-    total_sugar = sum(float(m.get("sugar") or 0) for m in meals)
-    total_water_ml = sum(int(w.get("amount_ml") or 0) for w in water)
+    totals = sum_rollups(days)
 
     snapshot: Dict[str, Any] = {
         "range": range,
@@ -266,16 +279,9 @@ def generate_suggestions(range: str = Query("today", pattern="^(today|7d|30d)$")
         },
         "metrics_latest": metrics,
         "conditions_active": conditions,
-        "medications": meds.get("medications", []),
-        "medication_logs": meds.get("logs", []),
-        "meals_rollup": {
-            "calories": total_cal,
-            "proteins": total_pro,
-            "carbs": total_carb,
-            "fat": total_fat,
-            "sodium": total_sodium,
-            "sugar": total_sugar,
-        },
+        "medications": medications,
+        "medication_logs": medication_logs,
+        "meals_rollup": {k: totals.get(k, 0.0) for k in MEAL_NUTRIENTS},
         "meals_examples": [
             {
                 "time": m.get("time"),
@@ -287,12 +293,24 @@ def generate_suggestions(range: str = Query("today", pattern="^(today|7d|30d)$")
             }
             for m in meals[:8]
         ],
-        "water_total_ml": total_water_ml,
-        "water_days": list({w.get("intake_date") for w in water if w.get("intake_date")}),
+        "water_total_ml": int(totals.get("water_ml", 0)),
+        "water_days": [str(d["day"]) for d in days if float(d.get("water_ml") or 0) > 0],
         "generated_at": datetime.now().isoformat(),
     }
 
-    suggestions = _call_gemini(snapshot)
+    fingerprint = _inputs_fingerprint(snapshot, start_dt)
+    memoised = (latest or [None])[0]
+    lap("snapshot")
+    if (
+        not force
+        and NUTRITION_SUGGESTIONS_MAX_AGE_HOURS > 0
+        and memoised
+        and memoised.get("inputs_fingerprint") == fingerprint
+    ):
+        return {**memoised, "reused": True, "debug": {"timings_ms": timings}}
+
+    suggestions = await run_in_threadpool(_call_gemini, snapshot)
+    lap("model")
 
     # persist suggestions
     rec = {
@@ -302,21 +320,24 @@ def generate_suggestions(range: str = Query("today", pattern="^(today|7d|30d)$")
         "model": _GEMINI_MODEL,
         "inputs_snapshot": snapshot,
         "suggestions": suggestions,
+        # a fallback answer must not be reused, so it gets no fingerprint
+        "inputs_fingerprint": fingerprint if suggestions != _FALLBACK_SUGGESTIONS else None,
     }
     try:
-        saved = supabase.table("nutrition_suggestions").insert(rec).execute()
-        saved_row = (saved.data or [rec])[0]
+        saved = await fetch_rows(table("nutrition_suggestions").insert(rec))
+        saved_row = (saved or [rec])[0]
     except Exception as e:
         # do not fail generation; return response even if saving fails
         print(f"Failed to save nutrition_suggestions: {e}")
         saved_row = rec
+    lap("save")
 
-    return saved_row
+    return {**saved_row, "debug": {"timings_ms": timings}}
 
 
 @router.get("/nutrition/suggestions/latest", response_model=dict)
-def latest_suggestions(range: str = Query("today", pattern="^(today|7d|30d)$"), email: str = Depends(get_user_email_from_token)):
-    student_id, _ = _get_student_id_and_grade(email)
+def latest_suggestions(range: str = Query("today", pattern="^(today|7d|30d)$"), student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     res = (
         supabase.table("nutrition_suggestions")
         .select("*")
@@ -332,8 +353,8 @@ def latest_suggestions(range: str = Query("today", pattern="^(today|7d|30d)$"),
 
 
 @router.get("/nutrition/suggestions", response_model=List[dict])
-def list_suggestions(limit: int = Query(10, ge=1, le=50), email: str = Depends(get_user_email_from_token)):
-    student_id, _ = _get_student_id_and_grade(email)
+def list_suggestions(limit: int = Query(10, ge=1, le=50), student: StudentIdentity = Depends(get_current_student)):
+    student_id = student.student_id
     res = (
         supabase.table("nutrition_suggestions")
         .select("*")
@@ -4,10 +4,12 @@ from pydantic import BaseModel
 from typing import Optional
 from ..config import supabase
 from ..models import StudentProfileCreate, ProfileStatusResponse
+from ..utils.auth import get_user_id_from_token
 from ..utils.profile_utils import (
-    get_user_id_from_token, get_user_type, check_profile_exists,
+    get_user_type, check_profile_exists,
     get_profile_data, create_profile as create_profile_util
 )
+from ..utils.student_identity import invalidate_student
 
 router = APIRouter(prefix="/student/profile", tags=["student-profile"])
 oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
@@ -77,6 +79,7 @@ def update_profile(data: StudentProfileUpdate, token: str = Depends(oauth2)):
     user_id = get_user_id_from_token(token)
     resp = supabase.table("students").update(
         data.dict(exclude_unset=True)).eq("student_id", user_id).execute()
+    invalidate_student(user_id)
     data = getattr(resp, 'data', None)
     if not data:
         raise HTTPException(status_code=400, detail="Update failed")
@@ -88,4 +91,5 @@ def delete_profile(token: str = Depends(oauth2)):
     """Delete the authenticated student's profile."""
     user_id = get_user_id_from_token(token)
     supabase.table("students").delete().eq("student_id", user_id).execute()
+    invalidate_student(user_id)
     return {"deleted": True}
@@ -3,6 +3,8 @@ from fastapi.security import OAuth2PasswordBearer
 from typing import List
 from uuid import UUID
 from ..config import supabase
+from ..utils.auth import get_user_id_from_token
+from ..utils.realtime import publish_task
 from ..models import TaskBase, TaskCreate, TaskUpdate, TaskOut
 from datetime import datetime
 
@@ -10,13 +12,6 @@ router = APIRouter(prefix="/student/tasks", tags=["student-tasks"])
 oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 
-def get_user_id(token: str) -> UUID:
-    auth_res = supabase.auth.get_user(token)
-    if getattr(auth_res, 'error', None):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    return auth_res.user.id
-
-
 def to_iso(value):
     """Return ISO-8601 string if value has isoformat(); otherwise return as-is."""
     if value is None:
@@ -26,7 +21,7 @@ def to_iso(value):
 
 @router.get("/", response_model=List[TaskOut])
 def list_tasks(token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     resp = supabase.table("tasks").select("*").eq("assigned_to", user_id).execute()
     rows = resp.data or []
     if not rows:
@@ -51,7 +46,7 @@ def list_tasks(token: str = Depends(oauth2)):
 
 @router.get("/{task_id}", response_model=TaskOut)
 def get_task(task_id: UUID, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     resp = supabase.table("tasks") \
         .select("*") \
         .eq("task_id", task_id) \
@@ -65,7 +60,7 @@ def get_task(task_id: UUID, token: str = Depends(oauth2)):
 
 @router.post("/", response_model=TaskOut)
 def add_task(task: TaskCreate, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
     payload = task.dict(exclude_none=True)
     if "due_date" in payload:
         payload["due_date"] = to_iso(payload["due_date"])
@@ -98,6 +93,7 @@ def add_task(task: TaskCreate, token: str = Depends(oauth2)):
     if u:
         row["assigned_by_user_type"] = u.get("user_type")
         row["assigned_by_name"] = u.get("full_name") or u.get("email")
+    publish_task(row, "created")
     return row
 
 
@@ -107,7 +103,7 @@ def update_task(
     task: TaskUpdate,              # <-- use TaskUpdate here
     token: str = Depends(oauth2)
 ):
-    user_id = get_user_id(token)
+    user_id = get_user_id_from_token(token)
 
     # Verify task exists and belongs to the user
     current = supabase.table("tasks") \
@@ -148,15 +144,18 @@ def update_task(
     data = getattr(resp, "data", None)
     if not data:
         raise HTTPException(status_code=400, detail="Update failed")
+    publish_task(data[0], "updated")
     return data[0]
 
 
 @router.delete("/{task_id}", response_model=dict)
 def delete_task(task_id: UUID, token: str = Depends(oauth2)):
-    user_id = get_user_id(token)
-    supabase.table("tasks") \
+    user_id = get_user_id_from_token(token)
+    resp = supabase.table("tasks") \
         .delete() \
         .eq("task_id", task_id) \
         .eq("assigned_to", user_id) \
         .execute()
+    for row in getattr(resp, "data", None) or []:
+        publish_task(row, "deleted")
     return {"deleted": True}
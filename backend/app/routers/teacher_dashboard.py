@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Depends
 from fastapi.security import OAuth2PasswordBearer
-from ..config import supabase
-from datetime  import datetime,timedelta
+from ..config import supabase, async_db
+from ..utils.auth import get_user_id_from_token, get_current_user_id
+from ..utils.db import table, fetch_rows, gather_rows
+from ..utils.health_alerts import HEALTH_ALERT_URGENT_HOURS, alerts_query, format_reading
+from datetime  import datetime,timedelta,timezone
 from ..models import JoinRequestAction
 from collections import defaultdict
 
@@ -18,17 +21,18 @@ oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
 #         "classAverage": {"grade": "B+", "trend": "Improving"}
 #     }
 @router.get("/")
-def get_dashboard_summary(token: str = Depends(oauth2)):
-    # Get current teacher
-    user_response = supabase.auth.get_user(token)
-    if not user_response or not user_response.user:
-        return {"error": "Unauthorized"}
-    teacher_id = user_response.user.id
-
+async def get_dashboard_summary(teacher_id: str = Depends(get_current_user_id)):
+    """
+    Class summary for the teacher's assigned students.
+
+    Queries: the students, then (concurrently) all of their task completions and
+    recent attendance. Review counts, the class average and the per-student
+    achievements are all computed from the one completions fetch.
+    """
     # Fetch students
-    students_response = supabase.table("students").select("*").eq("assigned_teacher", teacher_id).execute()
-    students = students_response.data or []
+    students = await fetch_rows(table("students").select("*").eq("assigned_teacher", teacher_id))
     student_ids = [s["student_id"] for s in students]
+    names = {s["student_id"]: s.get("name") for s in students}
 
     # Class Info
     class_info = {
@@ -42,22 +46,38 @@ def get_dashboard_summary(token: str = Depends(oauth2)):
         "urgent": 2
     }
 
-    # Pending task completions
-    completions_response = supabase.table("task_completions") \
-        .select("*") \
-        .in_("student_id", student_ids) \
-        .is_("verified_by", "null") \
-        .execute()
-    pending_reviews = len(completions_response.data or [])
+    completions, attendance_resp = [], []
+    if student_ids:
+        completions, attendance_resp = await gather_rows(
+            table("task_completions")
+            .select("student_id, score, verified_by, recorded_on")
+            .in_("student_id", student_ids)
+            .order("recorded_on", desc=False),
+            table("attendance")
+            .select("present")
+            .in_("student_id", student_ids)
+            .gte("date", "2025-07-15"),
+        )
+
+    # One pass over the completions (oldest first)
+    pending_reviews = 0
+    score_total, score_count = 0, 0
+    completion_counts = defaultdict(int)
+    first_score, last_score = {}, {}
+    for row in completions:
+        sid = row["student_id"]
+        completion_counts[sid] += 1
+        if row.get("verified_by") is None:
+            pending_reviews += 1
+        score = row.get("score")
+        if score is not None:
+            score_total += score
+            score_count += 1
+            first_score.setdefault(sid, score)
+            last_score[sid] = score
 
     # Class average grade
-    scores_response = supabase.table("task_completions") \
-        .select("score") \
-        .in_("student_id", student_ids) \
-        .not_("score", "is", None) \
-        .execute()
-    scores = [r["score"] for r in scores_response.data if r.get("score") is not None]
-    average_score = sum(scores) / len(scores) if scores else 0
+    average_score = score_total / score_count if score_count else 0
     grade = (
         "A+" if average_score >= 90 else
         "A" if average_score >= 80 else
@@ -70,44 +90,17 @@ def get_dashboard_summary(token: str = Depends(oauth2)):
     # Class Achievements (mock + logic)
     achievements = []
 
-    # Example 1: Perfect task completion
-    for s in students:
-        student_id = s["student_id"]
-        completions = supabase.table("task_completions") \
-            .select("task_id, completed_on") \
-            .eq("student_id", student_id) \
-            .execute().data
-        if completions and len(completions) >= 3:
-            achievements.append(f"{s['name']}: Perfect task completion week")
-            break
+    # Example 1: Perfect task completion (first student, in roster order)
+    perfect = next((s for s in students if completion_counts[s["student_id"]] >= 3), None)
+    if perfect:
+        achievements.append(f"{perfect['name']}: Perfect task completion week")
 
     # Example 2: Grade improvement
-    improvements = supabase.table("task_completions") \
-        .select("student_id, score, recorded_on") \
-        .in_("student_id", student_ids) \
-        .order("recorded_on", desc=False) \
-        .execute().data
-
-    score_by_student = {}
-    for row in improvements:
-        sid = row["student_id"]
-        score = row["score"]
-        if sid not in score_by_student:
-            score_by_student[sid] = []
-        score_by_student[sid].append(score)
-
-    for sid, score_list in score_by_student.items():
-        if len(score_list) >= 2 and score_list[-1] - score_list[0] >= 15:
-            name = next((s["name"] for s in students if s["student_id"] == sid), None)
-            achievements.append(f"{name}: Improved from C to A-")
+    for sid, first in first_score.items():
+        if last_score[sid] - first >= 15:
+            achievements.append(f"{names.get(sid)}: Improved from C to A-")
 
     # Example 3: Class attendance
-    attendance_resp = supabase.table("attendance") \
-        .select("present") \
-        .in_("student_id", student_ids) \
-        .gte("date", "2025-07-15") \
-        .execute().data
-
     present_days = sum([1 for r in attendance_resp if r.get("present")])
     total_days = len(attendance_resp)
     attendance_rate = round((present_days / total_days) * 100) if total_days else 0
@@ -128,41 +121,57 @@ def get_dashboard_summary(token: str = Depends(oauth2)):
 
 
 @router.get("/attention")
-def get_students_requiring_attention(token: str = Depends(oauth2)):
-    user_response = supabase.auth.get_user(token)
-    if not user_response or not user_response.user:
-        return {"error": "Unauthorized"}
-    teacher_id = user_response.user.id
-
+async def get_students_requiring_attention(teacher_id: str = Depends(get_current_user_id)):
     # Fetch students assigned to this teacher
-    students_response = supabase.table("students").select("*").eq("assigned_teacher", teacher_id).execute()
-    students = students_response.data or []
+    students = await fetch_rows(
+        table("students").select("student_id, name").eq("assigned_teacher", teacher_id)
+    )
     student_ids = [s["student_id"] for s in students]
+    if not student_ids:
+        return {"studentsRequiringAttention": []}
 
-    attention_list = []
     today = datetime.utcnow()
     seven_days_ago = today - timedelta(days=7)
 
+    # Overdue tasks of these students, and their completions from the past 7 days
+    overdue_tasks, recent_completions = await gather_rows(
+        table("tasks")
+        .select("task_id, assigned_to")
+        .in_("assigned_to", student_ids)
+        .lt("due_date", today.isoformat()),
+        table("task_completions")
+        .select("student_id, task_id")
+        .in_("student_id", student_ids)
+        .gte("completed_on", seven_days_ago.isoformat()),
+    )
+
+    # Which of those overdue tasks were completed anyway
+    overdue_task_ids = list({t["task_id"] for t in overdue_tasks})
+    done_overdue = []
+    if overdue_task_ids:
+        done_overdue = await fetch_rows(
+            table("task_completions")
+            .select("student_id, task_id")
+            .in_("student_id", student_ids)
+            .in_("task_id", overdue_task_ids)
+        )
+
+    overdue_by_student = defaultdict(set)
+    for t in overdue_tasks:
+        overdue_by_student[t["assigned_to"]].add(t["task_id"])
+    for c in done_overdue:
+        overdue_by_student[c["student_id"]].discard(c["task_id"])
+    recent_count = defaultdict(int)
+    for c in recent_completions:
+        recent_count[c["student_id"]] += 1
+
+    attention_list = []
     for student in students:
         sid = student["student_id"]
         name = student["name"]
 
-        # 1. Check for overdue tasks
-        overdue_tasks = supabase.table("tasks") \
-            .select("task_id") \
-            .lt("due_date", today.isoformat()) \
-            .execute().data or []
-
-        overdue_task_ids = {t["task_id"] for t in overdue_tasks}
-
-        completed_task_ids = supabase.table("task_completions") \
-            .select("task_id") \
-            .eq("student_id", sid) \
-            .execute().data or []
-        completed_ids = {c["task_id"] for c in completed_task_ids}
-
-        student_overdue = overdue_task_ids - completed_ids
-
+        # 1. Overdue tasks
+        student_overdue = overdue_by_student.get(sid, set())
         if len(student_overdue) >= 3:
             attention_list.append({
                 "name": name,
@@ -171,14 +180,8 @@ def get_students_requiring_attention(token: str = Depends(oauth2)):
             })
             continue
 
-        # 2. Check for falling behind in tasks (e.g. completed < 2 tasks in past 7 days)
-        recent_tasks = supabase.table("task_completions") \
-            .select("*") \
-            .eq("student_id", sid) \
-            .gte("completed_on", seven_days_ago.isoformat()) \
-            .execute().data or []
-
-        if len(recent_tasks) <= 1:
+        # 2. Falling behind in tasks (e.g. completed < 2 tasks in past 7 days)
+        if recent_count.get(sid, 0) <= 1:
             attention_list.append({
                 "name": name,
                 "issue": "Falling behind in tasks",
@@ -187,7 +190,7 @@ def get_students_requiring_attention(token: str = Depends(oauth2)):
             continue
 
         # 3. Low engagement (no completions in last 7 days)
-        if not recent_tasks:
+        if not recent_count.get(sid):
             attention_list.append({
                 "name": name,
                 "issue": "Low engagement this week",
@@ -199,16 +202,23 @@ def get_students_requiring_attention(token: str = Depends(oauth2)):
     }
 
 @router.get("/health-alerts")
-def get_urgent_health_alerts(token: str = Depends(oauth2)):
-    user_response = supabase.auth.get_user(token)
-    if not user_response or not user_response.user:
-        return {"error": "Unauthorized"}
-    teacher_id = user_response.user.id
-
+async def get_urgent_health_alerts(teacher_id: str = Depends(get_current_user_id)):
     # Fetch students assigned to the teacher
-    students_response = supabase.table("students").select("*").eq("assigned_teacher", teacher_id).execute()
-    students = students_response.data or []
+    students = await fetch_rows(
+        table("students").select("*").eq("assigned_teacher", teacher_id)
+    )
     student_ids = [s["student_id"] for s in students]
+    if not student_ids:
+        return {"urgentHealthAlerts": []}
+
+    # Recent critical alerts for the whole class in one query; newest first,
+    # so the first row seen per student is their latest alert
+    alert_rows = await fetch_rows(
+        alerts_query(async_db, student_ids, "critical", since_hours=HEALTH_ALERT_URGENT_HOURS)
+    )
+    latest_alert = {}
+    for row in alert_rows:
+        latest_alert.setdefault(row["student_id"], row)
 
     alerts = []
 
@@ -216,25 +226,19 @@ def get_urgent_health_alerts(token: str = Depends(oauth2)):
         sid = student["student_id"]
         name = student["name"]
 
-        # 1. Recent health data
-        health_response = supabase.table("health_data") \
-            .select("*") \
-            .eq("student_id", sid) \
-            .order("timestamp", desc=True) \
-            .limit(1) \
-            .execute()
-
-        if health_response.data:
-            health_entry = health_response.data[0]
-            if health_entry.get("metric") == "blood_sugar" and health_entry.get("value", 0) > 180:
-                time_diff = datetime.utcnow() - datetime.fromisoformat(health_entry["timestamp"])
-                minutes_ago = int(time_diff.total_seconds() // 60)
-                alerts.append({
-                    "name": name,
-                    "alert": "High Blood Sugar",
-                    "details": f"{health_entry['value']} mg/dL ({minutes_ago} min ago)",
-                    "student_id": sid
-                })
+        # 1. Recent critical health alert
+        alert = latest_alert.get(sid)
+        if alert:
+            created = datetime.fromisoformat(str(alert["created_at"]))
+            if created.tzinfo is None:
+                created = created.replace(tzinfo=timezone.utc)
+            minutes_ago = max(0, int((datetime.now(timezone.utc) - created).total_seconds() // 60))
+            alerts.append({
+                "name": name,
+                "alert": alert["title"],
+                "details": f"{format_reading(alert)} ({minutes_ago} min ago)",
+                "student_id": sid
+            })
 
         # 2. Check for known plans (e.g., asthma)
         if "asthma" in (student.get("health_conditions") or "").lower():
@@ -253,10 +257,7 @@ def get_urgent_health_alerts(token: str = Depends(oauth2)):
 
 @router.get("/join-requests")
 def get_join_requests(token: str = Depends(oauth2)):
-    user_response = supabase.auth.get_user(token)
-    if not user_response or not user_response.user:
-        return {"error": "Unauthorized"}
-    teacher_id = user_response.user.id
+    teacher_id = get_user_id_from_token(token)
 
     response = supabase.table("student_join_requests") \
         .select("id, student_id, student(name, email, grade, section)") \
@@ -269,10 +270,7 @@ def get_join_requests(token: str = Depends(oauth2)):
 
 @router.post("/join-requests/respond")
 def respond_to_join_request(data: JoinRequestAction, token: str = Depends(oauth2)):
-    user_response = supabase.auth.get_user(token)
-    if not user_response or not user_response.user:
-        return {"error": "Unauthorized"}
-    teacher_id = user_response.user.id
+    teacher_id = get_user_id_from_token(token)
 
     # Get the join request
     req = supabase.table("student_join_requests") \
@@ -305,8 +303,7 @@ def respond_to_join_request(data: JoinRequestAction, token: str = Depends(oauth2
 
 @router.get("/students")
 def get_student_cards(token: str = Depends(oauth2)):
-    user = supabase.auth.get_user(token).user
-    teacher_id = user.id
+    teacher_id = get_user_id_from_token(token)
 
     # Step 1: Get classes assigned to the teacher
     classes_resp = supabase.table("classes").select("class_id, grade").eq("teacher_id", teacher_id).execute()
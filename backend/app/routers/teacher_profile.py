@@ -4,8 +4,9 @@ from pydantic import BaseModel
 from typing import Optional
 from ..config import supabase
 from ..models import TeacherProfileCreate, ProfileStatusResponse
+from ..utils.auth import get_user_id_from_token
 from ..utils.profile_utils import (
-    get_user_id_from_token, get_user_type, check_profile_exists,
+    get_user_type, check_profile_exists,
     get_profile_data, create_profile as create_profile_util
 )
 
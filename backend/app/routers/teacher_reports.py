@@ -4,27 +4,26 @@ from typing import Any, Dict, List, Optional
 from fastapi import Query
 from datetime import date, timedelta
 from ..config import supabase
+from ..utils.auth import get_user_id_from_token
 
 router = APIRouter(prefix="/teacher/reports", tags=["teacher-reports"])
 oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 
 def get_teacher_id(token: str) -> str:
-    auth = supabase.auth.get_user(token)
-    if getattr(auth, "error", None):
-        raise HTTPException(status_code=401, detail="Unauthorized")
+    user_id = get_user_id_from_token(token)
     # confirm they exist in teachers table
     t = (
         supabase.table("teachers")
         .select("teacher_id")
-        .eq("teacher_id", auth.user.id)
+        .eq("teacher_id", user_id)
         .single()
         .execute()
         .data
     )
     if not t:
         raise HTTPException(status_code=403, detail="Forbidden")
-    return auth.user.id
+    return user_id
 
 
 @router.get("/students", response_model=List[Dict[str, Any]])
@@ -8,6 +8,8 @@ import datetime
 
 from postgrest import APIError
 from ..config import supabase
+from ..utils.auth import get_user_id_from_token
+from ..utils.realtime import publish_join_request
 
 router = APIRouter(prefix="/teacher", tags=["Teacher • Students & Classrooms"])
 
@@ -17,12 +19,6 @@ def _get_bearer_token(authorization: str = Header(...)) -> str:
         raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
     return authorization.split(" ", 1)[1].strip()
 
-def _get_user_id_from_token(token: str) -> str:
-    auth_res = supabase.auth.get_user(token)
-    if getattr(auth_res, "error", None):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    return auth_res.user.id
-
 # ---------------- Schemas ----------------
 class ClassroomCreate(BaseModel):
     name: str = Field(..., description="Classroom name")
@@ -115,7 +111,7 @@ def _teacher_classroom_ids(teacher_id: str) -> List[str]:
 @router.get("/classrooms")
 def list_classrooms(authorization: str = Header(...)):
     token = _get_bearer_token(authorization)
-    teacher_id = _get_user_id_from_token(token)
+    teacher_id = get_user_id_from_token(token)
     try:
         resp = (
             supabase.table("classrooms")
@@ -135,14 +131,14 @@ def list_classrooms(authorization: str = Header(...)):
 @router.get("/classrooms/{classroom_id}")
 def get_classroom(classroom_id: UUID, authorization: str = Header(...)):
     token = _get_bearer_token(authorization)
-    teacher_id = _get_user_id_from_token(token)
+    teacher_id = get_user_id_from_token(token)
     row = _assert_owner_or_404(str(classroom_id), teacher_id)
     return _normalize_row_for_ui(row)
 
 @router.post("/classrooms")
 def create_classroom(body: ClassroomCreate, authorization: str = Header(...)):
     token = _get_bearer_token(authorization)
-    teacher_id = _get_user_id_from_token(token)
+    teacher_id = get_user_id_from_token(token)
     payload = _create_payload(body, teacher_id)
 
     # try to avoid duplicate classroom_key collisions
@@ -175,7 +171,7 @@ def create_classroom(body: ClassroomCreate, authorization: str = Header(...)):
 @router.patch("/classrooms/{classroom_id}")
 def update_classroom(classroom_id: UUID, body: ClassroomUpdate, authorization: str = Header(...)):
     token = _get_bearer_token(authorization)
-    teacher_id = _get_user_id_from_token(token)
+    teacher_id = get_user_id_from_token(token)
     _assert_owner_or_404(str(classroom_id), teacher_id)
 
     updates = _update_payload(body)
@@ -201,7 +197,7 @@ def delete_classroom(
     hard: bool = Query(False, description="If true, hard delete; otherwise soft-delete"),
 ):
     token = _get_bearer_token(authorization)
-    teacher_id = _get_user_id_from_token(token)
+    teacher_id = get_user_id_from_token(token)
     _assert_owner_or_404(str(classroom_id), teacher_id)
 
     try:
@@ -221,7 +217,7 @@ def delete_classroom(
 @router.get("/classrooms/{classroom_id}/students")
 def list_classroom_students(classroom_id: UUID, authorization: str = Header(...)):
     token = _get_bearer_token(authorization)
-    teacher_id = _get_user_id_from_token(token)
+    teacher_id = get_user_id_from_token(token)
     _assert_owner_or_404(str(classroom_id), teacher_id)
     try:
         resp = (
@@ -242,7 +238,7 @@ def list_classroom_students(classroom_id: UUID, authorization: str = Header(...)
 @router.get("/students/metrics")
 def students_metrics(authorization: str = Header(...)):
     token = _get_bearer_token(authorization)
-    teacher_id = _get_user_id_from_token(token)
+    teacher_id = get_user_id_from_token(token)
 
     cls = supabase.table("classrooms").select("classroom_id,is_active").eq("teacher_id", teacher_id).execute().data or []
     total_classrooms = len(cls)
@@ -300,7 +296,7 @@ def list_requests(status: str = Query("pending"), authorization: str = Header(..
     List join/connection requests that target this teacher's classrooms.
     """
     token = _get_bearer_token(authorization)
-    teacher_id = _get_user_id_from_token(token)
+    teacher_id = get_user_id_from_token(token)
 
     cls_ids = _teacher_classroom_ids(teacher_id)
     if not cls_ids:
@@ -395,7 +391,7 @@ def respond_request(request_id: UUID, body: RequestRespond, authorization: str =
       - if requester is parent -> idempotent user_connections add to teacher
     """
     token = _get_bearer_token(authorization)
-    teacher_id = _get_user_id_from_token(token)
+    teacher_id = get_user_id_from_token(token)
 
     # Load request
     req_rows = (
@@ -436,6 +432,7 @@ def respond_request(request_id: UUID, body: RequestRespond, authorization: str =
     # If rejecting, just update status
     if body.action == "rejected":
         final = _set_request_status(str(request_id), teacher_id, "rejected")
+        publish_join_request(req, final)
         return {"ok": True, "request_id": str(request_id), "status": final}
 
     # Accepting: perform side-effects FIRST, then mark accepted.
@@ -555,6 +552,7 @@ def respond_request(request_id: UUID, body: RequestRespond, authorization: str =
         raise HTTPException(status_code=400, detail=str(e))
 
     final = _set_request_status(str(request_id), teacher_id, "accepted")
+    publish_join_request(req, final)
     return {"ok": True, "request_id": str(request_id), "status": final}
 
 def _set_request_status(request_id: str, teacher_id: str, preferred: str) -> str:
@@ -6,22 +6,14 @@ from datetime import datetime, timezone
 from pydantic import BaseModel, Field, EmailStr
 
 from ..config import supabase
+from ..utils.auth import get_user_id_from_token
+from ..utils.realtime import publish_task
 from ..models import TaskBase, TaskUpdate  # TaskBase has task_id, assigned_*; TaskUpdate = partial
 
 router = APIRouter(prefix="/teacher/tasks", tags=["teacher-tasks"])
 oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 
-def get_user_id(token: str) -> UUID:
-    auth_res = supabase.auth.get_user(token)
-    if getattr(auth_res, 'error', None):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    user = auth_res.user
-    if not user or not user.id:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    return user.id
-
-
 # Accepts which student to assign to; teacher is assigned_by automatically
 class TeacherTaskCreate(BaseModel):
     title: str
@@ -42,7 +34,7 @@ class TeacherTaskCreate(BaseModel):
 
 @router.get("/summary")
 def get_tasks_summary(token: str = Depends(oauth2)):
-    teacher_id = get_user_id(token)
+    teacher_id = get_user_id_from_token(token)
     now_iso = datetime.now(timezone.utc).isoformat()
 
     # All tasks assigned_by this teacher
@@ -118,7 +110,7 @@ def get_tasks_summary(token: str = Depends(oauth2)):
 
 @router.get("/recent")
 def recent_tasks(token: str = Depends(oauth2)):
-    teacher_id = get_user_id(token)
+    teacher_id = get_user_id_from_token(token)
 
     task_resp = (
         supabase.table("tasks")
@@ -160,7 +152,7 @@ def recent_tasks(token: str = Depends(oauth2)):
 
 @router.get("/overdue")
 def overdue_tasks(token: str = Depends(oauth2)):
-    teacher_id = get_user_id(token)
+    teacher_id = get_user_id_from_token(token)
     now_iso = datetime.now(timezone.utc).isoformat()
 
     task_resp = (
@@ -180,7 +172,7 @@ def overdue_tasks(token: str = Depends(oauth2)):
 # --- Create a Task (teacher assigns) ---
 @router.post("/", response_model=TaskBase, status_code=201)
 def create_task(task: TeacherTaskCreate, token: str = Depends(oauth2)):
-    teacher_id = get_user_id(token)
+    teacher_id = get_user_id_from_token(token)
     payload = task.dict()
 
     # Validate assignment target: exactly one of assigned_to or assigned_to_email
@@ -221,13 +213,14 @@ def create_task(task: TeacherTaskCreate, token: str = Depends(oauth2)):
     data = getattr(resp, "data", None)
     if not data:
         raise HTTPException(status_code=400, detail="Insert failed")
+    publish_task(data[0], "created")
     return data[0]
 
 
 # --- Read All Tasks (for this teacher) ---
 @router.get("/", response_model=List[TaskBase])
 def get_all_tasks(token: str = Depends(oauth2)):
-    teacher_id = get_user_id(token)
+    teacher_id = get_user_id_from_token(token)
     resp = (
         supabase.table("tasks")
         .select("*")
@@ -241,7 +234,7 @@ def get_all_tasks(token: str = Depends(oauth2)):
 # --- Read Single Task by ID (must belong to this teacher) ---
 @router.get("/{task_id}", response_model=TaskBase)
 def get_task(task_id: UUID, token: str = Depends(oauth2)):
-    teacher_id = get_user_id(token)
+    teacher_id = get_user_id_from_token(token)
     resp = (
         supabase.table("tasks")
         .select("*")
@@ -258,7 +251,7 @@ def get_task(task_id: UUID, token: str = Depends(oauth2)):
 # --- Update Task (partial) ---
 @router.patch("/{task_id}", response_model=TaskBase)
 def update_task(task_id: UUID, task: TaskUpdate, token: str = Depends(oauth2)):
-    teacher_id = get_user_id(token)
+    teacher_id = get_user_id_from_token(token)
 
     # Ensure it belongs to teacher
     current = (
@@ -292,12 +285,15 @@ def update_task(task_id: UUID, task: TaskUpdate, token: str = Depends(oauth2)):
     data = getattr(resp, "data", None)
     if not data:
         raise HTTPException(status_code=400, detail="Update failed")
+    publish_task(data[0], "updated")
     return data[0]
 
 
 # --- Delete Task ---
 @router.delete("/{task_id}", response_model=dict)
 def delete_task(task_id: UUID, token: str = Depends(oauth2)):
-    teacher_id = get_user_id(token)
-    supabase.table("tasks").delete().eq("task_id", str(task_id)).eq("assigned_by", teacher_id).execute()
+    teacher_id = get_user_id_from_token(token)
+    resp = supabase.table("tasks").delete().eq("task_id", str(task_id)).eq("assigned_by", teacher_id).execute()
+    for row in getattr(resp, "data", None) or []:
+        publish_task(row, "deleted")
     return {"deleted": True}
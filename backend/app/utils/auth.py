@@ -0,0 +1,185 @@
+import hashlib
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+import jwt
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+
+from ..config import (
+    supabase,
+    SUPABASE_JWT_SECRET,
+    SUPABASE_JWKS_URL,
+    JWT_AUDIENCE,
+    JWKS_REFRESH_SECONDS,
+    AUTH_NEGATIVE_CACHE_SECONDS,
+)
+from .cache import TTLCache
+
+oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
+
+_ASYMMETRIC_ALGS = {"RS256", "ES256", "EdDSA"}
+# Never hit the JWKS endpoint more often than this, even for unknown key ids
+_JWKS_MIN_REFRESH_SECONDS = 30
+
+# Rejected / revoked tokens (keyed by digest) so a bad token never costs a network call twice
+_negative_cache = TTLCache(maxsize=4096, ttl=AUTH_NEGATIVE_CACHE_SECONDS)
+# Claims for tokens that could only be checked remotely (no local key available)
+_remote_claims_cache = TTLCache(maxsize=4096, ttl=AUTH_NEGATIVE_CACHE_SECONDS)
+
+
+def _unauthorized() -> HTTPException:
+    return HTTPException(status_code=401, detail="Unauthorized")
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+# ---- Signing keys ----
+
+
+class _JWKSCache:
+    """Supabase signing keys, refreshed periodically and on unknown key ids."""
+
+    def __init__(self, url: str, ttl: int):
+        self._url = url
+        self._ttl = ttl
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        try:
+            resp = httpx.get(self._url, timeout=5.0)
+            resp.raise_for_status()
+            jwks = resp.json()
+        except Exception as e:
+            # Keep serving the previous key set; remote verification covers the gap
+            print(f"JWKS refresh failed: {e}")
+            self._fetched_at = time.monotonic()
+            return
+        keys: Dict[str, jwt.PyJWK] = {}
+        for jwk in jwks.get("keys", []):
+            kid = jwk.get("kid")
+            if not kid:
+                continue
+            try:
+                keys[kid] = jwt.PyJWK(jwk)
+            except Exception:
+                # Unsupported key type/algorithm; skip it
+                continue
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+    def get(self, kid: Optional[str]) -> Optional[jwt.PyJWK]:
+        age = time.monotonic() - self._fetched_at
+        if age > self._ttl or (kid not in self._keys and age > _JWKS_MIN_REFRESH_SECONDS):
+            with self._lock:
+                # another thread may have refreshed while we waited
+                age = time.monotonic() - self._fetched_at
+                if age > self._ttl or (kid not in self._keys and age > _JWKS_MIN_REFRESH_SECONDS):
+                    self._refresh()
+        return self._keys.get(kid) if kid else None
+
+
+_jwks = _JWKSCache(SUPABASE_JWKS_URL, JWKS_REFRESH_SECONDS)
+
+
+# ---- Verification ----
+
+
+def _decode_locally(token: str) -> Optional[Dict[str, Any]]:
+    """Verify signature, expiry and audience locally.
+
+    Returns the claims, or None when no local key can check this token
+    (e.g. HS256 token but no JWT secret configured).
+    """
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.InvalidTokenError:
+        raise _unauthorized()
+
+    alg = header.get("alg")
+    if alg == "HS256":
+        if not SUPABASE_JWT_SECRET:
+            return None
+        key: Any = SUPABASE_JWT_SECRET
+    elif alg in _ASYMMETRIC_ALGS:
+        jwk = _jwks.get(header.get("kid"))
+        if jwk is None:
+            return None
+        key = jwk.key
+        alg = jwk.algorithm_name or alg
+    else:
+        raise _unauthorized()
+
+    try:
+        return jwt.decode(
+            token,
+            key,
+            algorithms=[alg],
+            audience=JWT_AUDIENCE,
+            options={"require": ["exp", "sub"]},
+        )
+    except jwt.InvalidTokenError:
+        raise _unauthorized()
+
+
+def _decode_remotely(token: str) -> Dict[str, Any]:
+    """Fallback: ask Supabase Auth. Results are cached briefly."""
+    key = _token_key(token)
+    cached = _remote_claims_cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        res = supabase.auth.get_user(token)
+    except Exception:
+        raise _unauthorized()
+    user = getattr(res, "user", None)
+    if not user or not getattr(user, "id", None):
+        raise _unauthorized()
+    claims = {"sub": str(user.id), "email": getattr(user, "email", None)}
+    _remote_claims_cache.set(key, claims)
+    return claims
+
+
+def verify_token(token: str) -> Dict[str, Any]:
+    """Return the verified JWT claims for a bearer token (or 401)."""
+    if not token:
+        raise _unauthorized()
+    key = _token_key(token)
+    if key in _negative_cache:
+        raise _unauthorized()
+    try:
+        claims = _decode_locally(token)
+        if claims is None:
+            claims = _decode_remotely(token)
+    except HTTPException:
+        _negative_cache.set(key, True)
+        raise
+    return claims
+
+
+def get_user_id_from_token(token: str) -> str:
+    """Return the authenticated user's id (or 401)."""
+    user_id = verify_token(token).get("sub")
+    if not user_id:
+        raise _unauthorized()
+    return user_id
+
+
+# ---- FastAPI dependencies ----
+
+
+def get_current_user_id(token: str = Depends(oauth2)) -> str:
+    return get_user_id_from_token(token)
+
+
+def get_current_user_email(token: str = Depends(oauth2)) -> str:
+    email = verify_token(token).get("email")
+    if not email:
+        raise _unauthorized()
+    return email
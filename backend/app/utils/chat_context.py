@@ -0,0 +1,128 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from ..config import supabase
+
+# Messages sent to the model verbatim; anything older is represented by the
+# rolling summary stored on chat_sessions.context_summary.
+CHAT_CONTEXT_MESSAGES = int(os.getenv("CHAT_CONTEXT_MESSAGES", "12"))
+# Older messages folded into the summary per refresh (bounds summary cost too)
+CHAT_SUMMARY_BATCH = int(os.getenv("CHAT_SUMMARY_BATCH", "8"))
+# Don't spend a model call on fewer than this many unsummarised messages
+CHAT_SUMMARY_MIN_BATCH = int(os.getenv("CHAT_SUMMARY_MIN_BATCH", "4"))
+
+MESSAGE_COLUMNS = "message_id, session_id, sender_type, message_content, timestamp"
+SESSION_SUMMARY_COLUMNS = "context_summary, summary_upto"
+
+# summarize(previous_summary, messages) -> new summary, or None on failure
+Summarizer = Callable[[Optional[str], List[Dict[str, Any]]], Optional[str]]
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+_in_flight: set = set()
+_in_flight_lock = threading.Lock()
+
+
+class ChatContext(NamedTuple):
+    summary: Optional[str]
+    messages: List[Dict[str, Any]]  # last CHAT_CONTEXT_MESSAGES, oldest first
+    summary_upto: Optional[str]
+    # timestamp of the oldest message in a full window; older unsummarised
+    # messages may exist only then (None = window not full)
+    window_start: Optional[str]
+
+
+def _unsummarised_query(session_id: str, summary_upto: Optional[str]):
+    query = (
+        supabase.table("chat_messages")
+        .select(MESSAGE_COLUMNS)
+        .eq("session_id", session_id)
+    )
+    if summary_upto:
+        query = query.gt("timestamp", summary_upto)
+    return query
+
+
+def history_query(session_id: str, session: Dict[str, Any]):
+    """The newest CHAT_CONTEXT_MESSAGES messages not yet in the summary, newest first."""
+    return (
+        _unsummarised_query(session_id, session.get("summary_upto"))
+        .order("timestamp", desc=True)
+        .limit(CHAT_CONTEXT_MESSAGES)
+    )
+
+
+def backlog_query(session_id: str, context: ChatContext):
+    """The oldest CHAT_SUMMARY_BATCH unsummarised messages before the window, oldest first.
+
+    The summary must advance contiguously from summary_upto, so the backlog
+    is read from that end rather than from just behind the verbatim window.
+    """
+    return (
+        _unsummarised_query(session_id, context.summary_upto)
+        .lt("timestamp", context.window_start)
+        .order("timestamp")
+        .limit(CHAT_SUMMARY_BATCH)
+    )
+
+
+def build_context(session: Dict[str, Any], newest_first: List[Dict[str, Any]]) -> ChatContext:
+    """Turn a `history_query` result into the verbatim window."""
+    full = len(newest_first) >= CHAT_CONTEXT_MESSAGES
+    return ChatContext(
+        summary=session.get("context_summary"),
+        messages=list(reversed(newest_first)),
+        summary_upto=session.get("summary_upto"),
+        window_start=newest_first[-1]["timestamp"] if full else None,
+    )
+
+
+def load_context(session_id: str, session: Dict[str, Any]) -> ChatContext:
+    resp = history_query(session_id, session).execute()
+    return build_context(session, getattr(resp, "data", None) or [])
+
+
+def refresh_summary_later(session_id: str, context: ChatContext, summarize: Summarizer) -> bool:
+    """Fold messages older than the window into the stored summary, off the request path.
+
+    Returns True if a refresh was scheduled; the backlog itself is read by
+    the refresh. At most one refresh per session runs at a time; a long
+    backlog is caught up CHAT_SUMMARY_BATCH messages per turn.
+    """
+    if context.window_start is None:
+        return False  # a partly filled window holds everything unsummarised
+    with _in_flight_lock:
+        if session_id in _in_flight:
+            return False
+        _in_flight.add(session_id)
+    _executor.submit(_refresh_summary, session_id, context, summarize)
+    return True
+
+
+def _refresh_summary(session_id: str, context: ChatContext, summarize: Summarizer) -> None:
+    try:
+        resp = backlog_query(session_id, context).execute()
+        backlog = getattr(resp, "data", None) or []
+        if len(backlog) < CHAT_SUMMARY_MIN_BATCH:
+            return
+        summary = summarize(context.summary, backlog)
+        if not summary:
+            return
+        # the backlog is the oldest-first run right after summary_upto, so
+        # its last message is exactly how far the new summary reaches
+        query = supabase.table("chat_sessions").update({
+            "context_summary": summary,
+            "summary_upto": backlog[-1]["timestamp"],
+        }).eq("session_id", session_id)
+        # only apply on top of the summary we started from
+        if context.summary_upto:
+            query = query.eq("summary_upto", context.summary_upto)
+        else:
+            query = query.is_("summary_upto", "null")
+        query.execute()
+    except Exception as e:
+        print(f"chat summary refresh failed for {session_id}: {e}")
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(session_id)
@@ -0,0 +1,59 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import anyio.to_thread
+
+from ..config import async_db, THREADPOOL_SIZE
+
+# Async data access for `async def` handlers.
+#
+# The synchronous `supabase` client blocks the calling thread; inside an async
+# handler it would block the whole event loop. Build queries with `table()`
+# (same builder API as `supabase.table()`) and await them with the helpers
+# below, e.g.
+#
+#     tasks, goals = await gather_rows(
+#         table("tasks").select("*").in_("assigned_to", child_ids),
+#         table("savings_goals").select("*").in_("student_id", child_ids),
+#     )
+
+
+def table(name: str):
+    """Start an async PostgREST query against `name`."""
+    return async_db.table(name)
+
+
+def rpc(func: str, params: Dict[str, Any]):
+    """Start an async PostgREST RPC call."""
+    return async_db.rpc(func, params)
+
+
+async def fetch_rows(query) -> List[Dict[str, Any]]:
+    """Execute a query and return its rows ([] when empty)."""
+    resp = await query.execute()
+    return getattr(resp, "data", None) or []
+
+
+async def fetch_one(query) -> Optional[Dict[str, Any]]:
+    """Execute a select and return the first row, or None."""
+    rows = await fetch_rows(query.limit(1))
+    return rows[0] if rows else None
+
+
+async def gather_rows(*queries) -> List[List[Dict[str, Any]]]:
+    """Execute independent queries concurrently; results keep argument order."""
+    return list(await asyncio.gather(*(fetch_rows(q) for q in queries)))
+
+
+# ---- Lifecycle ----
+
+
+def configure_threadpool() -> None:
+    """Resize AnyIO's worker pool used by the remaining sync handlers."""
+    if THREADPOOL_SIZE:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+
+async def close_async_db() -> None:
+    """Close pooled keep-alive connections (call on shutdown)."""
+    await async_db.aclose()
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set
+
+from ..config import supabase, async_db
+from .cache import TTLCache
+
+FAMILY_CACHE_TTL_SECONDS = float(os.getenv("FAMILY_CACHE_TTL_SECONDS", "30"))
+
+# ---- Cross-request cache ----
+# parent user_id -> FamilyResolution. Writes that change membership call
+# invalidate_family()/invalidate_user(); other workers converge within the TTL.
+_cache = TTLCache(maxsize=4096, ttl=FAMILY_CACHE_TTL_SECONDS)
+# family_id -> parent user_ids whose cached resolution includes it
+_cached_by_family: Dict[str, Set[str]] = defaultdict(set)
+_index_lock = threading.Lock()
+
+
+class FamilyResolution(NamedTuple):
+    head_family_ids: FrozenSet[str]
+    family_ids: List[str]
+    child_ids: List[str]
+
+
+def _remember(parent_user_id: str, resolved: FamilyResolution) -> None:
+    _cache.set(parent_user_id, resolved)
+    with _index_lock:
+        for family_id in resolved.family_ids:
+            _cached_by_family[family_id].add(parent_user_id)
+
+
+def invalidate_user(user_id: str) -> None:
+    """Forget the cached families/children of one user."""
+    _cache.pop(str(user_id))
+
+
+def invalidate_family(family_id: str) -> None:
+    """Forget cached resolutions of every parent of `family_id`."""
+    with _index_lock:
+        parent_ids = _cached_by_family.pop(str(family_id), set())
+    for parent_id in parent_ids:
+        _cache.pop(parent_id)
+
+
+# ---- Queries ----
+# `client` is either the sync `supabase` client or the async `async_db`;
+# both expose the same PostgREST builder API.
+
+
+def _head_query(client, parent_user_id: str):
+    return (
+        client.table("family_groups")
+        .select("family_id")
+        .eq("family_head_id", parent_user_id)
+        .eq("is_active", True)
+    )
+
+
+def _member_query(client, parent_user_id: str):
+    return (
+        client.table("family_members")
+        .select("family_id, role, is_active")
+        .eq("user_id", parent_user_id)
+        .eq("is_active", True)
+    )
+
+
+def _children_query(client, family_ids: List[str]):
+    return (
+        client.table("family_members")
+        .select("user_id, role, is_active")
+        .in_("family_id", family_ids)
+        .eq("role", "child")
+        .eq("is_active", True)
+    )
+
+
+def _family_ids(head_rows, member_rows) -> tuple[FrozenSet[str], List[str]]:
+    head_family_ids = frozenset(row["family_id"] for row in (head_rows or []) if row.get("family_id"))
+    member_family_ids = {
+        row["family_id"]
+        for row in (member_rows or [])
+        if row.get("family_id") and row.get("role") in ("head", "parent")
+    }
+    return head_family_ids, list(head_family_ids.union(member_family_ids))
+
+
+def _child_ids(child_rows) -> List[str]:
+    # de-duplicate (a child can be in several of the parent's families), keep order
+    return list(dict.fromkeys(row["user_id"] for row in (child_rows or []) if row.get("user_id")))
+
+
+class FamilyGraph:
+    """Resolves a parent's families and active children.
+
+    A parent's families are those they head (family_groups.family_head_id) or
+    belong to as an active 'head'/'parent' member; children are the active
+    'child' members of those families.
+
+    Create one per request (see `get_family_graph`): lookups are memoised on
+    the instance and also held in a short cross-request TTL cache.
+    """
+
+    def __init__(self):
+        self._resolved: Dict[str, FamilyResolution] = {}
+
+    def _cached(self, parent_user_id: str) -> Optional[FamilyResolution]:
+        resolved = self._resolved.get(parent_user_id) or _cache.get(parent_user_id)
+        if resolved is not None:
+            self._resolved[parent_user_id] = resolved
+        return resolved
+
+    def _store(self, parent_user_id: str, resolved: FamilyResolution) -> FamilyResolution:
+        self._resolved[parent_user_id] = resolved
+        _remember(parent_user_id, resolved)
+        return resolved
+
+    def resolve(self, parent_user_id: str) -> FamilyResolution:
+        """Blocking lookup, for sync (`def`) handlers."""
+        parent_user_id = str(parent_user_id)
+        resolved = self._cached(parent_user_id)
+        if resolved is not None:
+            return resolved
+        head_rows = _head_query(supabase, parent_user_id).execute().data
+        member_rows = _member_query(supabase, parent_user_id).execute().data
+        head_family_ids, family_ids = _family_ids(head_rows, member_rows)
+        child_rows = _children_query(supabase, family_ids).execute().data if family_ids else []
+        return self._store(parent_user_id, FamilyResolution(head_family_ids, family_ids, _child_ids(child_rows)))
+
+    async def aresolve(self, parent_user_id: str) -> FamilyResolution:
+        """Non-blocking lookup, for `async def` handlers."""
+        parent_user_id = str(parent_user_id)
+        resolved = self._cached(parent_user_id)
+        if resolved is not None:
+            return resolved
+        head_resp, member_resp = await asyncio.gather(
+            _head_query(async_db, parent_user_id).execute(),
+            _member_query(async_db, parent_user_id).execute(),
+        )
+        head_family_ids, family_ids = _family_ids(head_resp.data, member_resp.data)
+        child_rows = (await _children_query(async_db, family_ids).execute()).data if family_ids else []
+        return self._store(parent_user_id, FamilyResolution(head_family_ids, family_ids, _child_ids(child_rows)))
+
+    def children_ids(self, parent_user_id: str, child_id: Optional[str] = None) -> List[str]:
+        """Active children of the parent; narrowed to `child_id` when given."""
+        return _only(self.resolve(parent_user_id).child_ids, child_id)
+
+    async def achildren_ids(self, parent_user_id: str, child_id: Optional[str] = None) -> List[str]:
+        return _only((await self.aresolve(parent_user_id)).child_ids, child_id)
+
+
+def _only(child_ids: List[str], child_id: Optional[str]) -> List[str]:
+    if not child_id:
+        return list(child_ids)
+    return [c for c in child_ids if c == str(child_id)]
+
+
+def get_family_graph() -> FamilyGraph:
+    """FastAPI dependency: one FamilyGraph per request."""
+    return FamilyGraph()
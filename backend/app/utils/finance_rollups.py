@@ -0,0 +1,67 @@
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from ..config import supabase
+
+# Per-student monthly income/expense buckets (table finance_monthly_rollups,
+# see migrations/001_finance_monthly_rollups.sql). Every transaction write
+# applies a delta to its month's bucket, so the dashboard reads O(months)
+# rows instead of the whole ledger.
+
+
+def _month(value: Any) -> str:
+    d = value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+    return d.replace(day=1).isoformat()
+
+
+def _delta(tx: Dict[str, Any], sign: int) -> Dict[str, Any]:
+    amount = float(tx.get("amount") or 0) * sign
+    return {
+        "p_student_id": str(tx["student_id"]),
+        "p_month": _month(tx["transaction_date"]),
+        "p_income": amount if tx.get("type") == "Income" else 0,
+        "p_expense": amount if tx.get("type") == "Expense" else 0,
+        "p_count": sign,
+    }
+
+
+def rebuild_rollups(student_id: str) -> None:
+    """Recompute a student's buckets from their transactions."""
+    supabase.rpc("rebuild_finance_rollups", {"p_student_id": str(student_id)}).execute()
+
+
+def record_transaction_change(
+    old: Optional[Dict[str, Any]] = None,
+    new: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Apply an insert (new only), delete (old only) or update (both) to the rollups.
+
+    Rows need student_id, type, amount and transaction_date. A failed
+    delta falls back to a full rebuild so the buckets never drift.
+    """
+    student_id = (new or old or {}).get("student_id")
+    if not student_id:
+        return
+    try:
+        if old:
+            supabase.rpc("apply_finance_rollup_delta", _delta(old, -1)).execute()
+        if new:
+            supabase.rpc("apply_finance_rollup_delta", _delta(new, 1)).execute()
+    except Exception as e:
+        print(f"finance rollup delta failed for {student_id}: {e}")
+        try:
+            rebuild_rollups(student_id)
+        except Exception as e2:
+            print(f"finance rollup rebuild failed for {student_id}: {e2}")
+
+
+def get_monthly_rollups(student_id: str) -> List[Dict[str, Any]]:
+    """A student's month buckets, oldest first."""
+    resp = (
+        supabase.table("finance_monthly_rollups")
+        .select("month, income, expense, tx_count")
+        .eq("student_id", str(student_id))
+        .order("month")
+        .execute()
+    )
+    return getattr(resp, "data", None) or []
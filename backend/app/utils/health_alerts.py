@@ -0,0 +1,149 @@
+import operator
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from ..config import supabase
+from .realtime import publish_alerts
+
+# Health alerts are evaluated once, when a health_metrics row is written,
+# and stored in health_alerts (migrations/012_health_alerts.sql). Dashboards
+# read the stored rows instead of rescanning metrics with their own
+# thresholds.
+
+# Teacher "urgent" view only shows critical alerts this recent
+HEALTH_ALERT_URGENT_HOURS = float(os.getenv("HEALTH_ALERT_URGENT_HOURS", "24"))
+
+ALERT_COLUMNS = "id, student_id, metric_id, rule_id, metric, value, threshold, severity, title, message, created_at"
+SEVERITIES = ("critical", "warning")
+
+_COMPARATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+
+class AlertRule(NamedTuple):
+    rule_id: str
+    metric: str  # health_metrics column
+    comparator: str  # one of _COMPARATORS
+    threshold: float
+    severity: str  # one of SEVERITIES
+    title: str
+    message: str  # formatted with value, threshold
+    unit: str  # of the metric's values, for display
+    # condition keyword (matched case-insensitively against active
+    # health_conditions.condition_name) -> threshold to use instead
+    condition_overrides: Dict[str, float] = {}
+
+
+# Per metric and direction only the most severe matching rule fires, so
+# list the critical rule before the warning rule it supersedes.
+ALERT_RULES: Tuple[AlertRule, ...] = (
+    AlertRule("blood_sugar_critical_high", "blood_sugar", ">", 180, "critical",
+              "High Blood Sugar", "blood sugar elevated ({value:g} mg/dL)", "mg/dL"),
+    AlertRule("blood_sugar_high", "blood_sugar", ">", 140, "warning",
+              "Blood Sugar High", "blood sugar high ({value:g} mg/dL)", "mg/dL"),
+    AlertRule("blood_sugar_critical_low", "blood_sugar", "<", 70, "critical",
+              "Low Blood Sugar", "blood sugar low ({value:g} mg/dL)", "mg/dL"),
+)
+_RULES_BY_ID = {rule.rule_id: rule for rule in ALERT_RULES}
+
+
+def _direction(rule: AlertRule) -> str:
+    return "high" if rule.comparator.startswith(">") else "low"
+
+
+def _threshold(rule: AlertRule, conditions: Iterable[str]) -> float:
+    for keyword, threshold in rule.condition_overrides.items():
+        if any(keyword.lower() in c.lower() for c in conditions):
+            return threshold
+    return rule.threshold
+
+
+def evaluate(metrics: Dict[str, Any], conditions: Iterable[str] = (),
+             rules: Iterable[AlertRule] = ALERT_RULES) -> List[Dict[str, Any]]:
+    """Alerts (unsaved rows) raised by one health_metrics row."""
+    conditions = list(conditions)
+    fired = set()
+    alerts = []
+    for rule in rules:
+        key = (rule.metric, _direction(rule))
+        value = metrics.get(rule.metric)
+        if key in fired or value is None:
+            continue
+        threshold = _threshold(rule, conditions)
+        if not _COMPARATORS[rule.comparator](float(value), threshold):
+            continue
+        fired.add(key)
+        alerts.append({
+            "student_id": metrics.get("student_id"),
+            "metric_id": metrics.get("id"),
+            "rule_id": rule.rule_id,
+            "metric": rule.metric,
+            "value": value,
+            "threshold": threshold,
+            "severity": rule.severity,
+            "title": rule.title,
+            "message": rule.message.format(value=float(value), threshold=threshold),
+            "created_at": metrics.get("created_at") or datetime.now(timezone.utc).isoformat(),
+        })
+    return alerts
+
+
+def _active_conditions(student_id: str) -> List[str]:
+    resp = (
+        supabase.table("health_conditions")
+        .select("condition_name")
+        .eq("user_id", student_id)
+        .eq("is_active", True)
+        .execute()
+    )
+    return [r["condition_name"] for r in (getattr(resp, "data", None) or []) if r.get("condition_name")]
+
+
+def record_alerts(metrics: Dict[str, Any], replace: bool = False) -> List[Dict[str, Any]]:
+    """Evaluate a just-written health_metrics row and store its alerts.
+
+    With replace=True (metric edited) the row's previous alerts are removed
+    first. Stored alerts are pushed to realtime subscribers and returned;
+    failures are logged, never raised.
+    """
+    student_id = metrics.get("student_id")
+    if not student_id:
+        return []
+    try:
+        if replace and metrics.get("id"):
+            supabase.table("health_alerts").delete().eq("metric_id", str(metrics["id"])).execute()
+        conditions = _active_conditions(student_id) if any(r.condition_overrides for r in ALERT_RULES) else []
+        alerts = evaluate(metrics, conditions)
+        if not alerts:
+            return []
+        resp = supabase.table("health_alerts").insert(alerts).execute()
+        stored = getattr(resp, "data", None) or alerts
+        publish_alerts(stored)
+        return stored
+    except Exception as e:
+        print(f"health alert evaluation failed for {student_id}: {e}")
+        return []
+
+
+def format_reading(alert: Dict[str, Any]) -> str:
+    """A stored alert's value with its rule's unit, e.g. "190 mg/dL"."""
+    rule = _RULES_BY_ID.get(alert.get("rule_id"))
+    return f"{float(alert['value']):g} {rule.unit if rule else ''}".rstrip()
+
+
+def alerts_query(client, student_ids: Iterable[str], severity: Optional[str] = None,
+                 since_hours: Optional[float] = None):
+    """Stored alerts for `student_ids`, newest first; `client` is `supabase` or `async_db`.
+
+    Served by the (student_id, severity, created_at) index.
+    """
+    query = (
+        client.table("health_alerts")
+        .select(ALERT_COLUMNS)
+        .in_("student_id", [str(s) for s in student_ids])
+    )
+    if severity:
+        query = query.eq("severity", severity)
+    if since_hours:
+        query = query.gte("created_at", (datetime.now(timezone.utc) - timedelta(hours=since_hours)).isoformat())
+    return query.order("created_at", desc=True)
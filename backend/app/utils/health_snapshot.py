@@ -0,0 +1,32 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..config import supabase
+
+# Newest health_metrics row per student (table latest_health_snapshot, see
+# migrations/011_latest_health_snapshot.sql). The /health/metrics writes
+# call refresh_snapshot(); readers use a primary-key or in_() lookup.
+
+SNAPSHOT_COLUMNS = (
+    "student_id, metric_id, created_at, weight, height, bmi, systolic, diastolic, "
+    "blood_sugar, heart_rate, notes, age_years, sex"
+)
+
+
+def refresh_snapshot(student_id: str) -> None:
+    """Re-derive a student's snapshot after a metric insert, update or delete."""
+    try:
+        supabase.rpc("refresh_latest_health_snapshot", {"p_student_id": str(student_id)}).execute()
+    except Exception as e:
+        print(f"health snapshot refresh failed for {student_id}: {e}")
+
+
+def snapshot_query(client, student_ids: Iterable[str], columns: str = SNAPSHOT_COLUMNS):
+    """Snapshots for `student_ids`; `client` is `supabase` or `async_db`."""
+    return client.table("latest_health_snapshot").select(columns).in_("student_id", [str(s) for s in student_ids])
+
+
+def get_snapshot(student_id: str, columns: str = SNAPSHOT_COLUMNS) -> Optional[Dict[str, Any]]:
+    """A student's latest metrics, or None if they never logged any."""
+    resp = snapshot_query(supabase, [student_id], columns).limit(1).execute()
+    rows: List[Dict[str, Any]] = getattr(resp, "data", None) or []
+    return rows[0] if rows else None
@@ -0,0 +1,157 @@
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..config import supabase
+
+# Per-user daily mood counters (table mood_daily_rollups, see
+# migrations/006_mood_daily_rollups.sql). Each mood_logs write applies a
+# +1/-1 delta to its day, so analytics read O(days) rows, and one in_()
+# query serves many students.
+
+# mood_logs column behind each counter prefix
+_FIELDS = {"mood": "mood", "energy": "energy_level", "sleep": "sleep_quality", "stress": "stress_level"}
+# Ordinal scales used for the energy/sleep/stress trend averages
+_SCALES = {
+    "energy": {"low": 1, "medium": 2, "high": 3},
+    "sleep": {"poor": 1, "fair": 2, "great": 3},
+    "stress": {"relaxed": 1, "moderate": 2, "high": 3},
+}
+
+
+def _day(log: Dict[str, Any]) -> str:
+    return str(log.get("log_date") or log.get("created_at"))[:10]
+
+
+def _keys(log: Dict[str, Any]) -> List[str]:
+    return [f"{prefix}:{log[col]}" for prefix, col in _FIELDS.items() if log.get(col)]
+
+
+def _apply(log: Dict[str, Any], sign: int) -> None:
+    supabase.rpc("apply_mood_rollup_delta", {
+        "p_user_id": str(log["user_id"]),
+        "p_day": _day(log),
+        "p_keys": _keys(log),
+        "p_sign": sign,
+    }).execute()
+
+
+def rebuild_rollups(user_id: str) -> None:
+    """Recompute a user's daily rollups from their mood logs."""
+    supabase.rpc("rebuild_mood_rollups", {"p_user_id": str(user_id)}).execute()
+
+
+def record_mood_log_change(
+    old: Optional[Dict[str, Any]] = None,
+    new: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Apply an insert (new only), delete (old only) or update (both) to the rollups.
+
+    A failed delta falls back to a full rebuild so the counters never drift.
+    """
+    if old and new and _day(old) == _day(new) and sorted(_keys(old)) == sorted(_keys(new)):
+        return  # e.g. only the notes changed
+    user_id = (new or old or {}).get("user_id")
+    if not user_id:
+        return
+    try:
+        if old:
+            _apply(old, -1)
+        if new:
+            _apply(new, 1)
+    except Exception as e:
+        print(f"mood rollup delta failed for {user_id}: {e}")
+        try:
+            rebuild_rollups(user_id)
+        except Exception as e2:
+            print(f"mood rollup rebuild failed for {user_id}: {e2}")
+
+
+def get_daily_rollups(user_ids: Iterable[str], start: date, end: date) -> Dict[str, List[Dict[str, Any]]]:
+    """Rollup rows per user for [start, end], oldest first."""
+    user_ids = [str(u) for u in user_ids]
+    if not user_ids:
+        return {}
+    resp = (
+        supabase.table("mood_daily_rollups")
+        .select("user_id, day, log_count, counts")
+        .in_("user_id", user_ids)
+        .gte("day", start.isoformat())
+        .lte("day", end.isoformat())
+        .order("day")
+        .execute()
+    )
+    by_user: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in getattr(resp, "data", None) or []:
+        by_user[str(row["user_id"])].append(row)
+    return by_user
+
+
+# ---- Analytics (pure; works on rollup rows) ----
+
+
+def _summarise(counts: Counter, log_count: int) -> Dict[str, Any]:
+    out: Dict[str, Any] = {
+        "logs": log_count,
+        "moods": {k.split(":", 1)[1]: v for k, v in counts.items() if k.startswith("mood:")},
+    }
+    for prefix, scale in _SCALES.items():
+        n = sum(counts.get(f"{prefix}:{v}", 0) for v in scale)
+        total = sum(counts.get(f"{prefix}:{v}", 0) * score for v, score in scale.items())
+        out[f"{prefix}_avg"] = round(total / n, 2) if n else None
+    return out
+
+
+def _trend(points: List[Optional[float]]) -> Dict[str, Any]:
+    values = [p for p in points if p is not None]
+    if not values:
+        return {"average": None, "change": None}
+    half = len(values) // 2
+    change = None
+    if half:
+        change = round(sum(values[half:]) / len(values[half:]) - sum(values[:half]) / half, 2)
+    return {"average": round(sum(values) / len(values), 2), "change": change}
+
+
+def mood_analytics(rows: List[Dict[str, Any]], start: date, end: date) -> Dict[str, Any]:
+    """Daily/weekly distributions, trends and streaks from one user's rollup rows."""
+    daily = []
+    weekly: Dict[str, Dict[str, Any]] = {}
+    logged_days = set()
+    for row in rows:
+        counts = Counter(row.get("counts") or {})
+        log_count = int(row.get("log_count") or 0)
+        if log_count <= 0:
+            continue
+        day = date.fromisoformat(str(row["day"])[:10])
+        logged_days.add(day)
+        daily.append({"date": day.isoformat(), **_summarise(counts, log_count)})
+        week_start = (day - timedelta(days=day.weekday())).isoformat()
+        week = weekly.setdefault(week_start, {"counts": Counter(), "logs": 0})
+        week["counts"].update(counts)
+        week["logs"] += log_count
+
+    # Streaks: consecutive days with at least one log
+    longest = run = 0
+    d = start
+    while d <= end:
+        run = run + 1 if d in logged_days else 0
+        longest = max(longest, run)
+        d += timedelta(days=1)
+    current = 0
+    d = end if end in logged_days else end - timedelta(days=1)  # today may not be logged yet
+    while d >= start and d in logged_days:
+        current += 1
+        d -= timedelta(days=1)
+
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "daily": daily,
+        "weekly": [
+            {"week_start": ws, **_summarise(w["counts"], w["logs"])}
+            for ws, w in sorted(weekly.items())
+        ],
+        "trends": {prefix: _trend([p[f"{prefix}_avg"] for p in daily]) for prefix in _SCALES},
+        "streaks": {"current": current, "longest": longest, "days_logged": len(logged_days)},
+    }
@@ -0,0 +1,188 @@
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from ..config import supabase
+from .cache import TTLCache
+
+NUTRITION_CACHE_TTL_SECONDS = float(os.getenv("NUTRITION_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+NUTRITION_CACHE_MAX_ENTRIES = int(os.getenv("NUTRITION_CACHE_MAX_ENTRIES", "10000"))
+# Set to false to keep the cache in-process only (e.g. before the table exists)
+NUTRITION_CACHE_PERSIST = os.getenv("NUTRITION_CACHE_PERSIST", "true").lower() not in ("0", "false", "no")
+
+_TABLE = "nutrition_estimates"
+# cache keys per `in.(...)` store lookup; 64-char keys keep the URL a few KB
+_LOAD_CHUNK = 100
+
+
+def normalise_description(description: str) -> str:
+    """Canonical form of a meal description: "  2 Chapati, and DAL! " -> "2 chapati and dal"."""
+    text = unicodedata.normalize("NFKC", description or "").lower()
+    text = re.sub(r"[^\w.%/]+", " ", text)
+    return " ".join(text.split())
+
+
+class NutritionCache:
+    """Content-addressed cache of nutrition estimates.
+
+    Keys are sha256(version | normalised description), where `version` names
+    the model and prompt; changing either makes old entries unreachable.
+    Lookups go in-process LRU -> `nutrition_estimates` table -> estimator,
+    and each tier's hits are counted for `stats()`.
+    """
+
+    def __init__(self, version: str, ttl: float = NUTRITION_CACHE_TTL_SECONDS,
+                 maxsize: int = NUTRITION_CACHE_MAX_ENTRIES, persist: bool = NUTRITION_CACHE_PERSIST):
+        self.version = version
+        self.ttl = ttl
+        self.persist = persist
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._counts = {"memory_hits": 0, "store_hits": 0, "misses": 0, "store_errors": 0}
+        self._lock = threading.Lock()
+
+    def key(self, description: str) -> str:
+        return hashlib.sha256(f"{self.version}|{normalise_description(description)}".encode("utf-8")).hexdigest()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    # ---- Persistent tier ----
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.persist:
+            return None
+        try:
+            resp = (
+                supabase.table(_TABLE)
+                .select("nutrition")
+                .eq("cache_key", key)
+                .gt("expires_at", datetime.now(timezone.utc).isoformat())
+                .limit(1)
+                .execute()
+            )
+        except Exception as e:
+            self._count("store_errors")
+            print(f"nutrition cache read failed: {e}")
+            return None
+        rows = getattr(resp, "data", None) or []
+        return rows[0].get("nutrition") if rows else None
+
+    def _load_many(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not self.persist or not keys:
+            return {}
+        found: Dict[str, Dict[str, Any]] = {}
+        now = datetime.now(timezone.utc).isoformat()
+        for i in range(0, len(keys), _LOAD_CHUNK):
+            try:
+                resp = (
+                    supabase.table(_TABLE)
+                    .select("cache_key, nutrition")
+                    .in_("cache_key", keys[i:i + _LOAD_CHUNK])
+                    .gt("expires_at", now)
+                    .execute()
+                )
+            except Exception as e:
+                self._count("store_errors")
+                print(f"nutrition cache read failed: {e}")
+                continue
+            for row in getattr(resp, "data", None) or []:
+                if row.get("nutrition") is not None:
+                    found[row["cache_key"]] = row["nutrition"]
+        return found
+
+    def _save(self, key: str, description: str, nutrition: Dict[str, Any]) -> None:
+        if not self.persist:
+            return
+        now = datetime.now(timezone.utc)
+        try:
+            supabase.table(_TABLE).upsert({
+                "cache_key": key,
+                "description": normalise_description(description),
+                "model_version": self.version,
+                "nutrition": nutrition,
+                "created_at": now.isoformat(),
+                "expires_at": (now + timedelta(seconds=self.ttl)).isoformat(),
+            }, on_conflict="cache_key").execute()
+        except Exception as e:
+            self._count("store_errors")
+            print(f"nutrition cache write failed: {e}")
+
+    # ---- Public API ----
+
+    def get(self, description: str) -> Optional[Dict[str, Any]]:
+        """Cached estimate for `description`, or None (counted as a miss)."""
+        key = self.key(description)
+        nutrition = self._memory.get(key)
+        if nutrition is not None:
+            self._count("memory_hits")
+            return dict(nutrition)
+        nutrition = self._load(key)
+        if nutrition is not None:
+            self._count("store_hits")
+            self._memory.set(key, nutrition)
+            return dict(nutrition)
+        self._count("misses")
+        return None
+
+    def get_many(self, descriptions: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Like get() for many descriptions: normalised description -> estimate or None.
+
+        Duplicates are looked up once, and all in-process misses share one
+        store query (per _LOAD_CHUNK keys).
+        """
+        keys: Dict[str, str] = {}
+        for description in descriptions:
+            norm = normalise_description(description)
+            if norm not in keys:
+                keys[norm] = self.key(description)
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        missing: Dict[str, str] = {}
+        for norm, key in keys.items():
+            nutrition = self._memory.get(key)
+            if nutrition is not None:
+                self._count("memory_hits")
+                results[norm] = dict(nutrition)
+            else:
+                missing[norm] = key
+        stored = self._load_many(list(missing.values()))
+        for norm, key in missing.items():
+            nutrition = stored.get(key)
+            if nutrition is not None:
+                self._count("store_hits")
+                self._memory.set(key, nutrition)
+                results[norm] = dict(nutrition)
+            else:
+                self._count("misses")
+                results[norm] = None
+        return results
+
+    def put(self, description: str, nutrition: Dict[str, Any]) -> None:
+        key = self.key(description)
+        self._memory.set(key, dict(nutrition))
+        self._save(key, description, nutrition)
+
+    def get_or_compute(self, description: str, compute: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """Cached estimate, else `compute(description)`; None results are not cached."""
+        nutrition = self.get(description)
+        if nutrition is None:
+            nutrition = compute(description)
+            if nutrition is not None:
+                self.put(description, nutrition)
+        return nutrition
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts["memory_hits"] + counts["store_hits"] + counts["misses"]
+        hits = counts["memory_hits"] + counts["store_hits"]
+        return {
+            **counts,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "memory_entries": len(self._memory),
+            "version": self.version,
+        }
@@ -0,0 +1,137 @@
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..config import supabase
+
+# Per-student daily nutrition totals (table nutrition_daily_rollups, see
+# migrations/007 and 008). Meal, diet-log and water writes apply a signed
+# delta to their day, so a 30-day view reads 30 rows however often the
+# student logs.
+
+MEAL_NUTRIENTS = ("calories", "proteins", "carbs", "fat", "sodium", "sugar")
+ROLLUP_COLUMNS = (
+    "day, " + ", ".join(MEAL_NUTRIENTS)
+    + ", meal_count, diet_sodium, diet_sugar, diet_count, water_ml, water_count"
+)
+
+
+def _student(row: Dict[str, Any]) -> Optional[str]:
+    # water_intake keys the student as user_id
+    return row.get("student_id") or row.get("user_id")
+
+
+def _day(row: Dict[str, Any]) -> str:
+    return str(row.get("intake_date") or row.get("time"))[:10]
+
+
+def _meal_delta(meal: Dict[str, Any], sign: int) -> Dict[str, Any]:
+    delta: Dict[str, Any] = {k: float(meal.get(k) or 0) * sign for k in MEAL_NUTRIENTS}
+    delta["meal_count"] = sign
+    return delta
+
+
+def _diet_delta(entry: Dict[str, Any], sign: int) -> Dict[str, Any]:
+    return {
+        "diet_sodium": float(entry.get("sodium") or 0) * sign,
+        "diet_sugar": float(entry.get("sugar") or 0) * sign,
+        "diet_count": sign,
+    }
+
+
+def _water_delta(entry: Dict[str, Any], sign: int) -> Dict[str, Any]:
+    return {"water_ml": float(entry.get("amount_ml") or 0) * sign, "water_count": sign}
+
+
+def rebuild_rollups(student_id: str) -> None:
+    """Recompute a student's daily rollups from their meals, diet logs and water."""
+    supabase.rpc("rebuild_nutrition_rollups", {"p_student_id": str(student_id)}).execute()
+
+
+Delta = Callable[[Dict[str, Any], int], Dict[str, Any]]
+
+
+def _record(changes: Iterable[Tuple[Optional[Dict[str, Any]], int]], delta: Delta) -> None:
+    """Sum the signed deltas per (student, day) and apply one RPC per day."""
+    per_day: Dict[Tuple[str, str], Dict[str, float]] = {}
+    for row, sign in changes:
+        if not row or not _student(row):
+            continue
+        acc = per_day.setdefault((str(_student(row)), _day(row)), {})
+        for column, amount in delta(row, sign).items():
+            acc[column] = acc.get(column, 0) + amount
+    failed = set()
+    for (student_id, day), totals in per_day.items():
+        if student_id in failed or not any(totals.values()):
+            continue  # e.g. an update that moved nothing
+        try:
+            supabase.rpc("apply_nutrition_rollup_delta", {
+                "p_student_id": student_id,
+                "p_day": day,
+                "p_delta": totals,
+            }).execute()
+        except Exception as e:
+            print(f"nutrition rollup delta failed for {student_id}: {e}")
+            failed.add(student_id)
+    for student_id in failed:
+        try:
+            rebuild_rollups(student_id)
+        except Exception as e:
+            print(f"nutrition rollup rebuild failed for {student_id}: {e}")
+
+
+def record_meal_change(
+    old: Optional[Dict[str, Any]] = None,
+    new: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Apply a meals insert (new only), delete (old only) or update (both).
+
+    Rows need student_id, time and the MEAL_NUTRIENTS. A failed delta falls
+    back to a full rebuild so the totals never drift.
+    """
+    _record(((old, -1), (new, 1)), _meal_delta)
+
+
+def record_meals_inserted(rows: Iterable[Dict[str, Any]]) -> None:
+    """Bulk form of record_meal_change(new=row): one delta per day touched."""
+    _record(((row, 1) for row in rows), _meal_delta)
+
+
+def record_diet_change(
+    old: Optional[Dict[str, Any]] = None,
+    new: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Same as record_meal_change, for student_diet rows (student_id, time, sodium, sugar)."""
+    _record(((old, -1), (new, 1)), _diet_delta)
+
+
+def record_water_inserted(rows: Iterable[Dict[str, Any]]) -> None:
+    """water_intake rows (user_id, intake_date, amount_ml) just inserted."""
+    _record(((row, 1) for row in rows), _water_delta)
+
+
+def rollups_query(client, student_id: str, start: date, end: date):
+    """Rollup rows for [start, end], oldest first; `client` is `supabase` or `async_db`."""
+    return (
+        client.table("nutrition_daily_rollups")
+        .select(ROLLUP_COLUMNS)
+        .eq("student_id", str(student_id))
+        .gte("day", start.isoformat())
+        .lte("day", end.isoformat())
+        .order("day")
+    )
+
+
+def get_daily_rollups(student_id: str, start: date, end: date) -> List[Dict[str, Any]]:
+    """A student's rollup rows for [start, end], oldest first."""
+    resp = rollups_query(supabase, student_id, start, end).execute()
+    return getattr(resp, "data", None) or []
+
+
+def sum_rollups(rows: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+    """Totals of every numeric rollup column over `rows`."""
+    totals: Dict[str, float] = {}
+    for row in rows:
+        for column, value in row.items():
+            if column != "day":
+                totals[column] = totals.get(column, 0) + float(value or 0)
+    return totals
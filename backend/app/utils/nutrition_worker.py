@@ -0,0 +1,212 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import supabase
+from .nutrition_cache import NutritionCache, normalise_description
+
+NUTRITION_WORKERS = int(os.getenv("NUTRITION_WORKERS", "2"))
+NUTRITION_BATCH_SIZE = int(os.getenv("NUTRITION_BATCH_SIZE", "8"))
+# How long the dispatcher waits for more meals before sending a partial batch
+NUTRITION_BATCH_WAIT_SECONDS = float(os.getenv("NUTRITION_BATCH_WAIT_SECONDS", "0.25"))
+
+NUTRIENT_FIELDS = ("calories", "proteins", "carbs", "fat", "sodium", "sugar")
+
+# estimate_batch(descriptions) -> one result per description (None = failed)
+BatchEstimator = Callable[[List[str]], List[Optional[Dict[str, Any]]]]
+# on_ready(meal_row) is called with each meal row patched to 'ready'
+ReadyHook = Callable[[Dict[str, Any]], None]
+
+
+class NutritionEnrichmentWorker:
+    """Fills in nutrition for meals inserted with nutrition_status='pending'.
+
+    `submit()` queues a meal; a dispatcher thread groups queued meals into
+    batches of up to `batch_size` and hands them to a small thread pool.
+    Each batch answers what it can from the cache, estimates the remaining
+    distinct descriptions in one model call, and patches the meal rows to
+    'ready' (or 'failed'). Queued work lives in memory, so `recover_pending()`
+    re-queues rows left pending by a restart.
+    """
+
+    def __init__(self, cache: NutritionCache, estimate_batch: BatchEstimator,
+                 workers: int = NUTRITION_WORKERS, batch_size: int = NUTRITION_BATCH_SIZE,
+                 batch_wait: float = NUTRITION_BATCH_WAIT_SECONDS,
+                 on_ready: Optional[ReadyHook] = None):
+        self.cache = cache
+        self.estimate_batch = estimate_batch
+        self.on_ready = on_ready
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self._queue: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._dispatcher: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._counts = {"submitted": 0, "ready": 0, "failed": 0, "skipped": 0, "batches": 0, "model_calls": 0}
+
+    # ---- Lifecycle ----
+
+    def start(self) -> None:
+        with self._lock:
+            if self._dispatcher and self._dispatcher.is_alive():
+                return
+            self._stopping.clear()
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="nutrition")
+            self._dispatcher = threading.Thread(target=self._dispatch, name="nutrition-dispatch", daemon=True)
+            self._dispatcher.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop accepting batches; in-flight batches finish, queued meals stay pending."""
+        self._stopping.set()
+        if self._dispatcher:
+            self._dispatcher.join(timeout)
+        if self._pool:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+        self._dispatcher = None
+        self._pool = None
+
+    def submit(self, meal_id: str, description: str) -> None:
+        self.start()
+        self._count("submitted")
+        self._queue.put((str(meal_id), description))
+
+    def recover_pending(self, limit: int = 500) -> int:
+        """Queue meals still marked pending (e.g. after a restart)."""
+        try:
+            resp = (
+                supabase.table("meals")
+                .select("id, description")
+                .eq("nutrition_status", "pending")
+                .order("time")
+                .limit(limit)
+                .execute()
+            )
+        except Exception as e:
+            print(f"nutrition worker: could not load pending meals: {e}")
+            return 0
+        rows = getattr(resp, "data", None) or []
+        for row in rows:
+            self.submit(row["id"], row.get("description") or "")
+        return len(rows)
+
+    def estimate_many(self, descriptions: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Nutrition per normalised description (None = estimate failed), inline.
+
+        Used by bulk imports: duplicates are estimated once, cache hits cost
+        nothing, and the rest go out in `batch_size` chunks on up to
+        `workers` concurrent model calls.
+        """
+        results, missing = self._from_cache(descriptions)
+        chunks = [list(missing.items())[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        if len(chunks) == 1:
+            results.update(self._estimate_chunk(chunks[0]))
+        elif chunks:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(chunks)), thread_name_prefix="nutrition-bulk") as pool:
+                for estimated in pool.map(self._estimate_chunk, chunks):
+                    results.update(estimated)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        return {**counts, "queued": self._queue.qsize()}
+
+    # ---- Internals ----
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += n
+
+    def _dispatch(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            pool = self._pool
+            if pool is None:
+                break
+            pool.submit(self._process, batch)
+
+    def _from_cache(self, descriptions: List[str]) -> Tuple[Dict[str, Optional[Dict[str, Any]]], Dict[str, str]]:
+        """Split distinct descriptions into cache hits and misses (normalised -> original)."""
+        cached = self.cache.get_many(descriptions)
+        results = {norm: nutrition for norm, nutrition in cached.items() if nutrition is not None}
+        missing: Dict[str, str] = {}
+        for description in descriptions:
+            norm = normalise_description(description)
+            if norm not in results and norm not in missing:
+                missing[norm] = description
+        return results, missing
+
+    def _estimate_chunk(self, chunk: List[Tuple[str, str]]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """One model call for (normalised, description) pairs; successes are cached."""
+        self._count("model_calls")
+        descriptions = [description for _, description in chunk]
+        try:
+            estimates = self.estimate_batch(descriptions)
+        except Exception as e:
+            print(f"nutrition worker: batch estimate failed: {e}")
+            estimates = [None] * len(descriptions)
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        for (norm, description), nutrition in zip(chunk, estimates):
+            results[norm] = nutrition
+            if nutrition is not None:
+                self.cache.put(description, nutrition)
+        return results
+
+    def _process(self, batch: List[Tuple[str, str]]) -> None:
+        self._count("batches")
+        results, missing = self._from_cache([description for _, description in batch])
+        if missing:
+            results.update(self._estimate_chunk(list(missing.items())))
+
+        for meal_id, description in batch:
+            self._patch(meal_id, results.get(normalise_description(description)))
+
+    def _patch(self, meal_id: str, nutrition: Optional[Dict[str, Any]]) -> None:
+        if nutrition is None:
+            payload: Dict[str, Any] = {"nutrition_status": "failed"}
+        else:
+            payload = {k: float(nutrition.get(k) or 0.0) for k in NUTRIENT_FIELDS}
+            payload["nutrition_status"] = "ready"
+        try:
+            # Only patch a meal that is still pending: another worker process
+            # (each one runs recover_pending) or a user edit may have got there first.
+            resp = (
+                supabase.table("meals")
+                .update(payload)
+                .eq("id", meal_id)
+                .eq("nutrition_status", "pending")
+                .execute()
+            )
+        except Exception as e:
+            print(f"nutrition worker: could not update meal {meal_id}: {e}")
+            payload["nutrition_status"] = "failed"
+        else:
+            rows = getattr(resp, "data", None) or []
+            if not rows:
+                self._count("skipped")
+                return
+            if self.on_ready and payload["nutrition_status"] == "ready":
+                for row in rows:
+                    try:
+                        self.on_ready(row)
+                    except Exception as e:
+                        print(f"nutrition worker: on_ready hook failed for meal {meal_id}: {e}")
+        self._count("ready" if payload["nutrition_status"] == "ready" else "failed")
@@ -0,0 +1,90 @@
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+
+# Keyset ("cursor") pagination over (timestamp, id).
+#
+# Pages are selected with `key < cursor` / `key > cursor` instead of offsets,
+# so they stay stable while rows are added and cost the same at any depth.
+# Cursors are opaque to clients; the next/previous ones are returned in the
+# X-Cursor-Before / X-Cursor-After response headers so list bodies keep
+# their shape.
+
+CURSOR_HEADERS = ["X-Cursor-Before", "X-Cursor-After"]
+
+
+def encode_cursor(ts: Any, row_id: Any) -> str:
+    raw = json.dumps([str(ts), str(row_id)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return str(ts), str(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _quote(value: str) -> str:
+    # double-quote for PostgREST's or=(...) grammar (timestamps contain ':' and '+')
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _keyset_filter(ts_col: str, id_col: str, op: str, cursor: str) -> str:
+    ts, row_id = decode_cursor(cursor)
+    return f"{ts_col}.{op}.{_quote(ts)},and({ts_col}.eq.{_quote(ts)},{id_col}.{op}.{_quote(row_id)})"
+
+
+def keyset_page(
+    query,
+    response: Response,
+    ts_col: str,
+    id_col: str,
+    limit: int,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    newest_first: bool = True,
+) -> List[Dict[str, Any]]:
+    """Execute `query` (filters applied, no order/limit) for one page.
+
+    Without cursors returns the newest `limit` rows; `before` pages towards
+    older rows, `after` towards newer ones (the `limit` rows just after it).
+    Rows come back newest first, or oldest first with newest_first=False
+    (chat transcripts). Sets the cursor headers on `response`.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    ascending = bool(after)
+    if before:
+        query = query.or_(_keyset_filter(ts_col, id_col, "lt", before))
+    elif after:
+        query = query.or_(_keyset_filter(ts_col, id_col, "gt", after))
+    resp = (
+        query.order(ts_col, desc=not ascending)
+        .order(id_col, desc=not ascending)
+        .limit(limit + 1)  # one extra row tells us whether there is more
+        .execute()
+    )
+    rows = getattr(resp, "data", None) or []
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if ascending:
+        rows.reverse()  # now newest first, like the other branches
+
+    if rows:
+        newest, oldest = rows[0], rows[-1]
+        # older rows exist if this page was cut short, or if we paged forward from them
+        if has_more or after:
+            response.headers["X-Cursor-Before"] = encode_cursor(oldest.get(ts_col), oldest.get(id_col))
+        # always usable to poll for rows newer than this page
+        response.headers["X-Cursor-After"] = encode_cursor(newest.get(ts_col), newest.get(id_col))
+    elif after:
+        response.headers["X-Cursor-After"] = after
+
+    if not newest_first:
+        rows.reverse()
+    return rows
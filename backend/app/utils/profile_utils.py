@@ -4,21 +4,6 @@ from fastapi import HTTPException
 
 from ..config import supabase
 
-# ---- Auth helpers ----
-
-
-def get_user_id_from_token(token: str) -> str:
-    """Return the authenticated user's id (or 401)."""
-    try:
-        res = supabase.auth.get_user(token)
-    except Exception:
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
-    user = getattr(res, "user", None)
-    if not user or not getattr(user, "id", None):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    return user.id
-
 
 def _get_row(table: str, key: str, value: str) -> Optional[Dict[str, Any]]:
     r = supabase.table(table).select("*").eq(key, value).single().execute()
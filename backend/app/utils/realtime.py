@@ -0,0 +1,215 @@
+import asyncio
+import importlib
+import os
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+# Realtime events for the parent and teacher dashboards.
+#
+# Writers call the publish_* helpers after a successful write; the
+# /realtime endpoints stream the events whose topic the caller may see:
+#   student:<student_id>     health alerts and task changes of one student
+#   family:<family_id>       join requests to a family
+#   classroom:<target_id>    join requests to a classroom (target_id is a
+#                            classroom_id, or the teacher id for older codes)
+#
+# Delivery is best-effort: clients load their state over REST on connect and
+# treat events as "this changed" hints, so a dropped event only delays a view.
+
+# "memory" (single process) or "package.module:BrokerClass"
+REALTIME_BROKER = os.getenv("REALTIME_BROKER", "memory")
+# Events buffered per connection; a slow client loses the oldest ones
+REALTIME_QUEUE_SIZE = int(os.getenv("REALTIME_QUEUE_SIZE", "100"))
+# Idle connections get a keep-alive this often so proxies don't close them
+REALTIME_HEARTBEAT_SECONDS = float(os.getenv("REALTIME_HEARTBEAT_SECONDS", "15"))
+
+Deliver = Callable[[str, Dict[str, Any]], None]
+
+
+# ---- Brokers ----
+
+
+class Broker(ABC):
+    """Carries published events to the hub of every serving process.
+
+    `publish` is called from request threads as well as the event loop and
+    must neither raise nor block for long. `start` receives the local hub's
+    `deliver(topic, event)`, which must be called on the event loop.
+    Both are abstract, so a REALTIME_BROKER class missing either fails when
+    it is loaded at startup instead of on the first write.
+    """
+
+    @abstractmethod
+    async def start(self, deliver: Deliver) -> None:
+        ...
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    def publish(self, topic: str, event: Dict[str, Any]) -> None:
+        ...
+
+
+class InMemoryBroker(Broker):
+    """Fan-out inside this process.
+
+    With several workers each one only sees its own writes; point
+    REALTIME_BROKER at a shared broker (e.g. Redis pub/sub) for that setup.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._deliver = deliver
+
+    async def stop(self) -> None:
+        self._loop = None
+        self._deliver = None
+
+    def publish(self, topic: str, event: Dict[str, Any]) -> None:
+        loop, deliver = self._loop, self._deliver
+        if loop is None or deliver is None:
+            return  # not serving (scripts, migrations)
+        try:
+            loop.call_soon_threadsafe(deliver, topic, event)
+        except RuntimeError:
+            pass  # loop closed during shutdown
+
+
+def _load_broker(spec: str) -> Broker:
+    if spec == "memory":
+        return InMemoryBroker()
+    module_name, _, class_name = spec.partition(":")
+    broker = getattr(importlib.import_module(module_name), class_name)()
+    if not isinstance(broker, Broker):
+        raise TypeError(f"REALTIME_BROKER {spec!r} is not a Broker")
+    return broker
+
+
+# ---- Local fan-out ----
+
+
+class Subscription:
+    """One connected client: a bounded queue fed with its topics' events."""
+
+    def __init__(self, topics: Iterable[str]):
+        self.topics = frozenset(topics)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=REALTIME_QUEUE_SIZE)
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(event)
+
+    async def next(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """The next event, or None when nothing arrived within `timeout`."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventHub:
+    """Topic -> subscriptions of this process. Only used on the event loop."""
+
+    def __init__(self):
+        self._by_topic: Dict[str, Set[Subscription]] = defaultdict(set)
+
+    def deliver(self, topic: str, event: Dict[str, Any]) -> None:
+        for sub in list(self._by_topic.get(topic, ())):
+            sub.offer(event)
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        sub = Subscription(topics)
+        for topic in sub.topics:
+            self._by_topic[topic].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        for topic in sub.topics:
+            subs = self._by_topic.get(topic)
+            if subs is None:
+                continue
+            subs.discard(sub)
+            if not subs:
+                del self._by_topic[topic]
+
+
+hub = EventHub()
+_broker: Broker = _load_broker(REALTIME_BROKER)
+
+
+def set_broker(broker: Broker) -> None:
+    """Replace the broker; call before start()."""
+    global _broker
+    _broker = broker
+
+
+async def start() -> None:
+    await _broker.start(hub.deliver)
+
+
+async def stop() -> None:
+    await _broker.stop()
+
+
+def publish(topic: str, event: Dict[str, Any]) -> None:
+    """Send `event` to the subscribers of `topic`; failures are logged, never raised."""
+    event.setdefault("at", datetime.now(timezone.utc).isoformat())
+    try:
+        _broker.publish(topic, event)
+    except Exception as e:
+        print(f"realtime publish to {topic} failed: {e}")
+
+
+# ---- Events ----
+
+
+def student_topic(student_id: str) -> str:
+    return f"student:{student_id}"
+
+
+def publish_alerts(alerts: Iterable[Dict[str, Any]]) -> None:
+    """Stored health_alerts rows (see health_alerts.record_alerts)."""
+    for alert in alerts:
+        if alert.get("student_id"):
+            publish(student_topic(alert["student_id"]), {
+                "type": "health_alert",
+                "student_id": str(alert["student_id"]),
+                "alert": alert,
+            })
+
+
+def publish_task(task: Dict[str, Any], action: str) -> None:
+    """A tasks row was created, updated or deleted (`action`)."""
+    if not task.get("assigned_to"):
+        return
+    publish(student_topic(task["assigned_to"]), {
+        "type": "task",
+        "action": action,
+        "student_id": str(task["assigned_to"]),
+        "task_id": task.get("task_id"),
+        "title": task.get("title"),
+        "status": task.get("status"),
+    })
+
+
+def publish_join_request(request: Dict[str, Any], status: Optional[str] = None) -> None:
+    """A join_requests row was created or answered (`status` overrides the row's)."""
+    target_type, target_id = request.get("target_type"), request.get("target_id")
+    if target_type not in ("family", "classroom") or not target_id:
+        return
+    publish(f"{target_type}:{target_id}", {
+        "type": "join_request",
+        "request_id": request.get("request_id"),
+        "status": status or request.get("status"),
+        "target_type": target_type,
+        "target_id": str(target_id),
+        "requester_id": request.get("requester_id"),
+    })
@@ -0,0 +1,21 @@
+import json
+from typing import Any, Optional
+
+# Headers for text/event-stream responses: no caching, and no proxy buffering
+# (nginx would otherwise hold events back until its buffer fills).
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(data: Any, event: Optional[str] = None, event_id: Optional[str] = None) -> str:
+    """Format one Server-Sent Event; `data` is sent as JSON."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
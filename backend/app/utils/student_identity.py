@@ -0,0 +1,73 @@
+import os
+from typing import Any, Dict, NamedTuple, Optional
+
+from fastapi import Depends, HTTPException
+
+from ..config import supabase
+from .auth import oauth2, verify_token
+from .cache import TTLCache
+
+STUDENT_IDENTITY_TTL_SECONDS = float(os.getenv("STUDENT_IDENTITY_TTL_SECONDS", "300"))
+
+# user_id -> StudentIdentity. The students row rarely changes; profile
+# writes call invalidate_student(), other workers converge within the TTL.
+# Unknown students are not cached so a freshly created profile works at once.
+_cache = TTLCache(maxsize=4096, ttl=STUDENT_IDENTITY_TTL_SECONDS)
+
+
+class StudentIdentity(NamedTuple):
+    user_id: str
+    student_id: str
+    grade_level: Optional[str]
+
+
+def invalidate_student(user_id: str) -> None:
+    """Forget the cached identity of one user (e.g. after a profile update)."""
+    _cache.pop(str(user_id))
+
+
+def _lookup(claims: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # students.student_id is the auth user id; older rows are matched by email
+    resp = (
+        supabase.table("students")
+        .select("student_id, grade_level")
+        .eq("student_id", claims["sub"])
+        .limit(1)
+        .execute()
+    )
+    rows = getattr(resp, "data", None) or []
+    if not rows and claims.get("email"):
+        resp = (
+            supabase.table("students")
+            .select("student_id, grade_level")
+            .eq("email", claims["email"])
+            .limit(1)
+            .execute()
+        )
+        rows = getattr(resp, "data", None) or []
+    return rows[0] if rows else None
+
+
+def resolve_student(claims: Dict[str, Any]) -> StudentIdentity:
+    """The student behind verified JWT claims (or 404)."""
+    user_id = str(claims.get("sub") or "")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    cached = _cache.get(user_id)
+    if cached is not None:
+        return cached
+    row = _lookup(claims)
+    if not row:
+        raise HTTPException(status_code=404, detail="Student not found")
+    identity = StudentIdentity(user_id, str(row["student_id"]), row.get("grade_level"))
+    _cache.set(user_id, identity)
+    return identity
+
+
+# ---- FastAPI dependency ----
+# FastAPI caches dependency results per request, so handlers and their
+# sub-dependencies share one resolution.
+
+
+def get_current_student(token: str = Depends(oauth2)) -> StudentIdentity:
+    return resolve_student(verify_token(token))
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Calendar bucketing for chart series. Each bucket keeps min/max/avg rather
+# than a single representative point (as LTTB would), so a one-off blood
+# sugar spike still shows up in a monthly view.
+
+BUCKETS = ("day", "week", "month")
+# Window length in days for each supported ?range=
+RANGE_DAYS = {"7d": 7, "30d": 30, "90d": 90, "180d": 180, "1y": 365}
+# Bucket used when the caller does not pick one (keeps series to <= ~60 points)
+DEFAULT_BUCKET = {"7d": "day", "30d": "day", "90d": "week", "180d": "week", "1y": "month"}
+
+
+def range_bounds(range_key: str, today: Optional[date] = None) -> Tuple[date, date]:
+    """Inclusive [start, end] dates for a range key, ending today."""
+    end = today or date.today()
+    return end - timedelta(days=RANGE_DAYS[range_key] - 1), end
+
+
+def bucket_start(value: Any, bucket: str) -> date:
+    d = value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+    if isinstance(d, datetime):
+        d = d.date()
+    if bucket == "week":
+        return d - timedelta(days=d.weekday())
+    if bucket == "month":
+        return d.replace(day=1)
+    return d
+
+
+def downsample(rows: Iterable[Dict[str, Any]], field: str, bucket: str, time_key: str = "created_at") -> List[Dict[str, Any]]:
+    """Per-bucket avg (as `value`), min, max and count of `field`, oldest bucket first.
+
+    Rows must already be ordered by `time_key`; rows without a value are skipped.
+    """
+    buckets: "OrderedDict[date, List[float]]" = OrderedDict()
+    for row in rows:
+        v = row.get(field)
+        if v is None or not row.get(time_key):
+            continue
+        buckets.setdefault(bucket_start(row[time_key], bucket), []).append(float(v))
+    return [
+        {
+            "time": datetime.combine(start, datetime.min.time()),
+            "value": round(sum(values) / len(values), 2),
+            "min": min(values),
+            "max": max(values),
+            "count": len(values),
+        }
+        for start, values in buckets.items()
+    ]
+
+
+def sum_by_bucket(rows: Iterable[Dict[str, Any]], fields: Iterable[str], bucket: str, time_key: str = "day") -> List[Dict[str, Any]]:
+    """Per-bucket totals of `fields` (e.g. daily rollup rows summed per week)."""
+    fields = list(fields)
+    totals: "OrderedDict[date, Dict[str, float]]" = OrderedDict()
+    for row in rows:
+        acc = totals.setdefault(bucket_start(row[time_key], bucket), {f: 0.0 for f in fields})
+        for f in fields:
+            acc[f] += float(row.get(f) or 0)
+    return [
+        {"time": datetime.combine(start, datetime.min.time()), **{f: round(v, 2) for f, v in acc.items()}}
+        for start, acc in sorted(totals.items())
+    ]
@@ -1,7 +1,10 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.responses import Response
 import yaml
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
 from app.routers.auth import router as auth_router
 from app.routers.users import router as users_router
@@ -18,7 +21,7 @@ from app.routers.student_dashboard import router as student_dashboard_router
 from app.routers.student_tasks import router as student_tasks_router
 from app.routers.student_finance import router as student_finance_router
 from app.routers.student_emotions import router as student_emotions_router
-from app.routers.student_diet import router as student_diet_router
+from app.routers.student_diet import router as student_diet_router, nutrition_cache, nutrition_worker
 from app.routers.student_health import router as student_health_router
 from app.routers.student_nutrition import router as student_nutrition_router
 from app.routers.parent_dashboard import router as parent_dashboard_router
@@ -33,10 +36,31 @@ from app.routers.connections import router as connections_router
 from app.routers.connection_activity import router as requests_router
 from app.routers.student_medical import router as student_medical_router
 from app.routers.parent_family_codes import router as parent_family_codes
+from app.routers.realtime import router as realtime_router
+from app.utils.db import configure_threadpool, close_async_db
+from app.utils import realtime
+from app.utils.pagination import CURSOR_HEADERS
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_threadpool()
+    # re-queue meals whose nutrition was still pending when we last stopped
+    await run_in_threadpool(nutrition_worker.recover_pending)
+    # dashboard push events (alerts, tasks, join requests)
+    await realtime.start()
+    yield
+    await realtime.stop()
+    # joins the worker threads (in-flight model calls); keep the loop free
+    await run_in_threadpool(nutrition_worker.stop)
+    # release pooled keep-alive connections to Supabase
+    await close_async_db()
+
 
 app = FastAPI(
     title="GrowthGeine API",
     version="0.1.0",
+    lifespan=lifespan,
 )
 # ————————————————
 # Expose OpenAPI as YAML
@@ -77,6 +101,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=CURSOR_HEADERS,
 )
 
 # Mount routers
@@ -110,12 +135,22 @@ app.include_router(connections_router)
 app.include_router(requests_router)
 app.include_router(student_medical_router)
 app.include_router(parent_family_codes)
+app.include_router(realtime_router)
 
 @app.get("/")
 def read_root():
     return "healthy"
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """In-process cache counters (per worker)."""
+    return {
+        "nutrition_cache": nutrition_cache.stats(),
+        "nutrition_worker": nutrition_worker.stats(),
+    }
+
+
 # Make the app runnable with uvicorn
 if __name__ == "__main__":
     import uvicorn
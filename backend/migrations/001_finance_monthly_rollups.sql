@@ -0,0 +1,55 @@
+-- Per-student monthly finance rollups for /student/finance/dashboard.
+-- Maintained incrementally by the student_finance transaction endpoints
+-- (see app/utils/finance_rollups.py); lifetime totals are the sum of a
+-- student's month rows.
+
+create table if not exists public.finance_monthly_rollups (
+    student_id  uuid        not null,
+    month       date        not null,  -- first day of the month
+    income      numeric     not null default 0,
+    expense     numeric     not null default 0,
+    tx_count    integer     not null default 0,
+    updated_at  timestamptz not null default now(),
+    primary key (student_id, month)
+);
+
+-- Atomically add a (possibly negative) delta to one month bucket.
+create or replace function public.apply_finance_rollup_delta(
+    p_student_id uuid,
+    p_month      date,
+    p_income     numeric,
+    p_expense    numeric,
+    p_count      integer
+) returns void
+language sql
+as $$
+    insert into public.finance_monthly_rollups as r (student_id, month, income, expense, tx_count)
+    values (p_student_id, date_trunc('month', p_month)::date, p_income, p_expense, p_count)
+    on conflict (student_id, month) do update
+        set income     = r.income + excluded.income,
+            expense    = r.expense + excluded.expense,
+            tx_count   = r.tx_count + excluded.tx_count,
+            updated_at = now();
+$$;
+
+-- Recompute one student's buckets from transactions (repair / backfill).
+create or replace function public.rebuild_finance_rollups(p_student_id uuid)
+returns void
+language sql
+as $$
+    delete from public.finance_monthly_rollups where student_id = p_student_id;
+    insert into public.finance_monthly_rollups (student_id, month, income, expense, tx_count)
+    select
+        student_id,
+        date_trunc('month', transaction_date)::date,
+        coalesce(sum(amount) filter (where type = 'Income'), 0),
+        coalesce(sum(amount) filter (where type = 'Expense'), 0),
+        count(*)
+    from public.transactions
+    where student_id = p_student_id
+    group by 1, 2;
+$$;
+
+-- Backfill existing ledgers
+select public.rebuild_finance_rollups(s.student_id)
+from (select distinct student_id from public.transactions) s;
@@ -0,0 +1,15 @@
+-- Persistent tier of the meal nutrition cache (app/utils/nutrition_cache.py).
+-- Keyed by sha256(model version | normalised description); rows past
+-- expires_at are ignored and can be purged at any time.
+
+create table if not exists public.nutrition_estimates (
+    cache_key      text        primary key,
+    description    text        not null,  -- normalised
+    model_version  text        not null,
+    nutrition      jsonb       not null,
+    created_at     timestamptz not null default now(),
+    expires_at     timestamptz not null
+);
+
+create index if not exists nutrition_estimates_expires_at_idx
+    on public.nutrition_estimates (expires_at);
@@ -0,0 +1,11 @@
+-- Deferred meal nutrition (POST /health/meals?defer_nutrition=true).
+-- Rows are inserted as 'pending' and patched to 'ready' or 'failed' by the
+-- background worker in app/utils/nutrition_worker.py.
+
+alter table public.meals
+    add column if not exists nutrition_status text not null default 'ready'
+        check (nutrition_status in ('pending', 'ready', 'failed'));
+
+create index if not exists meals_nutrition_pending_idx
+    on public.meals (time)
+    where nutrition_status = 'pending';
@@ -0,0 +1,10 @@
+-- Bounded chatbot context (app/utils/chat_context.py): the model sees the
+-- last few messages verbatim plus a rolling summary of everything up to
+-- summary_upto (timestamp of the newest message folded into the summary).
+
+alter table public.chat_sessions
+    add column if not exists context_summary text,
+    add column if not exists summary_upto timestamptz;
+
+create index if not exists chat_messages_session_timestamp_idx
+    on public.chat_messages (session_id, timestamp desc);
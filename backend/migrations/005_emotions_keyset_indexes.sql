@@ -0,0 +1,17 @@
+-- Indexes backing the (timestamp, id) keyset pagination of the
+-- /student/emotions list endpoints (app/utils/pagination.py).
+
+create index if not exists emotional_entries_user_created_idx
+    on public.emotional_entries (user_id, created_at desc, entry_id desc);
+
+create index if not exists mood_logs_user_created_idx
+    on public.mood_logs (user_id, created_at desc, log_id desc);
+
+create index if not exists chat_sessions_user_started_idx
+    on public.chat_sessions (user_id, started_at desc, session_id desc);
+
+create index if not exists chat_messages_session_timestamp_id_idx
+    on public.chat_messages (session_id, timestamp desc, message_id desc);
+
+create index if not exists emergency_contacts_user_created_idx
+    on public.emergency_contacts (user_id, created_at desc, contact_id desc);
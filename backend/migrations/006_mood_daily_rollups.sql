@@ -0,0 +1,83 @@
+-- Per-user daily mood rollups for GET /student/emotions/mood-logs/analytics.
+-- Maintained incrementally by the mood_logs endpoints (app/utils/mood_rollups.py).
+-- counts holds one counter per "<field>:<value>", e.g. {"mood:happy": 2, "energy:low": 1}.
+
+create table if not exists public.mood_daily_rollups (
+    user_id     uuid        not null,
+    day         date        not null,
+    log_count   integer     not null default 0,
+    counts      jsonb       not null default '{}'::jsonb,
+    updated_at  timestamptz not null default now(),
+    primary key (user_id, day)
+);
+
+-- Add p_sign (+1 / -1) to the day's log_count and to each counter in p_keys.
+create or replace function public.apply_mood_rollup_delta(
+    p_user_id uuid,
+    p_day     date,
+    p_keys    text[],
+    p_sign    integer
+) returns void
+language plpgsql
+as $$
+begin
+    insert into public.mood_daily_rollups (user_id, day)
+    values (p_user_id, p_day)
+    on conflict (user_id, day) do nothing;
+
+    update public.mood_daily_rollups r
+       set log_count  = r.log_count + p_sign,
+           counts     = (
+               select coalesce(jsonb_object_agg(key, total), '{}'::jsonb)
+               from (
+                   select key, sum(value)::int as total
+                   from (
+                       select key, value::int as value from jsonb_each_text(r.counts)
+                       union all
+                       select unnest(p_keys), p_sign
+                   ) c
+                   group by key
+               ) t
+               where total <> 0
+           ),
+           updated_at = now()
+     where r.user_id = p_user_id and r.day = p_day;
+end;
+$$;
+
+-- Recompute one user's rollups from mood_logs (repair / backfill).
+create or replace function public.rebuild_mood_rollups(p_user_id uuid)
+returns void
+language sql
+as $$
+    delete from public.mood_daily_rollups where user_id = p_user_id;
+    with keyed as (
+        select l.user_id, l.log_id, (coalesce(l.log_date, l.created_at))::date as day, k.key
+        from public.mood_logs l
+        cross join lateral (values
+            ('mood:' || l.mood),
+            ('energy:' || l.energy_level),
+            ('sleep:' || l.sleep_quality),
+            ('stress:' || l.stress_level)
+        ) as k(key)
+        where l.user_id = p_user_id
+    ),
+    per_day as (
+        select user_id, day, count(distinct log_id) as log_count
+        from keyed group by user_id, day
+    ),
+    per_key as (
+        select user_id, day, key, count(*) as n
+        from keyed where key is not null group by user_id, day, key
+    )
+    insert into public.mood_daily_rollups (user_id, day, log_count, counts)
+    select d.user_id, d.day, d.log_count,
+           coalesce(jsonb_object_agg(k.key, k.n) filter (where k.key is not null), '{}'::jsonb)
+    from per_day d
+    left join per_key k on k.user_id = d.user_id and k.day = d.day
+    group by d.user_id, d.day, d.log_count;
+$$;
+
+-- Backfill existing logs
+select public.rebuild_mood_rollups(s.user_id)
+from (select distinct user_id from public.mood_logs) s;
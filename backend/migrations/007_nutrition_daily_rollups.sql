@@ -0,0 +1,84 @@
+-- Per-student daily nutrition totals for GET /health/analytics.
+-- Maintained incrementally by the meals and student_diet endpoints
+-- (app/utils/nutrition_rollups.py), so windowed totals read one row per day.
+--   calories                  <- meals
+--   diet_sodium / diet_sugar  <- student_diet log entries
+
+create table if not exists public.nutrition_daily_rollups (
+    student_id   uuid        not null,
+    day          date        not null,
+    calories     numeric     not null default 0,
+    meal_count   integer     not null default 0,
+    diet_sodium  numeric     not null default 0,
+    diet_sugar   numeric     not null default 0,
+    diet_count   integer     not null default 0,
+    updated_at   timestamptz not null default now(),
+    primary key (student_id, day)
+);
+
+-- Add a (possibly negative) delta to one day; p_delta maps column -> amount,
+-- missing columns count as 0.
+create or replace function public.apply_nutrition_rollup_delta(
+    p_student_id uuid,
+    p_day        date,
+    p_delta      jsonb
+) returns void
+language sql
+as $$
+    insert into public.nutrition_daily_rollups as r
+        (student_id, day, calories, meal_count, diet_sodium, diet_sugar, diet_count)
+    values (
+        p_student_id, p_day,
+        coalesce((p_delta->>'calories')::numeric, 0),
+        coalesce((p_delta->>'meal_count')::integer, 0),
+        coalesce((p_delta->>'diet_sodium')::numeric, 0),
+        coalesce((p_delta->>'diet_sugar')::numeric, 0),
+        coalesce((p_delta->>'diet_count')::integer, 0)
+    )
+    on conflict (student_id, day) do update
+        set calories    = r.calories + excluded.calories,
+            meal_count  = r.meal_count + excluded.meal_count,
+            diet_sodium = r.diet_sodium + excluded.diet_sodium,
+            diet_sugar  = r.diet_sugar + excluded.diet_sugar,
+            diet_count  = r.diet_count + excluded.diet_count,
+            updated_at  = now();
+$$;
+
+-- Recompute one student's days from meals and student_diet (repair / backfill).
+create or replace function public.rebuild_nutrition_rollups(p_student_id uuid)
+returns void
+language sql
+as $$
+    delete from public.nutrition_daily_rollups where student_id = p_student_id;
+    with meal_days as (
+        select time::date as day, coalesce(sum(calories), 0) as calories, count(*) as meal_count
+        from public.meals
+        where student_id = p_student_id
+        group by 1
+    ),
+    diet_days as (
+        select time::date as day,
+               coalesce(sum(sodium), 0) as diet_sodium,
+               coalesce(sum(sugar), 0) as diet_sugar,
+               count(*) as diet_count
+        from public.student_diet
+        where student_id = p_student_id
+        group by 1
+    )
+    insert into public.nutrition_daily_rollups
+        (student_id, day, calories, meal_count, diet_sodium, diet_sugar, diet_count)
+    select p_student_id, coalesce(m.day, d.day),
+           coalesce(m.calories, 0), coalesce(m.meal_count, 0),
+           coalesce(d.diet_sodium, 0), coalesce(d.diet_sugar, 0), coalesce(d.diet_count, 0)
+    from meal_days m
+    full outer join diet_days d on d.day = m.day;
+$$;
+
+-- Backfill existing students
+select public.rebuild_nutrition_rollups(s.student_id)
+from (
+    select student_id from public.meals
+    union
+    select student_id from public.student_diet
+) s
+where s.student_id is not null;
@@ -0,0 +1,120 @@
+-- Extend nutrition_daily_rollups (007) with meal macros and water intake so
+-- nutrition suggestions and parent reports can read totals from it too.
+--   proteins / carbs / fat / sodium / sugar  <- meals
+--   water_ml / water_count                   <- water_intake (by intake_date)
+
+alter table public.nutrition_daily_rollups
+    add column if not exists proteins    numeric not null default 0,
+    add column if not exists carbs       numeric not null default 0,
+    add column if not exists fat         numeric not null default 0,
+    add column if not exists sodium      numeric not null default 0,
+    add column if not exists sugar       numeric not null default 0,
+    add column if not exists water_ml    numeric not null default 0,
+    add column if not exists water_count integer not null default 0;
+
+create or replace function public.apply_nutrition_rollup_delta(
+    p_student_id uuid,
+    p_day        date,
+    p_delta      jsonb
+) returns void
+language sql
+as $$
+    insert into public.nutrition_daily_rollups as r
+        (student_id, day, calories, proteins, carbs, fat, sodium, sugar, meal_count,
+         diet_sodium, diet_sugar, diet_count, water_ml, water_count)
+    values (
+        p_student_id, p_day,
+        coalesce((p_delta->>'calories')::numeric, 0),
+        coalesce((p_delta->>'proteins')::numeric, 0),
+        coalesce((p_delta->>'carbs')::numeric, 0),
+        coalesce((p_delta->>'fat')::numeric, 0),
+        coalesce((p_delta->>'sodium')::numeric, 0),
+        coalesce((p_delta->>'sugar')::numeric, 0),
+        coalesce((p_delta->>'meal_count')::integer, 0),
+        coalesce((p_delta->>'diet_sodium')::numeric, 0),
+        coalesce((p_delta->>'diet_sugar')::numeric, 0),
+        coalesce((p_delta->>'diet_count')::integer, 0),
+        coalesce((p_delta->>'water_ml')::numeric, 0),
+        coalesce((p_delta->>'water_count')::integer, 0)
+    )
+    on conflict (student_id, day) do update
+        set calories    = r.calories + excluded.calories,
+            proteins    = r.proteins + excluded.proteins,
+            carbs       = r.carbs + excluded.carbs,
+            fat         = r.fat + excluded.fat,
+            sodium      = r.sodium + excluded.sodium,
+            sugar       = r.sugar + excluded.sugar,
+            meal_count  = r.meal_count + excluded.meal_count,
+            diet_sodium = r.diet_sodium + excluded.diet_sodium,
+            diet_sugar  = r.diet_sugar + excluded.diet_sugar,
+            diet_count  = r.diet_count + excluded.diet_count,
+            water_ml    = r.water_ml + excluded.water_ml,
+            water_count = r.water_count + excluded.water_count,
+            updated_at  = now();
+$$;
+
+create or replace function public.rebuild_nutrition_rollups(p_student_id uuid)
+returns void
+language sql
+as $$
+    delete from public.nutrition_daily_rollups where student_id = p_student_id;
+    with meal_days as (
+        select time::date as day,
+               coalesce(sum(calories), 0) as calories,
+               coalesce(sum(proteins), 0) as proteins,
+               coalesce(sum(carbs), 0) as carbs,
+               coalesce(sum(fat), 0) as fat,
+               coalesce(sum(sodium), 0) as sodium,
+               coalesce(sum(sugar), 0) as sugar,
+               count(*) as meal_count
+        from public.meals
+        where student_id = p_student_id
+        group by 1
+    ),
+    diet_days as (
+        select time::date as day,
+               coalesce(sum(sodium), 0) as diet_sodium,
+               coalesce(sum(sugar), 0) as diet_sugar,
+               count(*) as diet_count
+        from public.student_diet
+        where student_id = p_student_id
+        group by 1
+    ),
+    water_days as (
+        select intake_date as day,
+               coalesce(sum(amount_ml), 0) as water_ml,
+               count(*) as water_count
+        from public.water_intake
+        where user_id = p_student_id
+        group by 1
+    ),
+    days as (
+        select day from meal_days
+        union select day from diet_days
+        union select day from water_days
+    )
+    insert into public.nutrition_daily_rollups
+        (student_id, day, calories, proteins, carbs, fat, sodium, sugar, meal_count,
+         diet_sodium, diet_sugar, diet_count, water_ml, water_count)
+    select p_student_id, d.day,
+           coalesce(m.calories, 0), coalesce(m.proteins, 0), coalesce(m.carbs, 0),
+           coalesce(m.fat, 0), coalesce(m.sodium, 0), coalesce(m.sugar, 0), coalesce(m.meal_count, 0),
+           coalesce(t.diet_sodium, 0), coalesce(t.diet_sugar, 0), coalesce(t.diet_count, 0),
+           coalesce(w.water_ml, 0), coalesce(w.water_count, 0)
+    from days d
+    left join meal_days m on m.day = d.day
+    left join diet_days t on t.day = d.day
+    left join water_days w on w.day = d.day
+    where d.day is not null;
+$$;
+
+-- Backfill: recompute every student with any nutrition data
+select public.rebuild_nutrition_rollups(s.student_id)
+from (
+    select student_id from public.meals
+    union
+    select student_id from public.student_diet
+    union
+    select user_id from public.water_intake
+) s
+where s.student_id is not null;
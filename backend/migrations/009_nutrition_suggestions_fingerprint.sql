@@ -0,0 +1,10 @@
+-- Memoised nutrition suggestions (POST /health/nutrition/suggestions/generate).
+-- inputs_fingerprint is a sha256 of the model inputs (minus generated_at);
+-- a new request with the same fingerprint inside the staleness window
+-- returns the stored row instead of calling the model again.
+
+alter table public.nutrition_suggestions
+    add column if not exists inputs_fingerprint text;
+
+create index if not exists nutrition_suggestions_fingerprint_idx
+    on public.nutrition_suggestions (user_id, range_key, inputs_fingerprint, generated_at desc);
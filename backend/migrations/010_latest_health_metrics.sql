@@ -0,0 +1,21 @@
+-- Latest health_metrics row per student for a batch of students, used by
+-- GET /parent/children/metrics. One DISTINCT ON scan over the
+-- (student_id, created_at desc) index instead of one query per child.
+
+create index if not exists health_metrics_student_created_idx
+    on public.health_metrics (student_id, created_at desc);
+
+create or replace function public.latest_health_metrics(p_student_ids uuid[])
+returns setof public.health_metrics
+language sql
+stable
+as $$
+    select distinct on (m.student_id) m.*
+    from public.health_metrics m
+    where m.student_id = any(p_student_ids)
+    order by m.student_id, m.created_at desc;
+$$;
+
+-- Windowed diet reads for several children at once (GET /parent/children/diet)
+create index if not exists student_diet_student_time_idx
+    on public.student_diet (student_id, time desc);
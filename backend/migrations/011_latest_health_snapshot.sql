@@ -0,0 +1,79 @@
+-- One row per student mirroring their newest health_metrics row.
+-- Kept current by the /health/metrics write endpoints (app/utils/health_snapshot.py)
+-- so "latest metrics" readers do a primary-key / in_() lookup instead of a
+-- sorted scan of health_metrics.
+
+create table if not exists public.latest_health_snapshot (
+    student_id   uuid        primary key,
+    metric_id    uuid,
+    weight       numeric,
+    height       numeric,
+    bmi          numeric,
+    systolic     integer,
+    diastolic    integer,
+    blood_sugar  integer,
+    heart_rate   integer,
+    age_years    integer,
+    sex          text,
+    notes        text,
+    created_at   timestamptz,
+    updated_at   timestamptz not null default now()
+);
+
+-- Re-derive one student's snapshot from health_metrics (after any insert,
+-- update or delete); removes it when the student has no metrics left.
+create or replace function public.refresh_latest_health_snapshot(p_student_id uuid)
+returns void
+language plpgsql
+as $$
+declare
+    m public.health_metrics%rowtype;
+begin
+    select * into m
+    from public.health_metrics
+    where student_id = p_student_id
+    order by created_at desc
+    limit 1;
+
+    if not found then
+        delete from public.latest_health_snapshot where student_id = p_student_id;
+        return;
+    end if;
+
+    insert into public.latest_health_snapshot as s
+        (student_id, metric_id, weight, height, bmi, systolic, diastolic, blood_sugar,
+         heart_rate, age_years, sex, notes, created_at, updated_at)
+    values
+        (p_student_id, m.id, m.weight, m.height, m.bmi, m.systolic, m.diastolic, m.blood_sugar,
+         m.heart_rate, m.age_years, m.sex, m.notes, m.created_at, now())
+    on conflict (student_id) do update
+        set metric_id   = excluded.metric_id,
+            weight      = excluded.weight,
+            height      = excluded.height,
+            bmi         = excluded.bmi,
+            systolic    = excluded.systolic,
+            diastolic   = excluded.diastolic,
+            blood_sugar = excluded.blood_sugar,
+            heart_rate  = excluded.heart_rate,
+            age_years   = excluded.age_years,
+            sex         = excluded.sex,
+            notes       = excluded.notes,
+            created_at  = excluded.created_at,
+            updated_at  = now();
+end;
+$$;
+
+-- Backfill
+insert into public.latest_health_snapshot
+    (student_id, metric_id, weight, height, bmi, systolic, diastolic, blood_sugar,
+     heart_rate, age_years, sex, notes, created_at)
+select distinct on (student_id)
+    student_id, id, weight, height, bmi, systolic, diastolic, blood_sugar,
+    heart_rate, age_years, sex, notes, created_at
+from public.health_metrics
+where student_id is not null
+order by student_id, created_at desc
+on conflict (student_id) do nothing;
+
+-- GET /parent/children/metrics now reads this table (010's RPC is unused)
+drop function if exists public.latest_health_metrics(uuid[]);
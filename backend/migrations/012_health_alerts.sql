@@ -0,0 +1,42 @@
+-- Health alerts evaluated once per health_metrics write
+-- (rules in app/utils/health_alerts.py) and read by the parent and teacher
+-- dashboards.
+
+create table if not exists public.health_alerts (
+    id          uuid        primary key default gen_random_uuid(),
+    student_id  uuid        not null,
+    metric_id   uuid        references public.health_metrics (id) on delete cascade,
+    rule_id     text        not null,
+    metric      text        not null,
+    value       numeric,
+    threshold   numeric,
+    severity    text        not null check (severity in ('critical', 'warning')),
+    title       text        not null,
+    message     text        not null,
+    created_at  timestamptz not null default now()
+);
+
+create index if not exists health_alerts_student_severity_created_idx
+    on public.health_alerts (student_id, severity, created_at desc);
+
+create index if not exists health_alerts_metric_idx
+    on public.health_alerts (metric_id);
+
+-- Backfill the last 30 days with the default rule set (ALERT_RULES);
+-- later rows are written by the API.
+insert into public.health_alerts
+    (student_id, metric_id, rule_id, metric, value, threshold, severity, title, message, created_at)
+select m.student_id, m.id, r.rule_id, 'blood_sugar', m.blood_sugar, r.threshold, r.severity, r.title,
+       r.label || ' (' || m.blood_sugar || ' mg/dL)', m.created_at
+from public.health_metrics m
+cross join lateral (
+    select * from (values
+        ('blood_sugar_critical_high', 180, 'critical', 'High Blood Sugar', 'blood sugar elevated', m.blood_sugar > 180),
+        ('blood_sugar_high',          140, 'warning',  'Blood Sugar High', 'blood sugar high',     m.blood_sugar > 140 and m.blood_sugar <= 180),
+        ('blood_sugar_critical_low',   70, 'critical', 'Low Blood Sugar',  'blood sugar low',      m.blood_sugar < 70)
+    ) as v(rule_id, threshold, severity, title, label, fires)
+    where v.fires
+) r
+where m.blood_sugar is not null
+  and m.created_at >= now() - interval '30 days'
+  and not exists (select 1 from public.health_alerts a where a.metric_id = m.id);
@@ -0,0 +1,26 @@
+-- Latest task_completions per student for a batch of students, used by the
+-- "improvement" achievement on GET /parent/dashboard/. Reads at most
+-- p_per_student rows per child from the (student_id, completed_at desc)
+-- index instead of every completion the children ever had.
+
+create index if not exists task_completions_student_completed_idx
+    on public.task_completions (student_id, completed_at desc);
+
+create or replace function public.recent_task_completions(
+    p_student_ids  uuid[],
+    p_per_student  integer default 2
+)
+returns setof public.task_completions
+language sql
+stable
+as $$
+    select c.*
+    from unnest(p_student_ids) as s(student_id)
+    cross join lateral (
+        select t.*
+        from public.task_completions t
+        where t.student_id = s.student_id
+        order by t.completed_at desc
+        limit p_per_student
+    ) c;
+$$;